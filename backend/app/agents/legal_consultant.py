@@ -1,73 +1,340 @@
+import os
 import re
-from typing import List, Dict, Any
+import json
+import time
+import hashlib
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
 from app.services.llm_service import LLMService
 from app.services.vector_store import VectorStore
+from app.services.answer_cache import AnswerCache
+from app.services.reranker import Reranker
+from app.services.conversation_memory import ConversationMemory
+from app.services.conversation_store import Conversation
+from app.services.embedding_cache import normalize_text
+from app.services.single_flight import SingleFlight
+from app.services.metrics import CACHE_REQUESTS, FALLBACKS
+from app.services.tracing import stage
+from app.services.logging_utils import get_logger
 from app.models.schemas import Citation, ChatResponse
 
+logger = get_logger("consultant")
+
 class LegalConsultantAgent:
-    def __init__(self, vector_store: VectorStore = None):
-        self.llm_service = LLMService()
+    def __init__(
+        self,
+        vector_store: VectorStore = None,
+        llm_service: LLMService = None,
+        reranker: Optional[Reranker] = None,
+        memory: Optional[ConversationMemory] = None
+    ):
+        # 使用传入的llm_service以共享连接池，如果没有则创建新的
+        self.llm_service = llm_service if llm_service is not None else LLMService()
         # 使用传入的vector_store，如果没有则创建新的（向后兼容）
         if vector_store is not None:
             self.vector_store = vector_store
         else:
             self.vector_store = VectorStore()
+        # 检索模式：默认使用向量+关键词混合检索，法条编号等精确术语更容易召回
+        self.search_mode = os.getenv("CONSULTANT_SEARCH_MODE", "hybrid")
+        # 可选的重排序：召回 RERANK_CANDIDATES 个候选，交叉编码器打分后只保留 RERANK_TOP_N 个
+        self.reranker = reranker
+        # 回答缓存：相同问题+相同检索证据直接复用上次的回答
+        self.answer_cache = None
+        if os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true":
+            self.answer_cache = AnswerCache()
+        # 多轮会话记忆：历史进入Prompt并用于改写检索问题
+        self.memory = memory
+        if self.memory is None and os.getenv("CONVERSATION_ENABLED", "true").lower() == "true":
+            self.memory = ConversationMemory(self.llm_service)
+        # 相同问题、检索选项与会话历史的并发咨询合并为一次执行
+        self.single_flight = None
+        if os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true":
+            self.single_flight = SingleFlight("consultation")
+
+    TOP_K = 5
+
+    NO_RESULT_ANSWER = "抱歉，知识库中未找到相关信息，无法回答您的问题。请检查：1) 向量库是否成功加载数据 2) 查询是否与知识库内容相关"
+
+    async def process_query(
+        self,
+        question: str,
+        filters: Optional[Dict[str, Any]] = None,
+        conversation_id: Optional[str] = None
+    ) -> ChatResponse:
+        """处理法律咨询查询
 
-    async def process_query(self, question: str) -> ChatResponse:
-        """处理法律咨询查询"""
-        print(f"\n=== 处理查询: {question} ===")
-        # 1. 向量检索
-        search_results = self.vector_store.search(question, top_k=5)
-        print(f"检索到 {len(search_results)} 个相关文档")
+        filters限定检索范围，如只检索某部法律或某法院的案例；conversation_id 为追问所属的会话，
+        未传入时开启新会话，响应中返回会话ID。
+        相同问题、检索选项与会话历史的并发请求共享一次执行，每个调用方得到各自的副本。
+        """
+        logger.debug("处理查询: %s", question)
+        conversation = self._load_conversation(conversation_id)
+        if self.single_flight is None:
+            response = await self._answer(question, filters, conversation)
+        else:
+            key = self._coalesce_key(question, filters, conversation)
+            response = await self.single_flight.do(key, lambda: self._answer(question, filters, conversation))
+        response = response.model_copy(deep=True)
+        response.conversation_id = conversation.id if conversation is not None else conversation_id
+        self._remember(conversation, question, response.answer)
+        return response
+
+    async def _answer(
+        self,
+        question: str,
+        filters: Optional[Dict[str, Any]],
+        conversation: Optional[Conversation]
+    ) -> ChatResponse:
+        """检索并生成回答（不写入会话记忆，可被多个合并的调用方共享）"""
+        # 1. 向量检索（追问结合会话历史改写检索问题）
+        search_results = await self._retrieve(await self._retrieval_query(question, conversation), filters)
         
         if not search_results:
-            print("⚠ 警告: 未检索到任何相关文档")
             return ChatResponse(
-                answer="抱歉，知识库中未找到相关信息，无法回答您的问题。请检查：1) 向量库是否成功加载数据 2) 查询是否与知识库内容相关",
+                answer=self.NO_RESULT_ANSWER,
                 citations=[],
                 sources=[]
             )
         
+        cache_key = self._answer_cache_key(question, search_results, conversation)
+        cached = self._get_cached_answer(cache_key)
+        if cached is not None:
+            return cached
+        
         # 2. 格式化上下文
-        context_chunks = [
-            {
-                "source_id": r["source_id"],
-                "article_name": r["article_name"],
-                "section": r["section"],
-                "content": r["content"]
-            }
-            for r in search_results
-        ]
+        messages = self._build_messages(question, search_results, conversation)
         
         # 3. 调用LLM生成回答
+        llm_ok = True
         try:
-            messages = self.llm_service.format_legal_prompt(
-                question=question,
-                context_chunks=context_chunks,
-                agent_type="consultant"
-            )
-            print(f"正在调用LLM API生成回答...")
             answer = await self.llm_service.chat(messages, temperature=0.3)
-            print(f"✓ LLM回答生成完成")
         except Exception as e:
-            print(f"✗ LLM调用失败: {e}")
+            FALLBACKS.labels(reason="llm_error").inc()
+            logger.warning("✗ LLM调用失败，使用检索结果摘要回答: %s", e)
             # 如果LLM调用失败，返回基于检索结果的简单回答
-            answer = f"根据检索到的法律条文，我找到以下相关信息：\n\n"
-            for i, result in enumerate(search_results[:3], 1):
-                answer += f"{i}. {result['article_name']} {result.get('section', '')}：{result['content'][:100]}...\n\n"
-            answer += f"\n[来源: {search_results[0].get('source_id', '')}]"
+            answer = self._fallback_answer(search_results)
+            llm_ok = False
         
         # 4. 提取引用
         citations = self._extract_citations(answer, search_results)
         
-        return ChatResponse(
+        response = ChatResponse(
             answer=answer,
             citations=citations,
             sources=search_results
         )
+        # 只缓存LLM正常生成的回答，fallback回答不缓存
+        if cache_key is not None and llm_ok:
+            self.answer_cache.set(cache_key, response)
+        return response
+
+    async def process_query_stream(
+        self,
+        question: str,
+        filters: Optional[Dict[str, Any]] = None,
+        conversation_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """流式处理法律咨询查询
+
+        依次产出事件：sources（检索结果）、token（LLM增量文本，可多次）、
+        citations（引用列表）、done（data 中带 conversation_id）。
+        """
+        logger.debug("处理流式查询: %s", question)
+        conversation = self._load_conversation(conversation_id)
+        done = {"conversation_id": conversation.id if conversation is not None else conversation_id}
+        search_results = await self._retrieve(await self._retrieval_query(question, conversation), filters)
+        yield {"event": "sources", "data": search_results}
+
+        if not search_results:
+            self._remember(conversation, question, self.NO_RESULT_ANSWER)
+            yield {"event": "token", "data": self.NO_RESULT_ANSWER}
+            yield {"event": "citations", "data": []}
+            yield {"event": "done", "data": done}
+            return
+
+        cache_key = self._answer_cache_key(question, search_results, conversation)
+        cached = self._get_cached_answer(cache_key)
+        if cached is not None:
+            self._remember(conversation, question, cached.answer)
+            yield {"event": "token", "data": cached.answer}
+            yield {"event": "citations", "data": [c.model_dump() for c in cached.citations]}
+            yield {"event": "done", "data": done}
+            return
+
+        messages = self._build_messages(question, search_results, conversation)
+        parts: List[str] = []
+        try:
+            async for delta in self.llm_service.chat_stream(messages, temperature=0.3):
+                parts.append(delta)
+                yield {"event": "token", "data": delta}
+            if cache_key is not None:
+                answer = "".join(parts)
+                self.answer_cache.set(cache_key, ChatResponse(
+                    answer=answer,
+                    citations=self._extract_citations(answer, search_results),
+                    sources=search_results
+                ))
+        except Exception as e:
+            FALLBACKS.labels(reason="llm_error").inc()
+            logger.warning("✗ LLM流式调用失败: %s", e)
+            if parts:
+                # 已经输出了部分回答，无法再替换为fallback，只能告知中断
+                yield {"event": "error", "data": {"message": f"回答生成中断: {str(e)}"}}
+            else:
+                fallback = self._fallback_answer(search_results)
+                parts.append(fallback)
+                yield {"event": "token", "data": fallback}
+
+        answer = "".join(parts)
+        self._remember(conversation, question, answer)
+        citations = self._extract_citations(answer, search_results)
+        yield {"event": "citations", "data": [c.model_dump() for c in citations]}
+        yield {"event": "done", "data": done}
+
+    def _coalesce_key(
+        self,
+        question: str,
+        filters: Optional[Dict[str, Any]],
+        conversation: Optional[Conversation]
+    ) -> str:
+        """请求合并键：规范化问题、检索模式、过滤条件与会话历史
+
+        使用历史内容而不是会话ID，没有历史的新会话提出相同问题时也能合并。
+        """
+        history_key = self.memory.history_key(conversation) if conversation is not None else ""
+        raw = json.dumps(
+            [normalize_text(question), self.search_mode, filters or {}, history_key],
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _load_conversation(self, conversation_id: Optional[str]) -> Optional[Conversation]:
+        """读取会话历史，未传入会话ID时开启新会话；会话记忆未启用时返回None"""
+        if self.memory is None:
+            return None
+        return self.memory.load(conversation_id or self.memory.new_id())
+
+    async def _retrieval_query(self, question: str, conversation: Optional[Conversation]) -> str:
+        if conversation is None:
+            return question
+        return await self.memory.rewrite_query(question, conversation)
+
+    def _history(self, conversation: Optional[Conversation]) -> Tuple[str, List[Dict[str, str]]]:
+        if conversation is None:
+            return "", []
+        return self.memory.history(conversation)
+
+    def _remember(self, conversation: Optional[Conversation], question: str, answer: str):
+        if conversation is not None and answer:
+            self.memory.record_turn(conversation.id, question, answer)
+
+    def _answer_cache_key(
+        self,
+        question: str,
+        search_results: List[Dict[str, Any]],
+        conversation: Optional[Conversation] = None
+    ):
+        """回答缓存键，缓存未启用时返回None；追问的回答依赖会话历史，历史也计入键"""
+        if self.answer_cache is None:
+            return None
+        return AnswerCache.make_key(
+            question,
+            search_results,
+            prompt_version=self.llm_service.PROMPT_VERSION,
+            model_name=self.llm_service.model_name,
+            history_key=self.memory.history_key(conversation) if conversation is not None else ""
+        )
+
+    def _get_cached_answer(self, cache_key) -> Optional[ChatResponse]:
+        """读取回答缓存并记录命中率，缓存未启用时返回None"""
+        if cache_key is None:
+            return None
+        cached = self.answer_cache.get(cache_key)
+        CACHE_REQUESTS.labels(cache="answer", result="hit" if cached is not None else "miss").inc()
+        return cached
+
+    async def _retrieve(self, question: str, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """检索与问题相关的文档"""
+        timings = {}
+        with stage("retrieval"):
+            search_results = await self.vector_store.asearch(
+                question,
+                top_k=self.reranker.candidates if self.reranker is not None else self.TOP_K,
+                filter_dict=filters,
+                mode=self.search_mode,
+                timings=timings
+            )
+        logger.debug("检索到 %d 个相关文档 (模式: %s, 耗时: %.1fms)", len(search_results), self.search_mode, timings.get("total_ms", 0))
+        if self.reranker is not None and search_results:
+            search_results = await self._rerank(question, search_results)
+        if not search_results:
+            FALLBACKS.labels(reason="no_results").inc()
+            logger.warning("⚠ 警告: 未检索到任何相关文档")
+        return search_results
+
+    async def _rerank(self, question: str, search_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """交叉编码器重排序，失败时退回检索顺序的前 RERANK_TOP_N 个结果"""
+        started = time.perf_counter()
+        try:
+            reranked = await self.reranker.arerank(question, search_results)
+        except Exception as e:
+            FALLBACKS.labels(reason="rerank_error").inc()
+            logger.warning("⚠ 重排序失败，使用检索排序: %s", e)
+            return search_results[:self.reranker.top_n]
+        logger.debug("重排序 %d 个候选 → %d 个 (耗时: %.1fms)", len(search_results), len(reranked), (time.perf_counter() - started) * 1000)
+        return reranked
+
+    def _build_messages(
+        self,
+        question: str,
+        search_results: List[Dict[str, Any]],
+        conversation: Optional[Conversation] = None
+    ) -> List[Dict[str, str]]:
+        """根据检索结果与会话历史构造LLM消息"""
+        with stage("prompt_format"):
+            return self._format_messages(question, search_results, conversation)
+
+    def _format_messages(
+        self,
+        question: str,
+        search_results: List[Dict[str, Any]],
+        conversation: Optional[Conversation] = None
+    ) -> List[Dict[str, str]]:
+        summary, history = self._history(conversation)
+        context_chunks = [
+            {
+                "source_id": r["source_id"],
+                "article_name": r["article_name"],
+                "section": r["section"],
+                "content": r["content"],
+                "score": r.get("score")
+            }
+            for r in search_results
+        ]
+        return self.llm_service.format_legal_prompt(
+            question=question,
+            context_chunks=context_chunks,
+            agent_type="consultant",
+            history=history,
+            summary=summary
+        )
+
+    def _fallback_answer(self, search_results: List[Dict[str, Any]]) -> str:
+        """LLM不可用时，基于检索结果生成简单回答"""
+        answer = f"根据检索到的法律条文，我找到以下相关信息：\n\n"
+        for i, result in enumerate(search_results[:3], 1):
+            answer += f"{i}. {result['article_name']} {result.get('section', '')}：{result['content'][:100]}...\n\n"
+        answer += f"\n[来源: {search_results[0].get('source_id', '')}]"
+        return answer
 
     def _extract_citations(self, answer: str, search_results: List[Dict]) -> List[Citation]:
         """从回答中提取引用"""
+        with stage("citation_extraction"):
+            return self._match_citations(answer, search_results)
+
+    def _match_citations(self, answer: str, search_results: List[Dict]) -> List[Citation]:
         citations = []
         # 匹配 [[source_id]] 格式
         pattern = r'\[\[([^\]]+)\]\]'
@@ -1,30 +1,84 @@
-from fastapi import FastAPI, HTTPException
+import os
+import json
+import asyncio
+from datetime import date
+from typing import Optional, List
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 from contextlib import asynccontextmanager
-from app.models.schemas import ChatRequest, ChatResponse
+from app.models.schemas import ChatRequest, ChatResponse, SearchFilter, BatchSearchRequest
 from app.agents.legal_consultant import LegalConsultantAgent
-from app.services.vector_store import VectorStore
+from app.services.embedding_service import EmbeddingService
+from app.services.reranker import create_reranker
+from app.services.vector_store import VectorStore, SEARCH_MODES
+from app.services.llm_service import LLMService
 from app.services.data_loader import load_sample_data
+from app.services.startup import StartupState
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from app.services.tracing import request_trace
+from app.services.logging_utils import get_logger
 import uvicorn
 
+logger = get_logger("api")
+
+# 批量搜索单次请求的查询数上限
+SEARCH_BATCH_MAX_QUERIES = int(os.getenv("SEARCH_BATCH_MAX_QUERIES", "256"))
+
 # 全局变量
 consultant_agent = None
 vector_store = None
+reranker = None
+llm_service = None
+
+# 后台启动阶段：加载模型 → 打开向量库与关键词索引 → 加载测试数据 → 加载重排序模型（未启用时跳过）→ 预热编码
+STARTUP_STAGES = ["embedding_model", "vector_store", "sample_data", "reranker", "warmup"]
+startup_state = StartupState(STARTUP_STAGES)
+startup_task: Optional[asyncio.Task] = None
+
+def _warmup(store: VectorStore):
+    """预热编码：触发模型首次前向计算的懒初始化，避免第一个请求承担冷启动延迟"""
+    store.embedding_service.model.encode(["法律咨询预热"], convert_to_numpy=True)
+
+def _initialize_services():
+    """在后台线程中按阶段初始化服务，每个阶段完成后立即对外可用"""
+    global consultant_agent, vector_store, reranker
+    embedding_service = startup_state.run("embedding_model", EmbeddingService)
+    vector_store = startup_state.run("vector_store", VectorStore, embedding_service)
+    startup_state.run("sample_data", load_sample_data, vector_store)
+    reranker = startup_state.run("reranker", create_reranker)
+    # 使用已加载数据的vector_store创建agent
+    consultant_agent = LegalConsultantAgent(vector_store=vector_store, llm_service=llm_service, reranker=reranker)
+    startup_state.run("warmup", _warmup, vector_store)
+
+async def _run_startup():
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, _initialize_services)
+        print("✓ 服务初始化完成")
+    except Exception as e:
+        print(f"✗ 服务初始化失败: {e}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """应用生命周期管理"""
+    """应用生命周期管理：端口立即开放，耗时的初始化在后台执行"""
     # 启动时
-    global consultant_agent, vector_store
+    global llm_service, startup_state, startup_task
     print("正在初始化服务...")
-    vector_store = VectorStore()
-    print("正在加载测试数据...")
-    load_sample_data(vector_store)
-    print("测试数据加载完成")
-    # 使用已加载数据的vector_store创建agent
-    consultant_agent = LegalConsultantAgent(vector_store=vector_store)
+    startup_state = StartupState(STARTUP_STAGES)
+    llm_service = LLMService()
+    await llm_service.start()
+    startup_task = asyncio.create_task(_run_startup())
     yield
-    # 关闭时（如果需要清理资源）
+    # 关闭时释放资源
+    await llm_service.aclose()
+    if not startup_task.done():
+        # 初始化线程无法中断，正在写入的向量库不能关闭
+        print("⚠ 后台初始化尚未完成，跳过向量库关闭")
+    elif vector_store is not None:
+        vector_store.close()
+    if reranker is not None:
+        reranker.close()
 
 app = FastAPI(
     title="法学AI-Agent API",
@@ -49,33 +103,150 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+@app.get("/health/live")
+async def health_live():
+    """存活探针：进程能响应请求即返回200"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def health_ready():
+    """就绪探针：所有启动阶段完成后返回200，否则返回503及各阶段状态与耗时"""
+    state = startup_state.snapshot()
+    if state["ready"]:
+        return {"status": "ready", **state}
+    status = "failed" if startup_state.failed else "starting"
+    return JSONResponse(status_code=503, content={"status": status, **state})
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """法律咨询接口"""
-    try:
-        if consultant_agent is None:
-            raise HTTPException(status_code=503, detail="服务未初始化完成")
-        if request.agent_type == "consultant":
-            response = await consultant_agent.process_query(request.message)
-            return response
-        else:
-            # 其他Agent类型可以在这里扩展
-            raise HTTPException(status_code=400, detail=f"不支持的Agent类型: {request.agent_type}")
-    except HTTPException:
-        raise
-    except Exception as e:
-        import traceback
-        error_detail = traceback.format_exc()
-        print(f"API错误详情:\n{error_detail}")
-        raise HTTPException(status_code=500, detail=f"服务器错误: {str(e)}")
+    with request_trace("chat"):
+        try:
+            if consultant_agent is None:
+                raise HTTPException(status_code=503, detail="服务未初始化完成")
+            if request.agent_type == "consultant":
+                filters = request.filters.to_filter_dict() if request.filters else None
+                response = await consultant_agent.process_query(
+                    request.message, filters=filters, conversation_id=request.conversation_id
+                )
+                return response
+            else:
+                # 其他Agent类型可以在这里扩展
+                raise HTTPException(status_code=400, detail=f"不支持的Agent类型: {request.agent_type}")
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.exception("API错误: %s", e)
+            raise HTTPException(status_code=500, detail=f"服务器错误: {str(e)}")
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """法律咨询流式接口（Server-Sent Events）
+
+    先推送检索到的sources，再逐段推送LLM生成的token，最后推送citations。
+    """
+    if consultant_agent is None:
+        raise HTTPException(status_code=503, detail="服务未初始化完成")
+    if request.agent_type != "consultant":
+        raise HTTPException(status_code=400, detail=f"不支持的Agent类型: {request.agent_type}")
+
+    filters = request.filters.to_filter_dict() if request.filters else None
+
+    async def event_stream():
+        # 追踪覆盖整个流，而不只是返回响应头之前的部分
+        with request_trace("chat_stream"):
+            try:
+                async for event in consultant_agent.process_query_stream(
+                    request.message, filters=filters, conversation_id=request.conversation_id
+                ):
+                    data = json.dumps(event["data"], ensure_ascii=False)
+                    yield f"event: {event['event']}\ndata: {data}\n\n"
+            except Exception as e:
+                logger.exception("流式接口错误: %s", e)
+                data = json.dumps({"message": f"服务器错误: {str(e)}"}, ensure_ascii=False)
+                yield f"event: error\ndata: {data}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/api/search")
-async def search(query: str, top_k: int = 5):
-    """直接搜索向量库"""
+async def search(
+    query: str,
+    top_k: int = 5,
+    mode: Optional[str] = None,
+    doc_type: Optional[List[str]] = Query(None),
+    article_name: Optional[List[str]] = Query(None),
+    case_type: Optional[List[str]] = Query(None),
+    court: Optional[List[str]] = Query(None),
+    effective_on: Optional[date] = None
+):
+    """直接搜索向量库
+
+    mode: dense / keyword / hybrid，默认取 SEARCH_MODE 配置
+    doc_type / article_name / case_type / court 可重复传入多个取值，effective_on 只返回该日期已生效的文档
+    """
+    if vector_store is None:
+        raise HTTPException(status_code=503, detail="服务未初始化完成")
+    mode = mode or vector_store.default_search_mode
+    if mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"不支持的检索模式: {mode}，可选: {', '.join(SEARCH_MODES)}")
+    filters = SearchFilter(
+        doc_type=doc_type,
+        article_name=article_name,
+        case_type=case_type,
+        court=court,
+        effective_on=effective_on
+    ).to_filter_dict()
+    timings = {}
+    with request_trace("search"):
+        results = await vector_store.asearch(query, top_k=top_k, filter_dict=filters, mode=mode, timings=timings)
+    return {
+        "query": query,
+        "mode": mode,
+        "filters": filters,
+        "results": results,
+        "count": len(results),
+        "timings": timings
+    }
+
+@app.post("/api/search/batch")
+async def search_batch(request: BatchSearchRequest):
+    """批量搜索向量库：所有查询一次批量编码、一次后端批量检索，结果与输入顺序一致"""
     if vector_store is None:
         raise HTTPException(status_code=503, detail="服务未初始化完成")
-    results = vector_store.search(query, top_k=top_k)
-    return {"query": query, "results": results, "count": len(results)}
+    if len(request.queries) > SEARCH_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"单次最多 {SEARCH_BATCH_MAX_QUERIES} 个查询")
+    mode = request.mode or vector_store.default_search_mode
+    if mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"不支持的检索模式: {mode}，可选: {', '.join(SEARCH_MODES)}")
+    filters = request.filters.to_filter_dict() if request.filters else None
+    timings = {}
+    with request_trace("search_batch"):
+        batches = await vector_store.asearch_many(
+            request.queries,
+            top_k=request.top_k,
+            filter_dict=filters,
+            mode=mode,
+            timings=timings
+        )
+    return {
+        "mode": mode,
+        "filters": filters,
+        "count": len(batches),
+        "results": [
+            {"query": query, "results": results, "count": len(results)}
+            for query, results in zip(request.queries, batches)
+        ],
+        "timings": timings
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus指标：请求与各阶段耗时直方图、降级/缓存命中/LLM错误计数、进行中的请求数"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 @app.get("/api/debug/collection-info")
 async def collection_info():
@@ -83,19 +254,34 @@ async def collection_info():
     if vector_store is None:
         raise HTTPException(status_code=503, detail="服务未初始化完成")
     try:
-        collection_info = vector_store.client.get_collection(vector_store.collection_name)
-        return {
-            "collection_name": vector_store.collection_name,
-            "points_count": collection_info.points_count,
-            "vectors_count": collection_info.vectors_count,
-            "status": "ok"
-        }
+        return {**vector_store.backend.info(), "status": "ok"}
     except Exception as e:
         return {
             "error": str(e),
             "status": "error"
         }
 
+@app.get("/api/debug/cache-stats")
+async def cache_stats():
+    """调试接口：查看嵌入缓存、查询缓存、重排序得分缓存、回答缓存与会话存储情况"""
+    if vector_store is None or consultant_agent is None:
+        raise HTTPException(status_code=503, detail="服务未初始化完成")
+    stats = vector_store.embedding_service.cache_stats()
+    answer_cache = consultant_agent.answer_cache
+    stats["answer_cache"] = answer_cache.stats() if answer_cache else None
+    stats["reranker"] = reranker.stats() if reranker else None
+    stats["conversations"] = consultant_agent.memory.stats() if consultant_agent.memory else None
+    return stats
+
+@app.get("/api/debug/batch-stats")
+async def batch_stats():
+    """调试接口：查看查询嵌入微批处理的批大小与排队延迟"""
+    if vector_store is None:
+        raise HTTPException(status_code=503, detail="服务未初始化完成")
+    if vector_store.batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **vector_store.batcher.stats()}
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
 
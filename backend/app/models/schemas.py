@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from datetime import date
+from pydantic import BaseModel, field_validator
 from typing import List, Optional, Dict, Any
 
 
@@ -7,10 +8,35 @@ class ChatMessage(BaseModel):
     content: str
 
 
+class SearchFilter(BaseModel):
+    """检索过滤条件，各字段之间为“且”，同一字段的多个取值为“或”"""
+    doc_type: Optional[List[str]] = None  # statute, case
+    article_name: Optional[List[str]] = None  # 法律名称，如 中华人民共和国刑法
+    case_type: Optional[List[str]] = None  # 案件类型，如 刑事
+    court: Optional[List[str]] = None  # 审理法院
+    effective_on: Optional[date] = None  # 只返回在该日期已生效的文档
+
+    @field_validator("doc_type", "article_name", "case_type", "court", mode="before")
+    @classmethod
+    def _as_list(cls, value):
+        return [value] if isinstance(value, str) else value
+
+    def to_filter_dict(self) -> Dict[str, Any]:
+        return self.model_dump(exclude_none=True)
+
+
 class ChatRequest(BaseModel):
     message: str
     conversation_id: Optional[str] = None
     agent_type: str = "consultant"  # consultant, exam, chat
+    filters: Optional[SearchFilter] = None
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    top_k: int = 5
+    mode: Optional[str] = None  # dense, keyword, hybrid
+    filters: Optional[SearchFilter] = None
 
 
 class Citation(BaseModel):
@@ -25,6 +51,7 @@ class ChatResponse(BaseModel):
     answer: str
     citations: List[Citation]
     sources: List[Dict[str, Any]]
+    conversation_id: Optional[str] = None  # 追问时传回，未传入时由服务端生成
 
 
 class DocumentChunk(BaseModel):
@@ -0,0 +1,51 @@
+import os
+import json
+import hashlib
+from typing import List, Dict, Any, Optional
+from app.models.schemas import ChatResponse
+from app.services.embedding_cache import normalize_text
+from app.services.lru_cache import LRUCache
+
+
+class AnswerCache:
+    """法律咨询回答缓存
+
+    键由规范化问题、检索结果（按顺序的source_id及其内容哈希）、Prompt模板版本、
+    模型名以及会话历史（多轮咨询时）共同决定。法条内容更新后检索证据随之变化，旧回答自然不再命中。
+    """
+
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[float] = None):
+        self._cache = LRUCache(
+            max_size=max_size if max_size is not None else int(os.getenv("ANSWER_CACHE_MAX_SIZE", "1024")),
+            ttl=ttl if ttl is not None else float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+        )
+
+    @staticmethod
+    def make_key(
+        question: str,
+        search_results: List[Dict[str, Any]],
+        prompt_version: str,
+        model_name: str,
+        history_key: str = ""
+    ) -> str:
+        """根据问题与检索证据生成缓存键（history_key 为会话历史的哈希，没有历史时为空）"""
+        evidence = [
+            [r.get("source_id", ""), hashlib.sha256(r.get("content", "").encode("utf-8")).hexdigest()]
+            for r in search_results
+        ]
+        parts = [normalize_text(question), evidence, prompt_version, model_name]
+        if history_key:
+            parts.append(history_key)
+        raw = json.dumps(parts, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[ChatResponse]:
+        """读取缓存的回答（返回副本，调用方可以安全修改）"""
+        response = self._cache.get(key)
+        return response.model_copy(deep=True) if response is not None else None
+
+    def set(self, key: str, response: ChatResponse):
+        self._cache.set(key, response.model_copy(deep=True))
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
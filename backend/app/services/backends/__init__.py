@@ -0,0 +1,16 @@
+from app.services.backends.base import VectorBackend, BackendPoint, BackendHit, QUANTIZATION_MODES
+from app.services.backends.qdrant_backend import QdrantBackend
+from app.services.backends.local_backend import LocalBackend
+
+BACKENDS = {
+    "qdrant": QdrantBackend,
+    "local": LocalBackend,
+}
+
+
+def create_backend(name: str, collection_name: str) -> VectorBackend:
+    """根据名称创建向量存储后端"""
+    backend_cls = BACKENDS.get(name)
+    if backend_cls is None:
+        raise ValueError(f"不支持的向量存储后端: {name}，可选: {', '.join(BACKENDS)}")
+    return backend_cls(collection_name)
@@ -0,0 +1,105 @@
+import os
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+
+
+# 向量压缩方式：none（原始精度）、int8（标量量化）、binary（二值量化）
+QUANTIZATION_MODES = ("none", "int8", "binary")
+
+
+# 未设置 QUANTIZATION_OVERSAMPLING 时各量化方式的默认过采样倍数：二值码每维只保留符号，
+# 384维模型上 recall@10 在4倍过采样时仅约0.4，需约32倍候选重打分才能达到0.95
+DEFAULT_OVERSAMPLING = {"none": 1.0, "int8": 4.0, "binary": 32.0}
+
+
+def quantization_from_env(mode: Optional[str] = None) -> Tuple[str, float, bool]:
+    """读取量化配置，返回 (量化方式, 候选过采样倍数, 是否用原始向量重打分)；mode 为显式指定的量化方式"""
+    mode = (mode or os.getenv("VECTOR_QUANTIZATION", "none")).lower()
+    if mode not in QUANTIZATION_MODES:
+        print(f"⚠ 不支持的量化方式: {mode}，使用原始精度向量")
+        mode = "none"
+    oversampling = float(os.getenv("QUANTIZATION_OVERSAMPLING", str(DEFAULT_OVERSAMPLING[mode])))
+    rescore = os.getenv("QUANTIZATION_RESCORE", "true").lower() == "true"
+    return mode, oversampling, rescore
+
+
+@dataclass
+class BackendPoint:
+    """写入后端的一个点"""
+    id: str
+    vector: List[float]
+    payload: Dict[str, Any]
+
+
+@dataclass
+class BackendHit:
+    """后端检索返回的一个结果"""
+    id: str
+    score: float
+    payload: Dict[str, Any]
+
+
+class VectorBackend(ABC):
+    """向量存储后端接口
+
+    VectorStore 只通过该接口访问底层存储，具体实现负责持久化、相似度计算和
+    连接失败时的降级策略。向量统一使用余弦相似度。
+    """
+
+    name = "base"
+    # 底层存储被替换（例如远程不可用时降级为内存模式）时递增，之前写入的数据需要重新导入
+    generation = 0
+
+    @abstractmethod
+    def ensure_collection(self, dim: int):
+        """确保集合存在（不存在时按给定维度创建）"""
+
+    @abstractmethod
+    def count(self) -> int:
+        """集合中的点数量"""
+
+    @abstractmethod
+    def upsert(self, points: List[BackendPoint]):
+        """写入或覆盖点，返回时数据已持久化；失败时抛出异常"""
+
+    @abstractmethod
+    def search(self, vector: List[float], top_k: int, filters: Optional[Dict[str, Any]] = None) -> List[BackendHit]:
+        """按余弦相似度检索最相近的点；filters 为 normalize_filter 规范化后的过滤条件"""
+
+    def search_batch(
+        self,
+        vectors: List[List[float]],
+        top_k: int,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[BackendHit]]:
+        """批量检索，结果与输入顺序一致（默认逐条检索，后端可覆盖为一次批量请求）"""
+        return [self.search(vector, top_k, filters) for vector in vectors]
+
+    @abstractmethod
+    def retrieve(self, ids: List[str], fields: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """按ID读取payload（fields为None时返回完整payload），不存在的ID不出现在结果中"""
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        """删除点（不存在的ID忽略）"""
+
+    @abstractmethod
+    def scroll(self, batch_size: int = 1000, with_payload: bool = True) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+        """分页遍历所有点，产出 (id, payload)"""
+
+    @property
+    def durable(self) -> bool:
+        """upsert 返回后数据是否已持久化；为False时需 flush 之后才能记录导入断点"""
+        return True
+
+    def flush(self):
+        """将缓冲的数据写入磁盘（默认无操作）"""
+
+    def close(self):
+        """释放资源"""
+        self.flush()
+
+    @abstractmethod
+    def info(self) -> Dict[str, Any]:
+        """后端状态信息，用于调试接口"""
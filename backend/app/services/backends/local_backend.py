@@ -0,0 +1,537 @@
+import os
+import math
+import json
+import sqlite3
+import threading
+import numpy as np
+from typing import List, Dict, Any, Optional, Iterator, Tuple, NamedTuple
+from app.services.backends.base import VectorBackend, BackendPoint, BackendHit, quantization_from_env
+from app.services.filters import KEYWORD_FILTER_FIELDS, DATE_FIELD
+
+# 缺少生效日期的行使用的哨兵值，任何 effective_on 条件都不满足
+_NO_DATE = np.iinfo(np.int64).max
+
+# uint8 每个取值中1的位数，用于二值码的汉明距离
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount_rows(bits: np.ndarray) -> np.ndarray:
+    """每行中1的位数；numpy 2 使用 bitwise_count，否则查表"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bits).sum(axis=1, dtype=np.int32)
+    return _POPCOUNT[bits].sum(axis=1, dtype=np.int32)
+
+
+class _SearchView(NamedTuple):
+    """检索开始时在锁内取得的矩阵引用与有效行掩码，打分在锁外进行"""
+    matrix: np.ndarray
+    codes: Optional[np.ndarray]
+    scales: Optional[np.ndarray]
+    valid: np.ndarray  # 长度为检索时的 _next_row，已合并过滤条件
+    versions: np.ndarray  # 检索时各行的写入版本，解析结果时用于识别打分期间被改写的行
+
+
+class LocalBackend(VectorBackend):
+    """本地NumPy平铺索引后端
+
+    归一化后的向量保存在一个连续的 float32/float16 矩阵中（内存映射的 .npy 文件，
+    预分配容量，写入时原地更新，容量不足时倍增），payload 保存在旁路的 SQLite 中。
+    检索是一次向量化矩阵乘法加 argpartition。重启时只需映射文件，无需重新嵌入；
+    多个只读进程可以共享同一份映射页。
+
+    开启量化（VECTOR_QUANTIZATION=int8/binary）时另存一份压缩码矩阵：int8 为每行
+    按最大绝对值缩放的标量量化码（每维1字节，外加每行一个缩放系数），binary 为按符号
+    打包的位码（每维1比特）。检索先在压缩码上选出 top_k × 过采样倍数 个候选，再读取
+    这些候选的原始向量重打分，原始矩阵只有候选行会被换入内存。
+
+    可过滤字段在内存中按列缓存：关键词字段为每行的取值编号（int32，-1表示缺失），
+    生效日期为每行的整数日期，写入与删除时同步更新，检索时直接向量化求出行掩码。
+    """
+
+    name = "local"
+
+    # 矩阵乘法分块行数，限制 float16 矩阵升精度时的临时内存
+    SEARCH_BLOCK_ROWS = 65536
+    # 量化检索的分块行数：每块解码为float32后留在CPU缓存中，供同批所有查询共用
+    QUANTIZED_BLOCK_ROWS = 2048
+    # 批量检索时分数矩阵的元素上限（约64MB），超过时按查询分组计算
+    SCORE_BUDGET = 16 * 1024 * 1024
+    INITIAL_CAPACITY = 1024
+
+    def __init__(
+        self,
+        collection_name: str,
+        index_dir: Optional[str] = None,
+        dtype: Optional[str] = None,
+        quantization: Optional[str] = None,
+        oversampling: Optional[float] = None,
+        rescore: Optional[bool] = None
+    ):
+        self.collection_name = collection_name
+        base_dir = index_dir or os.getenv("LOCAL_INDEX_DIR", "./.cache/local_index")
+        self.index_dir = os.path.join(base_dir, collection_name)
+        self.dtype = np.dtype(dtype or os.getenv("LOCAL_INDEX_DTYPE", "float32"))
+        self.vectors_path = os.path.join(self.index_dir, "vectors.npy")
+        self.db_path = os.path.join(self.index_dir, "payloads.sqlite")
+        self.dim: Optional[int] = None
+
+        self.quantization, self.oversampling, self.rescore = quantization_from_env(quantization)
+        self.oversampling = oversampling or self.oversampling
+        self.rescore = self.rescore if rescore is None else rescore
+        self.codes_path = os.path.join(self.index_dir, f"codes_{self.quantization}.npy")
+        self.scales_path = os.path.join(self.index_dir, "codes_int8_scales.npy")
+        self._codes: Optional[np.memmap] = None
+        self._scales: Optional[np.memmap] = None
+
+        self._lock = threading.RLock()
+        self._matrix: Optional[np.memmap] = None
+        self._valid = np.zeros(0, dtype=bool)
+        # 每行的写入版本：行被写入、更新或删除时加一，空闲行复用后版本必然变化
+        self._versions = np.zeros(0, dtype=np.int64)
+        self._rows: Dict[str, int] = {}
+        self._ids: Dict[int, str] = {}
+        self._free_rows: List[int] = []
+        self._next_row = 0
+        # 过滤字段的列缓存：取值到编号的词表、每行的取值编号、每行的生效日期
+        self._field_vocab: Dict[str, Dict[str, int]] = {field: {} for field in KEYWORD_FILTER_FIELDS}
+        self._field_codes: Dict[str, np.ndarray] = {
+            field: np.full(0, -1, dtype=np.int32) for field in KEYWORD_FILTER_FIELDS
+        }
+        self._dates = np.full(0, _NO_DATE, dtype=np.int64)
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS points (row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, payload TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        # 过滤条件改为在内存列缓存上求值，旧版本建立的表达式索引只会拖慢写入
+        for field in KEYWORD_FILTER_FIELDS + (DATE_FIELD,):
+            self._db.execute(f"DROP INDEX IF EXISTS idx_points_{field}")
+        self._db.commit()
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def ensure_collection(self, dim: int):
+        """打开（或创建）向量矩阵并从SQLite恢复行映射"""
+        with self._lock:
+            stored_dim = self._meta("dim")
+            stored_dtype = self._meta("dtype")
+            if stored_dim is not None and (int(stored_dim) != dim or stored_dtype != self.dtype.name):
+                print(f"⚠ 本地索引维度或精度与当前配置不一致 ({stored_dim}/{stored_dtype})，重建索引")
+                self._db.execute("DELETE FROM points")
+                self._db.commit()
+                if os.path.exists(self.vectors_path):
+                    os.remove(self.vectors_path)
+            self.dim = dim
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)", (str(dim),))
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dtype', ?)", (self.dtype.name,))
+            self._db.commit()
+
+            if os.path.exists(self.vectors_path):
+                self._matrix = np.load(self.vectors_path, mmap_mode="r+")
+            else:
+                self._matrix = np.lib.format.open_memmap(
+                    self.vectors_path, mode="w+", dtype=self.dtype, shape=(self.INITIAL_CAPACITY, dim)
+                )
+
+            capacity = self._matrix.shape[0]
+            self._valid = np.zeros(capacity, dtype=bool)
+            self._versions = np.zeros(capacity, dtype=np.int64)
+            self._rows, self._ids = {}, {}
+            self._reset_filter_columns(capacity)
+            # 向量文件先于SQLite落盘，超出矩阵容量的行说明向量未写入，丢弃后会被增量导入重新写入
+            self._db.execute("DELETE FROM points WHERE row >= ?", (capacity,))
+            self._db.commit()
+            fields = KEYWORD_FILTER_FIELDS + (DATE_FIELD,)
+            columns = ", ".join(f"json_extract(payload, '$.{field}')" for field in fields)
+            for row, point_id, *values in self._db.execute(f"SELECT row, id, {columns} FROM points"):
+                self._rows[point_id] = row
+                self._ids[row] = point_id
+                self._valid[row] = True
+                self._set_filter_columns(row, dict(zip(fields, values)))
+            self._next_row = max(self._ids, default=-1) + 1
+            self._free_rows = [row for row in range(self._next_row) if not self._valid[row]]
+            if self.quantization != "none":
+                self._open_codes(capacity)
+            print(f"✓ 本地索引已加载: {len(self._rows)} 个点 ({self.index_dir}, 量化: {self.quantization})")
+
+    def _code_shape(self, capacity: int) -> Tuple[int, int]:
+        if self.quantization == "binary":
+            return capacity, (self.dim + 7) // 8
+        return capacity, self.dim
+
+    def _open_codes(self, capacity: int):
+        """打开压缩码矩阵；不存在或与向量矩阵不一致时从原始向量重建"""
+        code_dtype = np.uint8 if self.quantization == "binary" else np.int8
+        if os.path.exists(self.codes_path) and self._meta("codes") == self.quantization:
+            codes = np.load(self.codes_path, mmap_mode="r+")
+            scales_ok = self.quantization != "int8" or os.path.exists(self.scales_path)
+            if codes.shape == self._code_shape(capacity) and codes.dtype == code_dtype and scales_ok:
+                self._codes = codes
+                if self.quantization == "int8":
+                    self._scales = np.load(self.scales_path, mmap_mode="r+")
+                return
+            del codes
+
+        if self._next_row:
+            print(f"正在从原始向量重建 {self.quantization} 量化码...")
+        self._codes = np.lib.format.open_memmap(
+            self.codes_path, mode="w+", dtype=code_dtype, shape=self._code_shape(capacity)
+        )
+        if self.quantization == "int8":
+            self._scales = np.lib.format.open_memmap(
+                self.scales_path, mode="w+", dtype=np.float32, shape=(capacity,)
+            )
+        for start in range(0, self._next_row, self.SEARCH_BLOCK_ROWS):
+            end = min(start + self.SEARCH_BLOCK_ROWS, self._next_row)
+            self._write_codes(np.arange(start, end), self._matrix[start:end].astype(np.float32))
+        self._flush_codes()
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('codes', ?)", (self.quantization,))
+        self._db.commit()
+
+    def _write_codes(self, rows, vectors: np.ndarray):
+        """将归一化后的向量量化并写入压缩码矩阵"""
+        if self.quantization == "binary":
+            self._codes[rows] = np.packbits(vectors > 0, axis=1)
+        else:
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self._codes[rows] = np.round(vectors / scales[:, None]).astype(np.int8)
+            self._scales[rows] = scales
+
+    def _flush_codes(self):
+        if self._codes is not None:
+            self._codes.flush()
+        if self._scales is not None:
+            self._scales.flush()
+
+    def _grow_file(self, path: str, array: np.memmap, shape: Tuple[int, ...]) -> np.memmap:
+        """复制到更大的新文件后原子替换，返回新的内存映射"""
+        tmp_path = path + ".tmp.npy"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=array.dtype, shape=shape)
+        grown[:self._next_row] = array[:self._next_row]
+        grown.flush()
+        del grown
+        array.flush()
+        os.replace(tmp_path, path)
+        return np.load(path, mmap_mode="r+")
+
+    def _grow(self, min_capacity: int):
+        """容量不足时倍增矩阵文件（量化码矩阵同步扩容）"""
+        capacity = self._matrix.shape[0]
+        while capacity < min_capacity:
+            capacity *= 2
+        self._matrix = self._grow_file(self.vectors_path, self._matrix, (capacity, self.dim))
+        if self._codes is not None:
+            self._codes = self._grow_file(self.codes_path, self._codes, self._code_shape(capacity))
+        if self._scales is not None:
+            self._scales = self._grow_file(self.scales_path, self._scales, (capacity,))
+        valid = np.zeros(capacity, dtype=bool)
+        valid[:len(self._valid)] = self._valid
+        self._valid = valid
+        versions = np.zeros(capacity, dtype=np.int64)
+        versions[:len(self._versions)] = self._versions
+        self._versions = versions
+        for field, codes in self._field_codes.items():
+            grown = np.full(capacity, -1, dtype=np.int32)
+            grown[:len(codes)] = codes
+            self._field_codes[field] = grown
+        dates = np.full(capacity, _NO_DATE, dtype=np.int64)
+        dates[:len(self._dates)] = self._dates
+        self._dates = dates
+
+    def _reset_filter_columns(self, capacity: int):
+        self._field_vocab = {field: {} for field in KEYWORD_FILTER_FIELDS}
+        self._field_codes = {field: np.full(capacity, -1, dtype=np.int32) for field in KEYWORD_FILTER_FIELDS}
+        self._dates = np.full(capacity, _NO_DATE, dtype=np.int64)
+
+    def _set_filter_columns(self, row: int, payload: Dict[str, Any]):
+        """把一行payload中的可过滤字段写入列缓存；非字符串取值与过滤条件永不相等，按缺失处理"""
+        for field in KEYWORD_FILTER_FIELDS:
+            value = payload.get(field)
+            if isinstance(value, str):
+                vocab = self._field_vocab[field]
+                self._field_codes[field][row] = vocab.setdefault(value, len(vocab))
+            else:
+                self._field_codes[field][row] = -1
+        effective = payload.get(DATE_FIELD)
+        if isinstance(effective, (int, float)) and not isinstance(effective, bool):
+            self._dates[row] = int(effective)
+        else:
+            self._dates[row] = _NO_DATE
+
+    def count(self) -> int:
+        return len(self._rows)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def upsert(self, points: List[BackendPoint]):
+        if not points:
+            return
+        # 同一批次内重复的ID只保留最后一个
+        points = list({p.id: p for p in points}.values())
+        with self._lock:
+            rows = []
+            new_count = sum(1 for p in points if p.id not in self._rows)
+            needed = self._next_row + max(0, new_count - len(self._free_rows))
+            if needed > self._matrix.shape[0]:
+                self._grow(needed)
+            for point in points:
+                row = self._rows.get(point.id)
+                if row is None:
+                    row = self._free_rows.pop() if self._free_rows else self._next_row
+                    if row == self._next_row:
+                        self._next_row += 1
+                rows.append(row)
+
+            vectors = self._normalize(np.asarray([p.vector for p in points], dtype=np.float32))
+            self._matrix[rows] = vectors.astype(self.dtype)
+            if self._codes is not None:
+                self._write_codes(rows, vectors)
+            # 先落盘向量，再提交payload，保证SQLite中的每一行都有对应的向量
+            self._matrix.flush()
+            self._flush_codes()
+            self._db.executemany(
+                "INSERT OR REPLACE INTO points (row, id, payload) VALUES (?, ?, ?)",
+                [(row, p.id, json.dumps(p.payload, ensure_ascii=False)) for row, p in zip(rows, points)]
+            )
+            self._db.commit()
+            for row, point in zip(rows, points):
+                self._rows[point.id] = row
+                self._ids[row] = point.id
+                self._valid[row] = True
+                self._set_filter_columns(row, point.payload)
+            self._versions[rows] += 1
+        print(f"✓ 成功添加 {len(points)} 个文档到本地索引")
+
+    def _scores(self, view: _SearchView, queries: np.ndarray) -> np.ndarray:
+        """分块计算所有行与一组查询向量的余弦相似度，返回 (查询数, 行数)，无效行为 -inf"""
+        n = len(view.valid)
+        scores = np.empty((len(queries), n), dtype=np.float32)
+        for start in range(0, n, self.SEARCH_BLOCK_ROWS):
+            block = view.matrix[start:min(start + self.SEARCH_BLOCK_ROWS, n)]
+            scores[:, start:start + len(block)] = queries @ block.astype(np.float32, copy=False).T
+        scores[:, ~view.valid] = -np.inf
+        return scores
+
+    def _approx_scores(self, view: _SearchView, queries: np.ndarray) -> np.ndarray:
+        """在压缩码上分块计算一组查询的近似相似度，返回 (查询数, 行数)，无效行为 -inf
+
+        每个块只解码一次，同批的所有查询共用一次矩阵乘法；二值码解码为 ±1 后的内积
+        等于 dim - 2 × 汉明距离。单条二值查询直接在位码上计算汉明距离，不解码。
+        """
+        n = len(view.valid)
+        scores = np.empty((len(queries), n), dtype=np.float32)
+        binary = self.quantization == "binary"
+        if binary and len(queries) == 1:
+            query_bits = np.packbits(queries[0] > 0)
+            for start in range(0, n, self.SEARCH_BLOCK_ROWS):
+                block = view.codes[start:min(start + self.SEARCH_BLOCK_ROWS, n)]
+                hamming = _popcount_rows(np.bitwise_xor(block, query_bits))
+                scores[0, start:start + len(block)] = 1.0 - 2.0 * hamming / self.dim
+        else:
+            if binary:
+                queries = np.where(queries > 0, 1.0, -1.0).astype(np.float32) / self.dim
+            buffer = np.empty((self.QUANTIZED_BLOCK_ROWS, self.dim), dtype=np.float32)
+            for start in range(0, n, self.QUANTIZED_BLOCK_ROWS):
+                end = min(start + self.QUANTIZED_BLOCK_ROWS, n)
+                block = buffer[:end - start]
+                if binary:
+                    np.copyto(block, np.unpackbits(view.codes[start:end], axis=1, count=self.dim), casting="unsafe")
+                    block *= 2
+                    block -= 1
+                else:
+                    np.copyto(block, view.codes[start:end], casting="unsafe")
+                np.matmul(queries, block.T, out=scores[:, start:end])
+            if not binary:
+                scores *= view.scales[:n]
+        scores[:, ~view.valid] = -np.inf
+        return scores
+
+    def _quantized_search(
+        self,
+        view: _SearchView,
+        query: np.ndarray,
+        approx: np.ndarray,
+        top_k: int
+    ) -> Tuple[List[int], Dict[int, float]]:
+        """按近似相似度过采样选候选，再用原始向量重打分"""
+        candidates = self._top_rows(approx, max(top_k, math.ceil(top_k * self.oversampling)))
+        if not self.rescore or not candidates:
+            rows = candidates[:top_k]
+            return rows, {row: float(approx[row]) for row in rows}
+        # 按行号排序读取，减少随机访问
+        ordered = np.sort(np.asarray(candidates))
+        exact = view.matrix[ordered].astype(np.float32) @ query
+        best = np.argsort(-exact)[:top_k]
+        rows = ordered[best].tolist()
+        return rows, {row: float(score) for row, score in zip(rows, exact[best])}
+
+    def _filter_mask(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """在过滤字段的列缓存上求出满足条件的行掩码（字段内取值为或，字段间为与）；不过滤时返回None"""
+        if not filters:
+            return None
+        n = self._next_row
+        masks = []
+        for field in KEYWORD_FILTER_FIELDS:
+            values = filters.get(field)
+            if values:
+                vocab = self._field_vocab[field]
+                wanted = np.asarray([vocab[v] for v in values if v in vocab], dtype=np.int32)
+                masks.append(np.isin(self._field_codes[field][:n], wanted))
+        if "effective_on" in filters:
+            masks.append(self._dates[:n] <= filters["effective_on"])
+        if not masks:
+            return None
+        return np.logical_and.reduce(masks)
+
+    def _top_rows(self, scores: np.ndarray, top_k: int) -> List[int]:
+        k = min(top_k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        return candidates[np.argsort(-scores[candidates])].tolist()
+
+    def _payloads_for_rows(self, rows: List[int]) -> Dict[int, Dict[str, Any]]:
+        if not rows:
+            return {}
+        placeholders = ",".join("?" * len(rows))
+        cursor = self._db.execute(f"SELECT row, payload FROM points WHERE row IN ({placeholders})", rows)
+        return {row: json.loads(payload) for row, payload in cursor}
+
+    def search(self, vector: List[float], top_k: int, filters: Optional[Dict[str, Any]] = None) -> List[BackendHit]:
+        return self.search_batch([vector], top_k, filters)[0]
+
+    def search_batch(
+        self,
+        vectors: List[List[float]],
+        top_k: int,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[BackendHit]]:
+        """批量检索：多个查询共用一次矩阵乘法和一次payload查询
+
+        锁只保护取矩阵引用、行数和过滤掩码，以及最后的行号到ID与payload的查询；
+        矩阵乘法和top-k在锁外进行，检索线程池中的并发查询与写入互不阻塞。
+        打分期间被删除、更新或复用给其他点的行（写入版本已变化）不会出现在结果中，
+        避免把旧向量的得分和过滤结果错配给新的点。
+        """
+        if not vectors:
+            return []
+        queries = self._normalize(np.asarray(vectors, dtype=np.float32))
+        with self._lock:
+            if not self._rows:
+                return [[] for _ in vectors]
+            mask = self._filter_mask(filters)
+            if mask is not None and not mask.any():
+                return [[] for _ in vectors]
+            valid = self._valid[:self._next_row].copy()
+            if mask is not None:
+                valid &= mask
+            view = _SearchView(
+                self._matrix, self._codes, self._scales, valid, self._versions[:self._next_row].copy()
+            )
+
+        ranked: List[Tuple[List[int], Dict[int, float]]] = []
+        group = max(1, self.SCORE_BUDGET // max(len(valid), 1))
+        for start in range(0, len(queries), group):
+            batch = queries[start:start + group]
+            if view.codes is not None:
+                for query, approx in zip(batch, self._approx_scores(view, batch)):
+                    ranked.append(self._quantized_search(view, query, approx, top_k))
+            else:
+                for scores in self._scores(view, batch):
+                    rows = self._top_rows(scores, top_k)
+                    ranked.append((rows, {row: float(scores[row]) for row in rows}))
+
+        result_rows = sorted({row for rows, _ in ranked for row in rows})
+        with self._lock:
+            ids = {
+                row: self._ids.get(row) if self._versions[row] == view.versions[row] else None
+                for row in result_rows
+            }
+            payloads = self._payloads_for_rows([row for row in result_rows if ids[row] is not None])
+        return [
+            [
+                BackendHit(id=ids[row], score=scores[row], payload=payloads.get(row, {}))
+                for row in rows if ids[row] is not None
+            ]
+            for rows, scores in ranked
+        ]
+
+    def retrieve(self, ids: List[str], fields: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            cursor = self._db.execute(f"SELECT id, payload FROM points WHERE id IN ({placeholders})", ids)
+            results = {}
+            for point_id, payload in cursor:
+                data = json.loads(payload)
+                if fields is not None:
+                    data = {k: v for k, v in data.items() if k in fields}
+                results[point_id] = data
+            return results
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            rows = [self._rows.pop(point_id) for point_id in ids if point_id in self._rows]
+            if not rows:
+                return
+            self._db.executemany("DELETE FROM points WHERE row = ?", [(row,) for row in rows])
+            self._db.commit()
+            for row in rows:
+                self._valid[row] = False
+                self._ids.pop(row, None)
+                self._free_rows.append(row)
+            for codes in self._field_codes.values():
+                codes[rows] = -1
+            self._dates[rows] = _NO_DATE
+            self._versions[rows] += 1
+
+    def scroll(self, batch_size: int = 1000, with_payload: bool = True) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+        last_row = -1
+        while True:
+            with self._lock:
+                batch = self._db.execute(
+                    "SELECT row, id, payload FROM points WHERE row > ? ORDER BY row LIMIT ?",
+                    (last_row, batch_size)
+                ).fetchall()
+            if not batch:
+                return
+            for row, point_id, payload in batch:
+                yield point_id, (json.loads(payload) if with_payload else None)
+            last_row = batch[-1][0]
+
+    def flush(self):
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+            self._flush_codes()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._db.close()
+
+    def info(self) -> Dict[str, Any]:
+        capacity = self._matrix.shape[0] if self._matrix is not None else 0
+        return {
+            "backend": self.name,
+            "collection_name": self.collection_name,
+            "index_dir": self.index_dir,
+            "points_count": len(self._rows),
+            "capacity": capacity,
+            "dtype": self.dtype.name,
+            "matrix_bytes": capacity * (self.dim or 0) * self.dtype.itemsize,
+            "quantization": self.quantization,
+            "codes_bytes": (self._codes.nbytes if self._codes is not None else 0)
+                           + (self._scales.nbytes if self._scales is not None else 0)
+        }
@@ -0,0 +1,423 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, PointIdsList,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    BinaryQuantization, BinaryQuantizationConfig,
+    SearchParams, QuantizationSearchParams,
+    Filter, FieldCondition, MatchValue, MatchAny, Range, PayloadSchemaType, SearchRequest
+)
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+from app.services.backends.base import VectorBackend, BackendPoint, BackendHit, quantization_from_env
+from app.services.filters import KEYWORD_FILTER_FIELDS, DATE_FIELD
+
+
+def _is_connection_error(e: Exception) -> bool:
+    error_str = str(e).lower()
+    return "timeout" in error_str or "connection" in error_str or "timed out" in error_str
+
+
+class QdrantBackend(VectorBackend):
+    """Qdrant后端：优先连接远程Qdrant，连接失败时降级为内存模式
+
+    内存模式下会定期把向量和payload写成本地快照，启动或降级时先从快照恢复，
+    避免重启后重新嵌入全部文档。
+    """
+
+    name = "qdrant"
+
+    def __init__(self, collection_name: str):
+        self.host = os.getenv("QDRANT_HOST", "localhost")
+        self.port = int(os.getenv("QDRANT_PORT", "6333"))
+        self.collection_name = collection_name
+        self.use_memory = False
+        self.dim: Optional[int] = None
+
+        # 向量量化：量化向量常驻内存用于候选检索，原始向量存放在磁盘上用于重打分
+        self.quantization, self.oversampling, self.rescore = quantization_from_env()
+
+        # 内存模式快照配置
+        base_dir = os.getenv("MEMORY_SNAPSHOT_DIR", "./.cache/memory_snapshot")
+        self.snapshot_dir = os.path.join(base_dir, collection_name)
+        self.snapshot_interval = float(os.getenv("MEMORY_SNAPSHOT_INTERVAL", "30"))
+        self.snapshot_dtype = np.dtype(os.getenv("MEMORY_SNAPSHOT_DTYPE", "float32"))
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_dirty = False
+        self._snapshot_stop = threading.Event()
+        self._snapshot_thread: Optional[threading.Thread] = None
+
+        # 尝试连接Qdrant，设置较短的超时时间
+        try:
+            print(f"尝试连接到Qdrant: {self.host}:{self.port}")
+            self.client = QdrantClient(
+                host=self.host,
+                port=self.port,
+                timeout=3.0  # 3秒超时
+            )
+            # 快速测试连接
+            try:
+                self.client.get_collections()
+                print(f"✓ 成功连接到Qdrant: {self.host}:{self.port}")
+            except Exception as e:
+                print(f"⚠ Qdrant连接测试失败: {e}")
+                self._switch_to_memory()
+        except Exception as e:
+            print(f"⚠ 无法连接到Qdrant ({self.host}:{self.port}): {e}")
+            self._switch_to_memory()
+
+    def _switch_to_memory(self):
+        print("切换到内存模式...")
+        self.client = QdrantClient(":memory:")
+        if self.dim is not None:
+            # 运行中降级：远程已写入的数据不在内存中
+            self.generation += 1
+        self.use_memory = True
+
+    def _on_memory_collection_ready(self):
+        """内存模式集合创建后：从快照恢复并启动定期快照线程"""
+        self.restore_snapshot()
+        if self.snapshot_interval > 0 and self._snapshot_thread is None:
+            self._snapshot_thread = threading.Thread(
+                target=self._snapshot_loop,
+                name="qdrant-memory-snapshot",
+                daemon=True
+            )
+            self._snapshot_thread.start()
+
+    def _snapshot_loop(self):
+        while not self._snapshot_stop.wait(self.snapshot_interval):
+            try:
+                self.save_snapshot()
+            except Exception as e:
+                print(f"⚠ 内存模式快照写入失败: {e}")
+
+    def save_snapshot(self):
+        """将内存模式中的向量和payload写入本地快照（仅在有变更时写入，原子替换）"""
+        if not self.use_memory or not self._snapshot_dirty:
+            return
+        with self._snapshot_lock:
+            self._snapshot_dirty = False
+            ids, payloads, vectors = [], [], []
+            offset = None
+            while True:
+                records, offset = self.client.scroll(
+                    collection_name=self.collection_name,
+                    limit=1000,
+                    offset=offset,
+                    with_payload=True,
+                    with_vectors=True
+                )
+                for record in records:
+                    ids.append(str(record.id))
+                    payloads.append(record.payload or {})
+                    vectors.append(record.vector)
+                if offset is None:
+                    break
+
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            matrix = np.asarray(vectors, dtype=self.snapshot_dtype).reshape(len(ids), self.dim)
+            vectors_path = os.path.join(self.snapshot_dir, "vectors.npy")
+            points_path = os.path.join(self.snapshot_dir, "points.jsonl")
+            manifest_path = os.path.join(self.snapshot_dir, "manifest.json")
+            np.save(vectors_path + ".tmp.npy", matrix)
+            with open(points_path + ".tmp", "w", encoding="utf-8") as f:
+                for point_id, payload in zip(ids, payloads):
+                    f.write(json.dumps({"id": point_id, "payload": payload}, ensure_ascii=False) + "\n")
+            manifest = {"count": len(ids), "dim": self.dim, "created_at": time.time()}
+            with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            os.replace(vectors_path + ".tmp.npy", vectors_path)
+            os.replace(points_path + ".tmp", points_path)
+            os.replace(manifest_path + ".tmp", manifest_path)
+            print(f"✓ 内存模式快照已保存: {len(ids)} 个点 ({self.snapshot_dir})")
+
+    def restore_snapshot(self) -> int:
+        """从本地快照恢复内存模式数据，返回恢复的点数"""
+        manifest_path = os.path.join(self.snapshot_dir, "manifest.json")
+        if not os.path.exists(manifest_path):
+            return 0
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("dim") != self.dim:
+                print(f"⚠ 快照维度 ({manifest.get('dim')}) 与当前模型不一致，忽略快照")
+                return 0
+            matrix = np.load(os.path.join(self.snapshot_dir, "vectors.npy"))
+            with open(os.path.join(self.snapshot_dir, "points.jsonl"), "r", encoding="utf-8") as f:
+                records = [json.loads(line) for line in f if line.strip()]
+            if len(records) != len(matrix) or len(records) != manifest.get("count"):
+                print("⚠ 快照文件不完整，忽略快照")
+                return 0
+
+            batch_size = 1000
+            for i in range(0, len(records), batch_size):
+                self.client.upsert(
+                    collection_name=self.collection_name,
+                    points=[
+                        PointStruct(id=record["id"], vector=vector.astype(np.float32).tolist(), payload=record["payload"])
+                        for record, vector in zip(records[i:i + batch_size], matrix[i:i + batch_size])
+                    ],
+                    wait=True
+                )
+            print(f"✓ 从快照恢复内存模式数据: {len(records)} 个点")
+            return len(records)
+        except Exception as e:
+            print(f"⚠ 快照恢复失败: {e}")
+            return 0
+
+    def _quantization_config(self):
+        if self.quantization == "int8":
+            return ScalarQuantization(
+                scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+        if self.quantization == "binary":
+            return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+        return None
+
+    def _search_params(self) -> Optional[SearchParams]:
+        if self.quantization == "none":
+            return None
+        return SearchParams(
+            quantization=QuantizationSearchParams(rescore=self.rescore, oversampling=self.oversampling)
+        )
+
+    def _create_collection(self):
+        quantized = self.quantization != "none"
+        self.client.create_collection(
+            collection_name=self.collection_name,
+            vectors_config=VectorParams(
+                size=self.dim,
+                distance=Distance.COSINE,
+                # 量化后原始向量只在重打分时读取，放到磁盘上
+                on_disk=True if quantized else None
+            ),
+            quantization_config=self._quantization_config()
+        )
+
+    def _create_payload_indexes(self):
+        """为可过滤字段建立payload索引，过滤检索不随集合增长而变慢（重复创建无副作用）"""
+        fields = [(name, PayloadSchemaType.KEYWORD) for name in KEYWORD_FILTER_FIELDS]
+        fields.append((DATE_FIELD, PayloadSchemaType.INTEGER))
+        for field_name, schema in fields:
+            try:
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field_name,
+                    field_schema=schema
+                )
+            except Exception as e:
+                print(f"⚠ 创建payload索引 {field_name} 失败: {e}")
+
+    @staticmethod
+    def _to_qdrant_filter(filters: Optional[Dict[str, Any]]) -> Optional[Filter]:
+        """将规范化后的过滤条件转换为Qdrant原生Filter"""
+        if not filters:
+            return None
+        conditions = []
+        for key in KEYWORD_FILTER_FIELDS:
+            values = filters.get(key)
+            if not values:
+                continue
+            match = MatchValue(value=values[0]) if len(values) == 1 else MatchAny(any=values)
+            conditions.append(FieldCondition(key=key, match=match))
+        if "effective_on" in filters:
+            conditions.append(FieldCondition(key=DATE_FIELD, range=Range(lte=filters["effective_on"])))
+        return Filter(must=conditions) if conditions else None
+
+    def _sync_quantization(self):
+        """已存在的远程集合与当前量化配置不一致时更新集合配置"""
+        desired = self._quantization_config()
+        if desired is None:
+            return
+        current = self.client.get_collection(self.collection_name).config.quantization_config
+        if current is None or type(current) is not type(desired):
+            self.client.update_collection(
+                collection_name=self.collection_name,
+                quantization_config=desired
+            )
+            print(f"✓ 集合量化配置已更新: {self.quantization}")
+
+    def ensure_collection(self, dim: int):
+        """确保集合存在"""
+        self.dim = dim
+        try:
+            # 对于内存模式，直接尝试创建集合
+            if self.use_memory:
+                try:
+                    self._create_collection()
+                    print(f"✓ 在内存模式中创建集合: {self.collection_name}")
+                    self._create_payload_indexes()
+                    self._on_memory_collection_ready()
+                except Exception as e:
+                    # 集合可能已存在
+                    if "already exists" in str(e).lower() or "exists" in str(e).lower():
+                        print(f"集合 {self.collection_name} 已存在")
+                    else:
+                        raise
+            else:
+                # 远程模式，检查集合是否存在
+                try:
+                    collections = self.client.get_collections().collections
+                    collection_names = [c.name for c in collections]
+
+                    if self.collection_name not in collection_names:
+                        self._create_collection()
+                        print(f"✓ 创建集合: {self.collection_name}")
+                    else:
+                        print(f"集合 {self.collection_name} 已存在")
+                        self._sync_quantization()
+                    self._create_payload_indexes()
+                except Exception as e:
+                    print(f"⚠ 检查集合时出错: {e}")
+                    # 如果远程连接有问题，切换到内存模式
+                    if _is_connection_error(e):
+                        self._switch_to_memory()
+                        self.ensure_collection(dim)  # 递归调用
+        except Exception as e:
+            print(f"✗ 集合初始化错误: {e}")
+            import traceback
+            traceback.print_exc()
+
+    def count(self) -> int:
+        return self.client.get_collection(self.collection_name).points_count or 0
+
+    def upsert(self, points: List[BackendPoint]):
+        """写入点，远程超时时切换到内存模式重试"""
+        qdrant_points = [PointStruct(id=p.id, vector=p.vector, payload=p.payload) for p in points]
+        try:
+            self.client.upsert(
+                collection_name=self.collection_name,
+                points=qdrant_points,
+                wait=True
+            )
+            print(f"✓ 成功添加 {len(points)} 个文档到向量库")
+        except Exception as e:
+            if not _is_connection_error(e):
+                raise
+            print(f"⚠ 远程Qdrant操作超时，切换到内存模式...")
+            # 切换到内存模式并重试
+            self._switch_to_memory()
+            # 重新创建集合
+            try:
+                self._create_collection()
+                print(f"✓ 在内存模式中创建集合")
+                self._create_payload_indexes()
+                self._on_memory_collection_ready()
+            except Exception as e2:
+                if "already exists" not in str(e2).lower():
+                    print(f"⚠ 创建集合时出错（可能已存在）: {e2}")
+            # 重试插入
+            self.client.upsert(
+                collection_name=self.collection_name,
+                points=qdrant_points,
+                wait=True
+            )
+            print(f"✓ 成功添加 {len(points)} 个文档到向量库（内存模式）")
+        self._snapshot_dirty = self.use_memory
+
+    def search(self, vector: List[float], top_k: int, filters: Optional[Dict[str, Any]] = None) -> List[BackendHit]:
+        hits = self.client.search(
+            collection_name=self.collection_name,
+            query_vector=vector,
+            limit=top_k,
+            query_filter=self._to_qdrant_filter(filters),
+            search_params=self._search_params()
+        )
+        return [BackendHit(id=str(hit.id), score=hit.score, payload=hit.payload or {}) for hit in hits]
+
+    def search_batch(
+        self,
+        vectors: List[List[float]],
+        top_k: int,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[BackendHit]]:
+        """一次 search_batch 请求完成全部查询"""
+        if not vectors:
+            return []
+        query_filter = self._to_qdrant_filter(filters)
+        search_params = self._search_params()
+        batches = self.client.search_batch(
+            collection_name=self.collection_name,
+            requests=[
+                SearchRequest(
+                    vector=vector,
+                    limit=top_k,
+                    filter=query_filter,
+                    params=search_params,
+                    with_payload=True
+                )
+                for vector in vectors
+            ]
+        )
+        return [
+            [BackendHit(id=str(hit.id), score=hit.score, payload=hit.payload or {}) for hit in hits]
+            for hits in batches
+        ]
+
+    def retrieve(self, ids: List[str], fields: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        records = self.client.retrieve(
+            collection_name=self.collection_name,
+            ids=ids,
+            with_payload=fields if fields is not None else True,
+            with_vectors=False
+        )
+        return {str(record.id): record.payload or {} for record in records}
+
+    def delete(self, ids: List[str]):
+        if self.use_memory:
+            # 内存模式删除不存在的ID会抛出KeyError，先过滤出已存在的点
+            ids = list(self.retrieve(ids, fields=[]))
+            if not ids:
+                return
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=PointIdsList(points=ids),
+            wait=True
+        )
+        self._snapshot_dirty = self.use_memory
+
+    def scroll(self, batch_size: int = 1000, with_payload: bool = True) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+        offset = None
+        while True:
+            records, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=with_payload,
+                with_vectors=False
+            )
+            for record in records:
+                yield str(record.id), record.payload
+            if offset is None:
+                return
+
+    @property
+    def durable(self) -> bool:
+        """内存模式的数据在写入快照前只存在于进程内存中"""
+        return not self.use_memory
+
+    def flush(self):
+        """内存模式下立即写入快照"""
+        try:
+            self.save_snapshot()
+        except Exception as e:
+            print(f"⚠ 内存模式快照写入失败: {e}")
+
+    def close(self):
+        self._snapshot_stop.set()
+        self.flush()
+
+    def info(self) -> Dict[str, Any]:
+        collection_info = self.client.get_collection(self.collection_name)
+        return {
+            "backend": self.name,
+            "mode": "memory" if self.use_memory else f"{self.host}:{self.port}",
+            "collection_name": self.collection_name,
+            "quantization": self.quantization,
+            "points_count": collection_info.points_count,
+            "vectors_count": collection_info.vectors_count
+        }
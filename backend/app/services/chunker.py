@@ -0,0 +1,248 @@
+import os
+import re
+import hashlib
+from typing import List, Dict, Any, Optional, Tuple
+
+_NUM = "零〇一二三四五六七八九十百千万两0-9０-９"
+
+# 法条结构层级：编 > 章 > 节 > 条，标题位于行首
+STATUTE_HEADINGS = [
+    re.compile(rf"(?m)^[ \t　]*(第[{_NUM}]+编)"),
+    re.compile(rf"(?m)^[ \t　]*(第[{_NUM}]+章)"),
+    re.compile(rf"(?m)^[ \t　]*(第[{_NUM}]+节)"),
+    re.compile(rf"(?m)^[ \t　]*(第[{_NUM}]+条(?:之[{_NUM}]+)?)"),
+]
+# 项：（一）（二）……，通常位于行首，也可能在句中连续列举
+ITEM_PATTERN = re.compile(rf"[（(][{_NUM}]+[）)]")
+SENTENCE_PATTERN = re.compile(r"(?<=[。！？；;])")
+
+# 裁判文书的段落标志：出现在句首（文首、换行或句号之后）
+JUDGMENT_SECTIONS = [
+    ("诉辩意见", re.compile(r"(?:诉称|辩称|起诉指控|公诉机关指控)")),
+    ("案件事实", re.compile(r"(?:经审理查明|本院查明|审理查明|法院查明|经审理认定)")),
+    ("裁判理由", re.compile(r"(?:本院认为|法院认为|本院经审查认为|二审法院认为)")),
+    ("裁判结果", re.compile(r"(?:判决如下|裁定如下|法院判决|依照.{0,60}?规定，判决)")),
+]
+# 段落标志距所在句子开头的最大字数（如 "原告张三诉称"）
+JUDGMENT_MARKER_MAX_OFFSET = 20
+
+
+def document_id(doc: Dict[str, Any]) -> str:
+    """文档ID；没有id的文档由正文与来源字段的哈希生成，保证重复导入时ID不变
+
+    来源字段参与哈希，不同法律中正文相同的条文（如"本法自公布之日起施行。"）不会合并为一个点。
+    """
+    if doc.get("id"):
+        return str(doc["id"])
+    raw = "\x00".join(
+        str(doc.get(field) or "") for field in ("content", "article_name", "section", "source_id", "url")
+    )
+    return "doc-" + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class LegalChunker:
+    """按法律文本结构切分长文档
+
+    法条按 编/章/节/条/款/项 逐级切分，裁判文书先按 诉辩意见/案件事实/裁判理由/裁判结果
+    切分，仍然过长的片段再按句子打包。不超过 max_chars 的文档保持原样，不切分。
+    过短的相邻片段会合并，避免产生脱离上下文的碎片。
+    """
+
+    def __init__(self, max_chars: Optional[int] = None, min_chars: Optional[int] = None):
+        self.max_chars = max_chars or int(os.getenv("CHUNK_MAX_CHARS", "400"))
+        self.min_chars = min_chars if min_chars is not None else int(os.getenv("CHUNK_MIN_CHARS", "80"))
+
+    @staticmethod
+    def parent_id(doc: Dict[str, Any]) -> str:
+        """父文档ID，见 document_id"""
+        return document_id(doc)
+
+    @staticmethod
+    def chunk_id(parent_id: str, index: int) -> str:
+        return f"{parent_id}#{index}"
+
+    def chunk(self, doc: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """将文档切分为子文档列表；文档足够短无需切分时返回None"""
+        content = (doc.get("content") or "").strip()
+        if len(content) <= self.max_chars:
+            return None
+        if doc.get("doc_type") == "case":
+            pieces = self._split_judgment(content)
+        else:
+            pieces = self._split_levels(content, [], 0)
+        pieces = self._merge_small(pieces)
+
+        parent_id = self.parent_id(doc)
+        source_id = doc.get("source_id", parent_id)
+        parent_section = doc.get("section", "")
+        chunks = []
+        for index, (path, text) in enumerate(pieces):
+            labels = [label for label in path if label not in parent_section]
+            chunks.append({
+                "id": self.chunk_id(parent_id, index),
+                "content": text,
+                "article_name": doc.get("article_name", ""),
+                "section": " ".join([parent_section, *labels]).strip(),
+                "source_id": f"{source_id}#{index + 1}",
+                "doc_type": doc.get("doc_type", "statute"),
+                "url": doc.get("url", ""),
+                "metadata": {
+                    **doc.get("metadata", {}),
+                    "parent_id": parent_id,
+                    "chunk_index": index,
+                    "chunk_count": len(pieces)
+                }
+            })
+        return chunks
+
+    def _split_levels(self, text: str, path: List[str], level: int) -> List[Tuple[List[str], str]]:
+        """从第level层开始寻找能把文本切开的结构层级，逐级向下递归"""
+        text = text.strip()
+        if len(text) <= self.max_chars:
+            return [(path, text)] if text else []
+
+        # 编/章/节/条 标题
+        for depth in range(level, len(STATUTE_HEADINGS)):
+            positions = [m.start(1) for m in STATUTE_HEADINGS[depth].finditer(text)]
+            if positions:
+                segments = self._split_at(text, positions)
+                pieces = []
+                for segment in segments:
+                    match = STATUTE_HEADINGS[depth].match(segment)
+                    label = [match.group(1)] if match else []
+                    pieces.extend(self._split_levels(segment, path + label, depth + 1))
+                return pieces
+
+        # 款：条文内的自然段
+        if level <= len(STATUTE_HEADINGS):
+            paragraphs = [p.strip() for p in text.split("\n") if p.strip()]
+            if len(paragraphs) > 1:
+                pieces = []
+                for number, paragraph in enumerate(paragraphs, 1):
+                    # 款只存在于条文之内
+                    label = [f"第{number}款"] if not path or "条" in path[-1] else []
+                    pieces.extend(self._split_levels(paragraph, path + label, len(STATUTE_HEADINGS) + 1))
+                return pieces
+
+        # 项：（一）（二）……，列举前的引导语单独成段
+        if level <= len(STATUTE_HEADINGS) + 1:
+            segments = self._split_at(text, [m.start() for m in ITEM_PATTERN.finditer(text)])
+            if len(segments) > 1:
+                pieces = []
+                for segment in segments:
+                    match = ITEM_PATTERN.match(segment)
+                    label = [f"第{match.group(0)[1:-1]}项"] if match else []
+                    pieces.extend(self._split_sentences(segment, path + label))
+                return pieces
+
+        return self._split_sentences(text, path)
+
+    def _split_judgment(self, text: str) -> List[Tuple[List[str], str]]:
+        """按裁判文书段落切分，各段再按自然段和句子切分"""
+        boundaries: List[Tuple[int, str]] = []
+        for label, pattern in JUDGMENT_SECTIONS:
+            for match in pattern.finditer(text):
+                # 段落从标志所在句子的开头切分，每种段落只取第一次出现
+                start = self._sentence_start(text, match.start())
+                if match.start() - start <= JUDGMENT_MARKER_MAX_OFFSET and all(start != b for b, _ in boundaries):
+                    boundaries.append((start, label))
+                    break
+        boundaries.sort()
+        positions = [start for start, _ in boundaries]
+        segments = self._split_at(text, positions)
+        labels = (["首部"] if not positions or positions[0] > 0 else []) + [label for _, label in boundaries]
+
+        pieces = []
+        for label, segment in zip(labels, segments):
+            if len(segment) <= self.max_chars:
+                pieces.append(([label], segment.strip()))
+                continue
+            for paragraph in (p.strip() for p in segment.split("\n")):
+                if paragraph:
+                    pieces.extend(self._split_sentences(paragraph, [label]))
+        return [(path, piece) for path, piece in pieces if piece]
+
+    @staticmethod
+    def _sentence_start(text: str, position: int) -> int:
+        """position 所在句子的起点（上一个句号或换行之后，跳过空白）"""
+        start = max(text.rfind(ch, 0, position) for ch in "\n。；") + 1
+        while start < position and text[start].isspace():
+            start += 1
+        return start
+
+    @staticmethod
+    def _split_at(text: str, positions: List[int]) -> List[str]:
+        positions = sorted(set(p for p in positions if 0 < p < len(text)))
+        bounds = [0] + positions + [len(text)]
+        return [text[a:b] for a, b in zip(bounds, bounds[1:]) if text[a:b].strip()]
+
+    def _split_sentences(self, text: str, path: List[str]) -> List[Tuple[List[str], str]]:
+        """按句子打包到不超过 max_chars，单句过长时按长度硬切"""
+        text = text.strip()
+        if len(text) <= self.max_chars:
+            return [(path, text)] if text else []
+        pieces, current = [], ""
+        for sentence in SENTENCE_PATTERN.split(text):
+            while len(sentence) > self.max_chars:
+                if current:
+                    pieces.append((path, current))
+                    current = ""
+                pieces.append((path, sentence[:self.max_chars]))
+                sentence = sentence[self.max_chars:]
+            if current and len(current) + len(sentence) > self.max_chars:
+                pieces.append((path, current))
+                current = ""
+            current += sentence
+        if current.strip():
+            pieces.append((path, current))
+        return [(p, piece.strip()) for p, piece in pieces if piece.strip()]
+
+    def _merge_small(self, pieces: List[Tuple[List[str], str]]) -> List[Tuple[List[str], str]]:
+        """合并过短的片段（合并后不超过 max_chars）
+
+        标题、列举前的引导语等路径是下一片段路径前缀的短片段并入下一片段；
+        条文末尾的短句、相邻的项等并入同一路径或同级的上一片段，路径取公共前缀。
+        """
+        merged: List[Tuple[List[str], str]] = []
+        pending: Optional[Tuple[List[str], str]] = None
+        for index, (path, text) in enumerate(pieces):
+            if pending is not None:
+                pending_path, pending_text = pending
+                pending = None
+                if _is_prefix(pending_path, path) and len(pending_text) + len(text) < self.max_chars:
+                    text = f"{pending_text}\n{text}"
+                else:
+                    merged.append((pending_path, pending_text))
+            if len(text) < self.min_chars:
+                following = pieces[index + 1] if index + 1 < len(pieces) else None
+                if following is not None and _is_prefix(path, following[0]) \
+                        and len(text) + len(following[1]) < self.max_chars:
+                    pending = (path, text)
+                    continue
+                if merged and _is_related(merged[-1][0], path) and len(merged[-1][1]) + len(text) < self.max_chars:
+                    merged[-1] = (_common_prefix(merged[-1][0], path), f"{merged[-1][1]}\n{text}")
+                    continue
+            merged.append((path, text))
+        if pending is not None:
+            merged.append(pending)
+        return merged
+
+
+def _is_prefix(prefix: List[str], path: List[str]) -> bool:
+    return path[:len(prefix)] == prefix
+
+
+def _is_related(previous: List[str], path: List[str]) -> bool:
+    """previous 是 path 的前缀，或两者是同一上级下的同级片段"""
+    if _is_prefix(previous, path):
+        return True
+    return len(previous) == len(path) and len(path) > 1 and previous[:-1] == path[:-1]
+
+
+def _common_prefix(a: List[str], b: List[str]) -> List[str]:
+    common = []
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        common.append(x)
+    return common
@@ -0,0 +1,172 @@
+import os
+import json
+import uuid
+import asyncio
+import hashlib
+from typing import List, Dict, Any, Optional, Set, Tuple
+from app.services.llm_service import LLMService
+from app.services.conversation_store import Conversation, ConversationStore, create_conversation_store
+from app.services.prompt_context import estimate_tokens, trim_to_tokens
+from app.services.metrics import FALLBACKS
+from app.services.tracing import stage
+from app.services.logging_utils import get_logger
+
+logger = get_logger("conversation")
+
+QUERY_REWRITE_MODES = ("off", "concat", "llm")
+
+SUMMARY_PROMPT = """你负责压缩法律咨询对话的记忆。请将【已有摘要】与【新增对话】合并为一段不超过{max_chars}字的摘要。
+要求：保留当事人身份与关系、关键事实和时间、用户的诉求与追问方向、已经给出的法律结论及所依据的法条；省略寒暄和重复内容。只输出摘要本身。"""
+
+REWRITE_PROMPT = """请根据对话背景，将用户的追问改写为一个可以独立检索的完整问题，补全省略的主体、事实和法律概念。只输出改写后的问题。"""
+
+
+class ConversationMemory:
+    """多轮咨询的会话记忆
+
+    每个会话保存最近 CONVERSATION_RECENT_TURNS 轮原文，更早的轮次在后台压缩进滚动摘要，
+    摘要与原文合计不超过 CONVERSATION_MAX_TOKENS，因此每轮Prompt中的历史长度保持恒定，
+    不随对话轮数增长。历史同时用于改写检索问题，使“那如果是未成年人呢”这类追问也能检索到相关法条。
+    """
+
+    def __init__(self, llm_service: LLMService, store: Optional[ConversationStore] = None):
+        self.llm_service = llm_service
+        self.store = store or create_conversation_store()
+        self.recent_turns = int(os.getenv("CONVERSATION_RECENT_TURNS", "3"))
+        self.max_tokens = int(os.getenv("CONVERSATION_MAX_TOKENS", "2000"))
+        self.summary_max_tokens = int(os.getenv("CONVERSATION_SUMMARY_MAX_TOKENS", "400"))
+        self.query_rewrite = os.getenv("CONVERSATION_QUERY_REWRITE", "concat")
+        if self.query_rewrite not in QUERY_REWRITE_MODES:
+            raise ValueError(f"不支持的检索问题改写方式: {self.query_rewrite}，可选: {', '.join(QUERY_REWRITE_MODES)}")
+        self._compacting: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    def load(self, conversation_id: str) -> Conversation:
+        """读取会话，不存在或已过期时返回空会话"""
+        return self.store.get(conversation_id) or Conversation(id=conversation_id)
+
+    def history(self, conversation: Conversation) -> Tuple[str, List[Dict[str, str]]]:
+        """Prompt中使用的历史：摘要与最近几轮原文，按 CONVERSATION_MAX_TOKENS 截断
+
+        后台压缩尚未完成时会话中可能暂时多出几轮，这里只取最近的轮次，保证长度有上限。
+        """
+        summary = trim_to_tokens(conversation.summary, self.summary_max_tokens) if conversation.summary else ""
+        messages = conversation.turns[-2 * self.recent_turns:] if self.recent_turns > 0 else []
+        if not messages:
+            return summary, []
+        per_message = max(1, (self.max_tokens - estimate_tokens(summary)) // len(messages))
+        return summary, [
+            {"role": m["role"], "content": trim_to_tokens(m["content"], per_message)} for m in messages
+        ]
+
+    def history_key(self, conversation: Conversation) -> str:
+        """历史内容摘要，用于回答缓存键；没有历史时为空字符串"""
+        summary, messages = self.history(conversation)
+        if not summary and not messages:
+            return ""
+        raw = json.dumps([summary, messages], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def rewrite_query(self, question: str, conversation: Conversation) -> str:
+        """结合会话历史改写检索问题，没有历史时原样返回
+
+        concat: 将上一轮问题（没有原文时取摘要）拼接在当前问题之前，不增加LLM调用；
+        llm: 由LLM改写为独立问题，失败时退回 concat。
+        """
+        if self.query_rewrite == "off" or (not conversation.summary and not conversation.turns):
+            return question
+        if self.query_rewrite == "llm":
+            try:
+                with stage("query_rewrite"):
+                    rewritten = await self.llm_service.chat(self._rewrite_messages(question, conversation), temperature=0.0)
+                if rewritten:
+                    logger.debug("检索问题改写: %s → %s", question, rewritten)
+                    return rewritten
+            except Exception as e:
+                FALLBACKS.labels(reason="query_rewrite_error").inc()
+                logger.warning("⚠ 检索问题改写失败，使用拼接改写: %s", e)
+        previous = next((m["content"] for m in reversed(conversation.turns) if m["role"] == "user"), "")
+        context = trim_to_tokens(previous or conversation.summary, 100)
+        return f"{context}\n{question}"
+
+    def _rewrite_messages(self, question: str, conversation: Conversation) -> List[Dict[str, str]]:
+        summary, messages = self.history(conversation)
+        background = "\n".join(
+            ([f"摘要：{summary}"] if summary else [])
+            + [f"{'用户' if m['role'] == 'user' else '助手'}：{trim_to_tokens(m['content'], 150)}" for m in messages]
+        )
+        return [
+            {"role": "system", "content": REWRITE_PROMPT},
+            {"role": "user", "content": f"【对话背景】\n{background}\n\n【追问】\n{question}"}
+        ]
+
+    def record_turn(self, conversation_id: str, question: str, answer: str):
+        """追加一轮问答；超出记忆上限时在后台压缩较早的轮次"""
+        conversation = self.load(conversation_id)
+        conversation.turns.extend([
+            {"role": "user", "content": question},
+            {"role": "assistant", "content": answer}
+        ])
+        self.store.save(conversation)
+        if self._needs_compaction(conversation) and conversation_id not in self._compacting:
+            self._compacting.add(conversation_id)
+            task = asyncio.create_task(self._compact(conversation_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _needs_compaction(self, conversation: Conversation) -> bool:
+        if len(conversation.turns) > 2 * self.recent_turns:
+            return True
+        tokens = estimate_tokens(conversation.summary) + sum(estimate_tokens(m["content"]) for m in conversation.turns)
+        return tokens > self.max_tokens and len(conversation.turns) > 2
+
+    async def _compact(self, conversation_id: str):
+        """将最近几轮之前的轮次合并进摘要；压缩期间追加的新轮次保留不动"""
+        try:
+            while True:
+                conversation = self.store.get(conversation_id)
+                if conversation is None or not self._needs_compaction(conversation):
+                    return
+                keep = 2 * self.recent_turns
+                # 轮数未超但内容超长时，至少压缩最早的一轮
+                older = conversation.turns[:-keep] if len(conversation.turns) > keep else conversation.turns[:2]
+                with stage("conversation_compaction"):
+                    summary = await self._summarize(conversation.summary, older)
+                latest = self.store.get(conversation_id)
+                if latest is None or latest.turns[:len(older)] != older:
+                    return
+                latest.summary = summary
+                latest.turns = latest.turns[len(older):]
+                self.store.save(latest)
+        except Exception as e:
+            logger.warning("⚠ 会话压缩失败 (%s): %s", conversation_id, e)
+        finally:
+            self._compacting.discard(conversation_id)
+
+    async def _summarize(self, summary: str, turns: List[Dict[str, str]]) -> str:
+        """由LLM合并摘要；LLM不可用时退回抽取式摘要（保留最近的内容）"""
+        dialogue = "\n".join(f"{'用户' if m['role'] == 'user' else '助手'}：{m['content']}" for m in turns)
+        try:
+            merged = await self.llm_service.chat([
+                {"role": "system", "content": SUMMARY_PROMPT.format(max_chars=self.summary_max_tokens)},
+                {"role": "user", "content": f"【已有摘要】\n{summary or '无'}\n\n【新增对话】\n{dialogue}"}
+            ], temperature=0.2)
+        except Exception as e:
+            FALLBACKS.labels(reason="summary_error").inc()
+            logger.warning("⚠ 会话摘要生成失败，使用抽取式摘要: %s", e)
+            lines = [summary] if summary else []
+            lines += [
+                f"{'用户' if m['role'] == 'user' else '助手'}：{trim_to_tokens(m['content'], 60)}" for m in turns
+            ]
+            merged = "\n".join(lines)
+            # 超出上限时从最早的内容开始丢弃
+            while estimate_tokens(merged) > self.summary_max_tokens and "\n" in merged:
+                merged = merged.split("\n", 1)[1]
+        return trim_to_tokens(merged, self.summary_max_tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.store.stats(), "compacting": len(self._compacting)}
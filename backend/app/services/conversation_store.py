@@ -0,0 +1,76 @@
+import os
+import copy
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional
+from app.services.lru_cache import LRUCache
+
+
+@dataclass
+class Conversation:
+    """一个会话的记忆：较早轮次压缩成的滚动摘要，加上最近几轮的原文"""
+    id: str
+    summary: str = ""
+    turns: List[Dict[str, str]] = field(default_factory=list)  # [{"role": "user"/"assistant", "content": ...}]
+    updated_at: float = field(default_factory=time.time)
+
+
+class ConversationStore(ABC):
+    """会话存储接口
+
+    get 返回的会话是副本，修改后需调用 save 写回；外部存储（如Redis）实现这三个方法即可。
+    """
+
+    @abstractmethod
+    def get(self, conversation_id: str) -> Optional[Conversation]:
+        """读取会话，不存在或已过期时返回None"""
+
+    @abstractmethod
+    def save(self, conversation: Conversation):
+        """写入会话"""
+
+    @abstractmethod
+    def delete(self, conversation_id: str):
+        """删除会话"""
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class InMemoryConversationStore(ConversationStore):
+    """进程内会话存储，最久未使用的会话超出数量上限或闲置超过TTL后淘汰"""
+
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[float] = None):
+        self._cache = LRUCache(
+            max_size=max_size if max_size is not None else int(os.getenv("CONVERSATION_MAX_COUNT", "10000")),
+            ttl=ttl if ttl is not None else float(os.getenv("CONVERSATION_TTL", "3600"))
+        )
+
+    def get(self, conversation_id: str) -> Optional[Conversation]:
+        conversation = self._cache.get(conversation_id)
+        return copy.deepcopy(conversation) if conversation is not None else None
+
+    def save(self, conversation: Conversation):
+        conversation.updated_at = time.time()
+        self._cache.set(conversation.id, copy.deepcopy(conversation))
+
+    def delete(self, conversation_id: str):
+        self._cache.pop(conversation_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+
+CONVERSATION_STORES = {
+    "memory": InMemoryConversationStore,
+}
+
+
+def create_conversation_store(name: Optional[str] = None) -> ConversationStore:
+    """根据名称创建会话存储"""
+    name = name or os.getenv("CONVERSATION_STORE", "memory")
+    store_cls = CONVERSATION_STORES.get(name)
+    if store_cls is None:
+        raise ValueError(f"不支持的会话存储: {name}，可选: {', '.join(CONVERSATION_STORES)}")
+    return store_cls()
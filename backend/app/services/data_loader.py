@@ -114,4 +114,5 @@ def load_sample_data(vector_store: VectorStore):
     ]
     
     vector_store.add_documents(sample_documents)
+    vector_store.persist()
 
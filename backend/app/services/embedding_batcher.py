@@ -0,0 +1,151 @@
+import os
+import time
+import asyncio
+from collections import deque
+from concurrent.futures import Executor
+from typing import List, Dict, Any, Optional, Tuple
+from app.services.embedding_service import EmbeddingService
+
+
+class EmbeddingBatcher:
+    """查询嵌入的动态微批处理器
+
+    并发请求的单条查询先进入队列，后台任务最多等待 max_wait_ms 毫秒或凑满
+    max_batch_size 条后，一次性调用 encode 批量编码，再分别唤醒各调用方。
+    命中查询缓存的请求不进入队列。
+    """
+
+    def __init__(
+        self,
+        embedding_service: EmbeddingService,
+        executor: Executor,
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None
+    ):
+        self.embedding_service = embedding_service
+        self.executor = executor
+        self.max_batch_size = max_batch_size or int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
+        wait_ms = max_wait_ms if max_wait_ms is not None else float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))
+        self.max_wait = wait_ms / 1000.0
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        # 统计信息
+        self.batches = 0
+        self.items = 0
+        self.cache_bypass = 0
+        self.max_batch_seen = 0
+        self._batch_sizes = deque(maxlen=1024)
+        self._queue_delays = deque(maxlen=1024)
+        self._encode_times = deque(maxlen=1024)
+
+    def _ensure_worker(self):
+        """在当前事件循环中按需启动后台批处理任务"""
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._worker.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def embed(self, text: str) -> List[float]:
+        """提交一条查询，返回其嵌入向量"""
+        cached = self.embedding_service.get_cached_query(text)
+        if cached is not None:
+            self.cache_bypass += 1
+            return cached
+
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self) -> List[Tuple[str, asyncio.Future, float]]:
+        """收集一个批次：首条到达后最多等待 max_wait 秒或凑满批次"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+
+            dispatched_at = time.perf_counter()
+            # 同一批次内的重复查询只编码一次
+            unique_texts = list(dict.fromkeys(text for text, _, _ in batch))
+            try:
+                vectors = await loop.run_in_executor(
+                    self.executor,
+                    self.embedding_service.encode_queries,
+                    unique_texts
+                )
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            encode_time = time.perf_counter() - dispatched_at
+
+            by_text = dict(zip(unique_texts, vectors))
+            for text, future, enqueued_at in batch:
+                self._queue_delays.append(dispatched_at - enqueued_at)
+                if not future.done():
+                    future.set_result(list(by_text[text]))
+
+            self.batches += 1
+            self.items += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            self._batch_sizes.append(len(batch))
+            self._encode_times.append(encode_time)
+
+    @staticmethod
+    def _percentile(values, q: float) -> float:
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+        return ordered[index]
+
+    def stats(self) -> Dict[str, Any]:
+        """返回批大小与排队延迟统计（延迟单位：毫秒，基于最近1024个样本）"""
+        delays = list(self._queue_delays)
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "items": self.items,
+            "cache_bypass": self.cache_bypass,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "max_batch_seen": self.max_batch_seen,
+            "recent_avg_batch_size": sum(self._batch_sizes) / len(self._batch_sizes) if self._batch_sizes else 0.0,
+            "queue_delay_ms": {
+                "p50": self._percentile(delays, 0.50) * 1000,
+                "p95": self._percentile(delays, 0.95) * 1000,
+                "p99": self._percentile(delays, 0.99) * 1000
+            },
+            "encode_ms": {
+                "p50": self._percentile(self._encode_times, 0.50) * 1000,
+                "p99": self._percentile(self._encode_times, 0.99) * 1000
+            },
+            "pending": self._queue.qsize() if self._queue is not None else 0
+        }
+
+    def close(self):
+        """停止后台批处理任务"""
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+from typing import List, Optional, Dict, Any
+import numpy as np
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本（NFKC + 折叠空白），用于生成缓存键"""
+    text = unicodedata.normalize("NFKC", text or "")
+    return " ".join(text.split())
+
+
+def text_hash(model_name: str, text: str) -> str:
+    """基于模型名和规范化文本生成内容哈希"""
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update(normalize_text(text).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """持久化的文档嵌入缓存
+
+    以 (模型名, 规范化文本哈希) 为键，向量保存在紧凑的 .npy 矩阵中，
+    键到行号的索引保存在 index.json 中。超过容量上限时按最近使用时间淘汰；访问时间随下一次
+    写入一并保存，只有命中的运行不会重写文件。
+    每次保存都会重写整个矩阵，因此写入只在内存中标记，由调用方在导入结束或关闭时
+    调用 save，导入过程中最多每 EMBEDDING_CACHE_SAVE_INTERVAL 秒落盘一次。
+    """
+
+    # 超出容量上限时淘汰到上限的90%，摊薄每次淘汰的排序与复制开销
+    EVICT_TARGET_RATIO = 0.9
+
+    def __init__(
+        self,
+        model_name: str,
+        cache_dir: Optional[str] = None,
+        max_entries: Optional[int] = None,
+        dtype: Optional[str] = None
+    ):
+        self.model_name = model_name
+        base_dir = cache_dir or os.getenv("EMBEDDING_CACHE_DIR", "./.cache/embeddings")
+        # 每个模型使用独立的子目录，避免不同维度的向量混在一起
+        safe_name = model_name.replace("/", "__")
+        self.cache_dir = os.path.join(base_dir, safe_name)
+        self.max_entries = max_entries or int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+        self.dtype = np.dtype(dtype or os.getenv("EMBEDDING_CACHE_DTYPE", "float16"))
+        self.save_interval = float(os.getenv("EMBEDDING_CACHE_SAVE_INTERVAL", "300"))
+
+        self._vectors_path = os.path.join(self.cache_dir, "vectors.npy")
+        self._index_path = os.path.join(self.cache_dir, "index.json")
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._last_used: Dict[str, int] = {}
+        self._vectors: Optional[np.ndarray] = None
+        self._size = 0
+        self._tick = 0
+        self._dirty = False
+        self._last_save = time.monotonic()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._load()
+
+    def _load(self):
+        """从磁盘加载缓存"""
+        if not (os.path.exists(self._vectors_path) and os.path.exists(self._index_path)):
+            return
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("model_name") != self.model_name:
+                print(f"⚠ 嵌入缓存模型不匹配，忽略: {self.cache_dir}")
+                return
+            vectors = np.load(self._vectors_path)
+            keys = index.get("keys", [])
+            last_used = index.get("last_used", [0] * len(keys))
+            if len(keys) != len(vectors):
+                print(f"⚠ 嵌入缓存索引与向量文件不一致，忽略: {self.cache_dir}")
+                return
+            self._vectors = vectors.astype(self.dtype, copy=False)
+            self._size = len(keys)
+            self._rows = {key: i for i, key in enumerate(keys)}
+            self._last_used = dict(zip(keys, last_used))
+            self._tick = max(last_used, default=0)
+            print(f"✓ 嵌入缓存加载完成: {self._size} 条 ({self.cache_dir})")
+        except Exception as e:
+            print(f"⚠ 嵌入缓存加载失败，将重新构建: {e}")
+            self._rows, self._last_used, self._vectors, self._size = {}, {}, None, 0
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """批量查询缓存，未命中的位置返回None"""
+        results: List[Optional[np.ndarray]] = []
+        with self._lock:
+            for text in texts:
+                key = text_hash(self.model_name, text)
+                row = self._rows.get(key)
+                if row is None:
+                    self.misses += 1
+                    results.append(None)
+                    continue
+                self.hits += 1
+                # 访问时间只在内存中更新，不标记为需要保存：只有命中的启动不应重写整个矩阵
+                self._tick += 1
+                self._last_used[key] = self._tick
+                results.append(self._vectors[row].astype(np.float32))
+        return results
+
+    def put_many(self, texts: List[str], embeddings: np.ndarray):
+        """批量写入缓存"""
+        if len(texts) == 0:
+            return
+        embeddings = np.asarray(embeddings)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((max(len(texts), 16), embeddings.shape[1]), dtype=self.dtype)
+            for text, vector in zip(texts, embeddings):
+                key = text_hash(self.model_name, text)
+                self._tick += 1
+                row = self._rows.get(key)
+                if row is None:
+                    if self._size >= len(self._vectors):
+                        grown = np.zeros((len(self._vectors) * 2, self._vectors.shape[1]), dtype=self.dtype)
+                        grown[:self._size] = self._vectors[:self._size]
+                        self._vectors = grown
+                    row = self._size
+                    self._size += 1
+                    self._rows[key] = row
+                self._vectors[row] = vector
+                self._last_used[key] = self._tick
+            self._dirty = True
+            if self._size > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        """淘汰最久未使用的条目并压缩矩阵（调用方持有锁）
+
+        一次淘汰到容量上限的 EVICT_TARGET_RATIO，之后的若干批写入不再触发排序和整矩阵复制。
+        """
+        target = int(self.max_entries * self.EVICT_TARGET_RATIO)
+        keep = sorted(self._rows, key=lambda k: self._last_used.get(k, 0), reverse=True)[:target]
+        keep.sort(key=lambda k: self._rows[k])
+        evicted = self._size - len(keep)
+        rows = [self._rows[k] for k in keep]
+        self._vectors = self._vectors[rows].copy()
+        self._rows = {key: i for i, key in enumerate(keep)}
+        self._last_used = {key: self._last_used.get(key, 0) for key in keep}
+        self._size = len(keep)
+        self.evictions += evicted
+
+    def save(self):
+        """将缓存写回磁盘（原子替换）"""
+        with self._lock:
+            if not self._dirty or self._vectors is None:
+                return
+            os.makedirs(self.cache_dir, exist_ok=True)
+            keys = sorted(self._rows, key=self._rows.get)
+            index = {
+                "model_name": self.model_name,
+                "dtype": self.dtype.name,
+                "dim": int(self._vectors.shape[1]),
+                "keys": keys,
+                "last_used": [self._last_used.get(k, 0) for k in keys]
+            }
+            tmp_vectors = self._vectors_path + ".tmp.npy"
+            tmp_index = self._index_path + ".tmp"
+            np.save(tmp_vectors, self._vectors[:self._size])
+            with open(tmp_index, "w", encoding="utf-8") as f:
+                json.dump(index, f)
+            os.replace(tmp_vectors, self._vectors_path)
+            os.replace(tmp_index, self._index_path)
+            self._dirty = False
+            self._last_save = time.monotonic()
+
+    def maybe_save(self):
+        """距上次保存超过 save_interval 时写回磁盘，限制进程异常退出时丢失的嵌入"""
+        if self.save_interval > 0 and self._dirty and time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存统计信息"""
+        total = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "max_entries": self.max_entries,
+            "dtype": self.dtype.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "cache_dir": self.cache_dir
+        }
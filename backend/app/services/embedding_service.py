@@ -1,27 +1,39 @@
 import os
 from sentence_transformers import SentenceTransformer
-from typing import List
+from typing import List, Optional
 import numpy as np
 import warnings
+from app.services.embedding_cache import EmbeddingCache, normalize_text
+from app.services.lru_cache import LRUCache
+from app.services.metrics import CACHE_REQUESTS
 
 class EmbeddingService:
-    def __init__(self):
+    def __init__(self, model=None, model_name: Optional[str] = None):
+        """model: 可选，直接使用传入的编码模型（需提供 encode / get_sentence_embedding_dimension），
+        用于基准测试等离线场景；未传入时按顺序尝试加载预置模型"""
+        self.model = model
+        self.model_name = (model_name or type(model).__name__) if model is not None else None
         model_name = os.getenv("EMBEDDING_MODEL", "BAAI/bge-m3")
         # 使用轻量级模型作为快速原型，实际生产环境使用bge-m3
-        self.model = None
-        model_attempts = [
+        model_attempts = [] if model is not None else [
             'paraphrase-multilingual-MiniLM-L12-v2',
             'all-MiniLM-L6-v2',
             'all-MiniLM-L12-v2'
         ]
         
+        # 编码后端：torch（SentenceTransformer）或 onnx（ONNX Runtime，默认int8量化）
+        self.backend = os.getenv("EMBEDDING_BACKEND", "torch").lower() if model is None else "custom"
+
         for model_name_attempt in model_attempts:
+            if self.backend == "onnx" and self._load_onnx(model_name_attempt):
+                break
             try:
                 print(f"尝试加载模型: {model_name_attempt}")
                 # 禁用警告
                 with warnings.catch_warnings():
                     warnings.simplefilter("ignore")
                     self.model = SentenceTransformer(model_name_attempt)
+                self.model_name = model_name_attempt
                 print(f"✓ Embedding模型加载成功: {model_name_attempt} ({self.model.get_sentence_embedding_dimension()}维)")
                 break
             except Exception as e:
@@ -31,13 +43,110 @@ class EmbeddingService:
         if self.model is None:
             raise Exception("所有embedding模型加载失败，请检查网络连接或使用本地模型")
 
+        # 文档嵌入的磁盘缓存，未变化的文本不再重复编码
+        self.document_cache = None
+        if os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true":
+            try:
+                self.document_cache = EmbeddingCache(self.model_name)
+            except Exception as e:
+                print(f"⚠ 嵌入缓存初始化失败，将不使用缓存: {e}")
+
+        # 查询向量的进程内LRU缓存，重复的咨询问题跳过模型前向计算
+        self.query_cache = LRUCache(
+            max_size=int(os.getenv("QUERY_CACHE_MAX_SIZE", "4096")),
+            ttl=float(os.getenv("QUERY_CACHE_TTL", "3600"))
+        )
+
+    def _load_onnx(self, model_name: str) -> bool:
+        """加载（必要时导出）ONNX模型，失败时返回False并回退到PyTorch"""
+        try:
+            from app.services.onnx_encoder import OnnxEncoder
+            print(f"尝试加载ONNX模型: {model_name}")
+            self.model = OnnxEncoder.load_or_export(model_name)
+        except ImportError as e:
+            print(f"⚠ ONNX依赖未安装 ({e})，使用PyTorch模型")
+            self.backend = "torch"
+            return False
+        except Exception as e:
+            print(f"✗ ONNX模型 {model_name} 加载失败，使用PyTorch模型: {e}")
+            self.backend = "torch"
+            return False
+        # 量化模型的向量与原模型不同，缓存按变体区分
+        self.model_name = f"{model_name}@{self.model.variant}"
+        print(f"✓ ONNX模型加载成功: {self.model_name} ({self.model.get_sentence_embedding_dimension()}维, {self.model.threads}线程)")
+        return True
+
+    def _query_cache_key(self, text: str):
+        return (self.model_name, normalize_text(text))
+
+    def get_cached_query(self, text: str) -> Optional[List[float]]:
+        """读取查询向量缓存，未命中返回None"""
+        cached = self.query_cache.get(self._query_cache_key(text))
+        CACHE_REQUESTS.labels(cache="query_embedding", result="hit" if cached is not None else "miss").inc()
+        return list(cached) if cached is not None else None
+
+    def encode_queries(self, texts: List[str]) -> List[List[float]]:
+        """批量编码查询文本并写入查询缓存（不做缓存查找）"""
+        embeddings = self.model.encode(texts, convert_to_numpy=True)
+        vectors = embeddings.tolist()
+        for text, vector in zip(texts, vectors):
+            self.query_cache.set(self._query_cache_key(text), tuple(vector))
+        return vectors
+
     def embed_query(self, text: str) -> List[float]:
-        """对查询文本进行嵌入"""
-        embedding = self.model.encode(text, convert_to_numpy=True)
-        return embedding.tolist()
+        """对查询文本进行嵌入（优先读取查询缓存）"""
+        cached = self.get_cached_query(text)
+        if cached is not None:
+            return cached
+        return self.encode_queries([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """批量嵌入查询文本：命中缓存的直接返回，其余去重后一次编码"""
+        vectors: List[Optional[List[float]]] = [self.get_cached_query(text) for text in texts]
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            encoded = dict(zip(missing, self.encode_queries(missing)))
+            vectors = [vector if vector is not None else encoded[text] for text, vector in zip(texts, vectors)]
+        return vectors
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        """对文档列表进行嵌入"""
-        embeddings = self.model.encode(texts, convert_to_numpy=True)
-        return embeddings.tolist()
+        """对文档列表进行嵌入（命中磁盘缓存的文本不再编码）"""
+        if self.document_cache is None:
+            embeddings = self.model.encode(texts, convert_to_numpy=True)
+            return embeddings.tolist()
+
+        cached = self.document_cache.get_many(texts)
+        miss_indices = [i for i, vector in enumerate(cached) if vector is None]
+        CACHE_REQUESTS.labels(cache="document_embedding", result="hit").inc(len(texts) - len(miss_indices))
+        CACHE_REQUESTS.labels(cache="document_embedding", result="miss").inc(len(miss_indices))
+        if miss_indices:
+            miss_texts = [texts[i] for i in miss_indices]
+            encoded = self.model.encode(miss_texts, convert_to_numpy=True)
+            self.document_cache.put_many(miss_texts, encoded)
+            for i, vector in zip(miss_indices, encoded):
+                cached[i] = vector
+            try:
+                self.document_cache.maybe_save()
+            except Exception as e:
+                print(f"⚠ 嵌入缓存写入失败: {e}")
+        print(f"嵌入缓存: 命中 {len(texts) - len(miss_indices)} 个, 未命中 {len(miss_indices)} 个")
+        return [np.asarray(vector, dtype=np.float32).tolist() for vector in cached]
+
+    def save_cache(self):
+        """将文档嵌入缓存写回磁盘（有新增或访问记录变化时）"""
+        if self.document_cache is None:
+            return
+        try:
+            self.document_cache.save()
+        except Exception as e:
+            print(f"⚠ 嵌入缓存写入失败: {e}")
+
+    def cache_stats(self) -> dict:
+        """返回嵌入缓存统计信息"""
+        return {
+            "model_name": self.model_name,
+            "backend": self.backend,
+            "document_cache": self.document_cache.stats() if self.document_cache else None,
+            "query_cache": self.query_cache.stats()
+        }
 
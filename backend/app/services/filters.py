@@ -0,0 +1,61 @@
+import re
+from datetime import date, datetime
+from typing import Dict, Any, Optional, List
+
+# 可过滤的关键词字段（向量库中建立payload索引）
+KEYWORD_FILTER_FIELDS = ("doc_type", "article_name", "case_type", "court")
+# 生效日期以 YYYYMMDD 整数存储，便于范围过滤
+DATE_FIELD = "effective_date_num"
+
+_DATE_PATTERN = re.compile(r"(\d{4})\D{0,2}(\d{1,2})?\D{0,2}(\d{1,2})?")
+
+
+def date_to_int(value: Any) -> Optional[int]:
+    """将日期（date / datetime / "2021-03-01" / "2021年3月1日" / "2021"）转为 YYYYMMDD 整数"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.year * 10000 + value.month * 100 + value.day
+    match = _DATE_PATTERN.search(str(value))
+    if not match:
+        return None
+    year, month, day = match.groups()
+    return int(year) * 10000 + int(month or 1) * 100 + int(day or 1)
+
+
+def normalize_filter(filter_dict: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """规范化过滤条件：关键词字段统一为非空字符串列表，effective_on 转为整数日期
+
+    返回 None 表示不过滤。未知字段会被拒绝，避免拼写错误时静默返回未过滤的结果。
+    """
+    if not filter_dict:
+        return None
+    normalized: Dict[str, Any] = {}
+    for key, value in filter_dict.items():
+        if value is None or value == [] or value == "":
+            continue
+        if key in KEYWORD_FILTER_FIELDS:
+            values: List[str] = [value] if isinstance(value, str) else [str(v) for v in value]
+            normalized[key] = values
+        elif key == "effective_on":
+            day = date_to_int(value)
+            if day is None:
+                raise ValueError(f"无法解析的日期: {value}")
+            normalized[key] = day
+        else:
+            raise ValueError(f"不支持的过滤字段: {key}，可选: {', '.join(KEYWORD_FILTER_FIELDS + ('effective_on',))}")
+    return normalized or None
+
+
+def matches_filter(payload: Dict[str, Any], filters: Optional[Dict[str, Any]]) -> bool:
+    """判断payload是否满足规范化后的过滤条件（用于关键词索引等进程内过滤）"""
+    if not filters:
+        return True
+    for key in KEYWORD_FILTER_FIELDS:
+        if key in filters and payload.get(key) not in filters[key]:
+            return False
+    if "effective_on" in filters:
+        effective = payload.get(DATE_FIELD)
+        if effective is None or effective > filters["effective_on"]:
+            return False
+    return True
@@ -0,0 +1,204 @@
+import os
+import csv
+import json
+import time
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import List, Dict, Any, Iterator, Iterable, Optional, Set
+from app.services.vector_store import VectorStore
+from app.services.chunker import document_id
+
+# CSV中除以下列外的其他列都归入metadata
+DOCUMENT_FIELDS = ["id", "content", "article_name", "section", "doc_type", "source_id", "url"]
+
+
+def iter_documents(path: str) -> Iterator[Dict[str, Any]]:
+    """从JSONL或CSV文件中逐条读取文档，不会一次性载入整个文件"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".jsonl", ".ndjson"):
+        with open(path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    doc = json.loads(line)
+                except json.JSONDecodeError as e:
+                    print(f"⚠ 跳过无法解析的行 {path}:{line_no}: {e}")
+                    continue
+                if not doc.get("content"):
+                    print(f"⚠ 跳过缺少content的文档 {path}:{line_no}")
+                    continue
+                yield doc
+    elif ext == ".csv":
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            for row_no, row in enumerate(csv.DictReader(f), 2):
+                if not row.get("content"):
+                    print(f"⚠ 跳过缺少content的文档 {path}:{row_no}")
+                    continue
+                doc = {k: v for k, v in row.items() if k in DOCUMENT_FIELDS and v}
+                doc["metadata"] = {k: v for k, v in row.items() if k not in DOCUMENT_FIELDS and k and v}
+                yield doc
+    else:
+        raise ValueError(f"不支持的文件格式: {path}（仅支持 .jsonl / .csv）")
+
+
+def iter_batches(documents: Iterable[Dict[str, Any]], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """将文档流切分为固定大小的批次"""
+    iterator = iter(documents)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+class IngestionState:
+    """断点续传状态：记录每个文件已提交的文档数，文件变化后自动失效"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.files = json.load(f).get("files", {})
+            except Exception as e:
+                print(f"⚠ 读取导入状态失败，将从头导入: {e}")
+
+    @staticmethod
+    def _signature(file_path: str) -> Dict[str, Any]:
+        stat = os.stat(file_path)
+        return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+    def committed(self, file_path: str) -> int:
+        """返回文件已提交的文档数（文件被修改过则返回0）"""
+        entry = self.files.get(os.path.abspath(file_path))
+        if not entry or entry.get("signature") != self._signature(file_path):
+            return 0
+        return entry.get("docs_committed", 0)
+
+    def commit(self, file_path: str, docs_committed: int, done: bool = False):
+        """记录一个批次已写入向量库（原子写入状态文件）"""
+        self.files[os.path.abspath(file_path)] = {
+            "signature": self._signature(file_path),
+            "docs_committed": docs_committed,
+            "done": done
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def reset(self):
+        self.files = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def ingest_files(
+    vector_store: VectorStore,
+    paths: List[str],
+    batch_size: int = 256,
+    resume: bool = True,
+    state_path: Optional[str] = None,
+    prune: bool = False
+) -> Dict[str, Any]:
+    """流式导入文档文件到向量库
+
+    按固定批次读取和嵌入，第N批写入向量库的同时嵌入第N+1批，内存中最多同时
+    保留两个批次。每批写入成功后记录断点（Qdrant内存模式的写入在快照前不落盘，断点在
+    每个文件导入完成并写入快照后才记录），resume=True 时从上次提交处继续。
+    长文档先按法律结构切分为子片段。内容哈希未变化的文档（片段）不会重新嵌入和写入；prune=True 时在全部文件导入完成后
+    删除源文件中已不存在的文档。
+    """
+    state = IngestionState(state_path or os.getenv("INGEST_STATE_PATH", "./.cache/ingest_state.json"))
+    if not resume:
+        state.reset()
+    os.makedirs(os.path.dirname(os.path.abspath(state.path)), exist_ok=True)
+
+    start_generation = vector_store.backend.generation
+    total_docs = 0
+    processed_docs = 0
+    skipped_docs = 0
+    seen_ids: Set[str] = set()
+    started = time.perf_counter()
+    # 单线程写入：保证批次按顺序提交，断点记录才有意义
+    upsert_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-upsert")
+
+    def upsert(points, stale: List[str], file_path: str, committed_after: int) -> int:
+        if stale:
+            vector_store.delete_points(stale)
+        if points:
+            vector_store.upsert_points(points)
+        # 内存模式下批次写入快照前并未落盘，断点留到文件导入完成并 persist 之后再记录，
+        # 否则进程崩溃后续传会跳过从未持久化的批次
+        if vector_store.backend.durable:
+            state.commit(file_path, committed_after)
+        return len(points)
+
+    try:
+        for file_path in paths:
+            skip = state.committed(file_path) if resume else 0
+            if skip:
+                print(f"[{file_path}] 从第 {skip} 个文档处继续导入")
+            committed = skip
+            pending: Optional[Future] = None
+            documents = iter_documents(file_path)
+            if prune:
+                # 清理需要完整的文档ID集合，已提交部分只读取ID，不再嵌入
+                for doc in islice(documents, skip):
+                    seen_ids.update(vector_store.document_point_ids(doc))
+            else:
+                documents = islice(documents, skip, None)
+
+            for batch in iter_batches(documents, batch_size):
+                processed_docs += len(batch)
+                # 长文档切分为子片段，写入、跳过与清理都以片段为单位
+                prepared, stale = vector_store.prepare_documents(batch)
+                if prune:
+                    # 与 build_points 使用同一ID规则，包括没有id的文档（片段）
+                    seen_ids.update(vector_store.point_id(document_id(doc)) for doc in prepared)
+                changed = vector_store.filter_changed(prepared)
+                skipped_docs += len(prepared) - len(changed)
+                points = []
+                if changed:
+                    texts = [doc["content"] for doc in changed]
+                    embeddings = vector_store.embedding_service.embed_documents(texts)
+                    points = vector_store.build_points(changed, embeddings)
+
+                # 等待上一批写入完成后再提交本批，与本批嵌入形成流水线
+                if pending is not None:
+                    total_docs += pending.result()
+                    elapsed = time.perf_counter() - started
+                    print(f"[{file_path}] 已提交 {committed} 个文档 (写入 {total_docs}, 未变化跳过 {skipped_docs}), {processed_docs / elapsed:.1f} docs/s")
+                committed += len(batch)
+                pending = upsert_executor.submit(upsert, points, stale, file_path, committed)
+
+            if pending is not None:
+                total_docs += pending.result()
+            if not vector_store.backend.durable:
+                vector_store.persist()
+            state.commit(file_path, committed, done=True)
+            print(f"✓ [{file_path}] 导入完成: 共 {committed} 个文档 (写入 {total_docs}, 未变化跳过 {skipped_docs})")
+    finally:
+        upsert_executor.shutdown(wait=True)
+        vector_store.persist()
+
+    if vector_store.backend.generation != start_generation:
+        # 导入中途后端降级，之前批次写入的数据已不在当前存储中；从头重新导入，
+        # 已写入新存储的文档按内容哈希跳过，嵌入命中磁盘缓存
+        print("⚠ 导入过程中向量存储后端已切换，从头重新导入全部文件")
+        return ingest_files(vector_store, paths, batch_size=batch_size, resume=False, state_path=state_path, prune=prune)
+
+    deleted = vector_store.delete_missing(seen_ids) if prune else 0
+
+    elapsed = time.perf_counter() - started
+    return {
+        "files": len(paths),
+        "documents": total_docs,
+        "skipped": skipped_docs,
+        "deleted": deleted,
+        "seconds": elapsed,
+        "docs_per_sec": processed_docs / elapsed if elapsed else 0.0
+    }
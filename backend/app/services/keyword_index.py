@@ -0,0 +1,264 @@
+import os
+import math
+import pickle
+import threading
+import unicodedata
+from collections import Counter
+from typing import List, Dict, Any, Optional, Callable, Tuple
+import numpy as np
+
+# 连续的中日韩字符视为一段，按字符n-gram切分；字母数字按整词切分
+_CJK_RANGES = (
+    ("一", "鿿"),
+    ("㐀", "䶿"),
+    ("豈", "﫿"),
+)
+
+
+def _is_cjk(ch: str) -> bool:
+    return any(lo <= ch <= hi for lo, hi in _CJK_RANGES)
+
+
+def ngram_tokenize(text: str) -> List[str]:
+    """中文按字符二元组切分（单字段保留单字），字母数字按整词切分"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    tokens: List[str] = []
+    cjk_run: List[str] = []
+    word: List[str] = []
+
+    def flush_cjk():
+        if len(cjk_run) == 1:
+            tokens.append(cjk_run[0])
+        else:
+            tokens.extend(cjk_run[i] + cjk_run[i + 1] for i in range(len(cjk_run) - 1))
+        cjk_run.clear()
+
+    def flush_word():
+        if word:
+            tokens.append("".join(word))
+            word.clear()
+
+    for ch in text:
+        if _is_cjk(ch):
+            flush_word()
+            cjk_run.append(ch)
+        elif ch.isalnum():
+            flush_cjk()
+            word.append(ch)
+        else:
+            flush_cjk()
+            flush_word()
+    flush_cjk()
+    flush_word()
+    return tokens
+
+
+def _jieba_tokenize(text: str) -> List[str]:
+    import jieba
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return [t for t in jieba.lcut_for_search(text) if t.strip() and not all(not c.isalnum() for c in t)]
+
+
+def get_segmenter(name: Optional[str] = None) -> Tuple[str, Callable[[str], List[str]]]:
+    """根据名称返回分词器，jieba不可用时回退到字符n-gram"""
+    name = (name or os.getenv("KEYWORD_SEGMENTER", "ngram")).lower()
+    if name == "jieba":
+        try:
+            import jieba  # noqa: F401
+            return "jieba", _jieba_tokenize
+        except ImportError:
+            print("⚠ 未安装jieba，关键词索引使用字符n-gram分词")
+    return "ngram", ngram_tokenize
+
+
+class KeywordIndex:
+    """内存倒排索引 + BM25打分
+
+    索引文本为 article_name + section + content。每个文档保存完整payload，
+    检索时无需再访问向量库。支持增量增删和序列化到磁盘。
+
+    检索时倒排表按需编译为numpy数组（文档行号 + 预先算好的BM25词频项），打分和top-k选择
+    都是向量化运算，不再逐条遍历倒排记录。索引有增删后编译结果失效，下一次检索时重新编译。
+    """
+
+    VERSION = 1
+
+    def __init__(self, segmenter: Optional[str] = None, k1: float = 1.5, b: float = 0.75):
+        self.segmenter_name, self.tokenize = get_segmenter(segmenter)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.payloads: Dict[str, Dict[str, Any]] = {}
+        self.total_length = 0
+        self.dirty = False
+        # 检索用的编译结果，索引变化后失效
+        self._version = 0
+        self._compiled_version = -1
+        self._doc_ids: List[str] = []
+        self._doc_rows: Dict[str, int] = {}
+        self._norms: Optional[np.ndarray] = None
+        self._term_arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    @staticmethod
+    def index_text(payload: Dict[str, Any]) -> str:
+        return " ".join([
+            payload.get("article_name", "") or "",
+            payload.get("section", "") or "",
+            payload.get("content", "") or ""
+        ])
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, doc_id: str, payload: Dict[str, Any]):
+        """添加或更新一个文档"""
+        terms = Counter(self.tokenize(self.index_text(payload)))
+        with self._lock:
+            if doc_id in self.doc_lengths:
+                self._remove_locked(doc_id)
+            for term, tf in terms.items():
+                self.postings.setdefault(term, {})[doc_id] = tf
+            length = sum(terms.values())
+            self.doc_lengths[doc_id] = length
+            self.total_length += length
+            self.payloads[doc_id] = payload
+            self.dirty = True
+            self._version += 1
+
+    def remove(self, doc_id: str):
+        """删除一个文档"""
+        with self._lock:
+            if doc_id in self.doc_lengths:
+                self._remove_locked(doc_id)
+                self.dirty = True
+                self._version += 1
+
+    def _remove_locked(self, doc_id: str):
+        payload = self.payloads.pop(doc_id)
+        for term in set(self.tokenize(self.index_text(payload))):
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(doc_id, None)
+                if not docs:
+                    del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def clear(self):
+        with self._lock:
+            self.postings, self.doc_lengths, self.payloads = {}, {}, {}
+            self.total_length = 0
+            self.dirty = True
+            self._version += 1
+
+    def _compile_locked(self):
+        """索引变化后重建文档行号和长度归一化项（调用方持有锁）"""
+        if self._compiled_version == self._version:
+            return
+        self._doc_ids = list(self.doc_lengths)
+        self._doc_rows = {doc_id: row for row, doc_id in enumerate(self._doc_ids)}
+        lengths = np.fromiter(self.doc_lengths.values(), dtype=np.float64, count=len(self._doc_ids))
+        avg_length = self.total_length / len(self._doc_ids)
+        self._norms = self.k1 * (1 - self.b + self.b * lengths / avg_length)
+        self._term_arrays = {}
+        self._compiled_version = self._version
+
+    def _term_arrays_locked(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """词项的 (文档行号, tf*(k1+1)/(tf+norm))，首次查询时编译并缓存（调用方持有锁）"""
+        arrays = self._term_arrays.get(term)
+        if arrays is None:
+            docs = self.postings.get(term)
+            if not docs:
+                return None
+            rows = np.fromiter((self._doc_rows[doc_id] for doc_id in docs), dtype=np.int64, count=len(docs))
+            tfs = np.fromiter(docs.values(), dtype=np.float64, count=len(docs))
+            arrays = (rows, tfs * (self.k1 + 1) / (tfs + self._norms[rows]))
+            self._term_arrays[term] = arrays
+        return arrays
+
+    @staticmethod
+    def _top_rows(scores: np.ndarray, limit: int) -> np.ndarray:
+        """得分最高的 limit 行，按得分降序"""
+        if limit < len(scores):
+            rows = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            rows = np.arange(len(scores))
+        return rows[np.argsort(-scores[rows], kind="stable")]
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        predicate: Optional[Callable[[Dict[str, Any]], bool]] = None
+    ) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """BM25检索，返回 (doc_id, score, payload) 列表"""
+        query_terms = Counter(self.tokenize(query))
+        with self._lock:
+            n_docs = len(self.doc_lengths)
+            if n_docs == 0 or not query_terms or top_k <= 0:
+                return []
+            self._compile_locked()
+            scores = np.zeros(n_docs, dtype=np.float64)
+            for term, qtf in query_terms.items():
+                arrays = self._term_arrays_locked(term)
+                if arrays is None:
+                    continue
+                rows, impacts = arrays
+                idf = math.log(1 + (n_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+                # 同一词项的倒排记录中文档行号不重复，可以直接按下标累加
+                scores[rows] += qtf * idf * impacts
+
+            # 有过滤条件时先取若干倍候选，不足 top_k 再扩大范围
+            limit = top_k if predicate is None else top_k * 4
+            while True:
+                results = []
+                for row in self._top_rows(scores, limit):
+                    if scores[row] <= 0:
+                        # 之后的文档不含任何查询词
+                        return results
+                    doc_id = self._doc_ids[row]
+                    payload = self.payloads[doc_id]
+                    if predicate is not None and not predicate(payload):
+                        continue
+                    results.append((doc_id, float(scores[row]), payload))
+                    if len(results) >= top_k:
+                        return results
+                if limit >= n_docs:
+                    return results
+                limit *= 4
+
+    def save(self, path: str):
+        """序列化索引到磁盘（原子替换）"""
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            state = {
+                "version": self.VERSION,
+                "segmenter": self.segmenter_name,
+                "postings": self.postings,
+                "doc_lengths": self.doc_lengths,
+                "payloads": self.payloads,
+                "total_length": self.total_length
+            }
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            self.dirty = False
+
+    def load(self, path: str) -> bool:
+        """从磁盘加载索引，版本或分词器不一致时返回False"""
+        if not os.path.exists(path):
+            return False
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        if state.get("version") != self.VERSION or state.get("segmenter") != self.segmenter_name:
+            return False
+        with self._lock:
+            self.postings = state["postings"]
+            self.doc_lengths = state["doc_lengths"]
+            self.payloads = state["payloads"]
+            self.total_length = state["total_length"]
+            self.dirty = False
+            self._version += 1
+        return True
@@ -1,18 +1,92 @@
 import os
+import json
+import time
 import httpx
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, AsyncIterator
 from dotenv import load_dotenv
+from app.services.metrics import LLM_ERRORS, LLM_IN_FLIGHT, PROMPT_CONTEXT_TOKENS
+from app.services.prompt_context import assemble_context, estimate_tokens
+from app.services.tracing import stage, record_stage
+from app.services.logging_utils import get_logger
 
 load_dotenv()
 
+logger = get_logger("llm")
+
 
 class LLMService:
+    # Prompt模板版本：修改 format_legal_prompt 的模板时需要同步更新，使回答缓存失效
+    PROMPT_VERSION = "consultant-v2"
+
     def __init__(self):
         self.api_key = os.getenv("SJTU_API_KEY", "your-api-key")
         self.api_url = os.getenv("SJTU_API_URL", "https://models.sjtu.edu.cn/api/v1")
         self.model_name = os.getenv("MODEL_NAME", "deepseek-v3")
         self.base_url = f"{self.api_url}/chat/completions"
 
+        # 连接池配置：整个服务共享一个长连接客户端，避免每次请求重新握手
+        self.max_connections = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+        self.max_keepalive_connections = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+        self.keepalive_expiry = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+        self.connect_timeout = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+        self.read_timeout = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+        self.http2 = os.getenv("LLM_HTTP2", "false").lower() == "true"
+        self._client: Optional[httpx.AsyncClient] = None
+
+        # 参考资料的token预算：去重后按相关性分配，超出部分在句子边界截断
+        self.context_max_tokens = int(os.getenv("PROMPT_CONTEXT_MAX_TOKENS", "3000"))
+        self.context_min_chunk_tokens = int(os.getenv("PROMPT_CHUNK_MIN_TOKENS", "60"))
+        self.context_dedup_threshold = float(os.getenv("PROMPT_DEDUP_THRESHOLD", "0.85"))
+
+    def _create_client(self) -> httpx.AsyncClient:
+        """创建共享的HTTP客户端"""
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                print("⚠ 未安装h2，HTTP/2不可用，使用HTTP/1.1 (pip install httpx[http2])")
+                http2 = False
+        return httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry
+            ),
+            timeout=httpx.Timeout(
+                connect=self.connect_timeout,
+                read=self.read_timeout,
+                write=self.connect_timeout,
+                pool=self.connect_timeout
+            )
+        )
+
+    async def start(self):
+        """打开共享HTTP客户端（在应用启动时调用）"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+            print(f"✓ LLM HTTP客户端已就绪: {self.base_url}")
+
+    async def aclose(self):
+        """关闭共享HTTP客户端（在应用关闭时调用）"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """共享HTTP客户端，未启动时按需创建"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+
     async def chat(
         self,
         messages: List[Dict[str, str]],
@@ -20,10 +94,7 @@ class LLMService:
         stream: bool = False
     ) -> str:
         """调用LLM API"""
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
+        headers = self._headers()
         
         data = {
             "model": self.model_name,
@@ -32,59 +103,112 @@ class LLMService:
             "stream": stream
         }
         
-        print(f"调用LLM API: {self.base_url}")
-        print(f"模型: {self.model_name}, 消息数量: {len(messages)}")
-        
-        async with httpx.AsyncClient(timeout=60.0) as client:
+        logger.debug("调用LLM API: %s, 模型: %s, 消息数量: %d", self.base_url, self.model_name, len(messages))
+
+        with LLM_IN_FLIGHT.track_inprogress(), stage("llm_call"):
             try:
-                response = await client.post(self.base_url, headers=headers, json=data)
-                print(f"API响应状态码: {response.status_code}")
-                
-                if response.status_code != 200:
-                    error_detail = ""
-                    try:
-                        error_detail = response.json()
-                    except:
-                        error_detail = response.text[:500]  # 限制长度
-                    print(f"API错误详情: {error_detail}")
-                    raise Exception(f"LLM API调用失败 (状态码: {response.status_code}): {error_detail}")
-                
-                result = response.json()
-                
-                # 检查响应格式
-                if "choices" not in result or len(result["choices"]) == 0:
-                    raise Exception(f"API响应格式异常: {result}")
-                
-                return result["choices"][0]["message"]["content"].strip()
-            except httpx.HTTPStatusError as e:
-                error_detail = ""
-                try:
-                    error_detail = e.response.json()
-                except:
-                    error_detail = e.response.text[:500]
-                print(f"HTTP错误: {error_detail}")
-                raise Exception(f"LLM API调用失败 (状态码: {e.response.status_code}): {error_detail}")
+                response = await self.client.post(self.base_url, headers=headers, json=data)
             except httpx.RequestError as e:
-                print(f"请求错误: {e}")
+                LLM_ERRORS.labels(kind="request").inc()
+                logger.warning("请求错误: %s", e)
                 raise Exception(f"LLM API请求失败: {str(e)}")
-            except Exception as e:
-                print(f"其他错误: {e}")
-                raise Exception(f"LLM API调用失败: {str(e)}")
+            logger.debug("API响应状态码: %d", response.status_code)
+
+            if response.status_code != 200:
+                try:
+                    error_detail = response.json()
+                except ValueError:
+                    error_detail = response.text[:500]  # 限制长度
+                LLM_ERRORS.labels(kind="status").inc()
+                logger.warning("API错误详情 (状态码: %d): %s", response.status_code, error_detail)
+                raise Exception(f"LLM API调用失败 (状态码: {response.status_code}): {error_detail}")
+
+            # 检查响应格式
+            try:
+                result = response.json()
+                return result["choices"][0]["message"]["content"].strip()
+            except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+                LLM_ERRORS.labels(kind="response_format").inc()
+                raise Exception(f"API响应格式异常: {response.text[:500]}")
+
+    async def chat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.7
+    ) -> AsyncIterator[str]:
+        """以流式方式调用LLM API，逐段产出增量文本"""
+        data = {
+            "model": self.model_name,
+            "messages": messages,
+            "temperature": temperature,
+            "stream": True
+        }
+
+        logger.debug("调用LLM API (流式): %s", self.base_url)
+        started = time.perf_counter()
+        first_token = True
+        try:
+            with LLM_IN_FLIGHT.track_inprogress(), stage("llm_call"):
+                async with self.client.stream("POST", self.base_url, headers=self._headers(), json=data) as response:
+                    if response.status_code != 200:
+                        body = await response.aread()
+                        error_detail = body.decode("utf-8", errors="replace")[:500]
+                        LLM_ERRORS.labels(kind="status").inc()
+                        logger.warning("API错误详情 (状态码: %d): %s", response.status_code, error_detail)
+                        raise Exception(f"LLM API调用失败 (状态码: {response.status_code}): {error_detail}")
+
+                    # OpenAI兼容的SSE格式：每行 "data: {...}"，以 "data: [DONE]" 结束
+                    async for line in response.aiter_lines():
+                        line = line.strip()
+                        if not line.startswith("data:"):
+                            continue
+                        payload = line[len("data:"):].strip()
+                        if payload == "[DONE]":
+                            break
+                        try:
+                            chunk = json.loads(payload)
+                        except json.JSONDecodeError:
+                            continue
+                        choices = chunk.get("choices") or []
+                        if not choices:
+                            continue
+                        content = (choices[0].get("delta") or {}).get("content")
+                        if content:
+                            if first_token:
+                                first_token = False
+                                record_stage("llm_first_token", time.perf_counter() - started)
+                            yield content
+        except httpx.RequestError as e:
+            LLM_ERRORS.labels(kind="request").inc()
+            logger.warning("请求错误: %s", e)
+            raise Exception(f"LLM API请求失败: {str(e)}")
 
     def format_legal_prompt(
         self,
         question: str,
         context_chunks: List[Dict],
-        agent_type: str = "consultant"
+        agent_type: str = "consultant",
+        history: Optional[List[Dict[str, str]]] = None,
+        summary: str = ""
     ) -> List[Dict[str, str]]:
-        """格式化法律咨询Prompt"""
-        context_text = "\n\n".join([
-            f"【参考资料 {i+1}】\n"
-            f"来源: {chunk.get('article_name', '未知')} {chunk.get('section', '')}\n"
-            f"内容: {chunk.get('content', '')}\n"
-            f"[来源ID: {chunk.get('source_id', '')}]"
-            for i, chunk in enumerate(context_chunks)
-        ])
+        """格式化法律咨询Prompt
+
+        context_chunks 按相关性从高到低排列，可带 score 字段。参考资料在
+        PROMPT_CONTEXT_MAX_TOKENS 预算内组装，见 prompt_context.assemble_context。
+        summary / history 为多轮咨询的会话摘要与最近几轮原文，位于参考资料之前。
+        """
+        overhead = max((estimate_tokens(self._format_chunk(0, chunk, "")) for chunk in context_chunks), default=0)
+        selected = assemble_context(
+            context_chunks,
+            max_tokens=self.context_max_tokens,
+            min_chunk_tokens=self.context_min_chunk_tokens,
+            dedup_threshold=self.context_dedup_threshold,
+            overhead_tokens=overhead
+        )
+        context_text = "\n\n".join(self._format_chunk(i, chunk) for i, chunk in enumerate(selected))
+        context_tokens = estimate_tokens(context_text)
+        PROMPT_CONTEXT_TOKENS.observe(context_tokens)
+        logger.debug("参考资料: %d 个片段 → %d 个, 约 %d tokens", len(context_chunks), len(selected), context_tokens)
         
         if agent_type == "consultant":
             system_prompt = """你是一名资深的中国法律顾问。请严格基于以下【参考资料】回答用户问题。
@@ -97,10 +221,21 @@ class LLMService:
         else:
             system_prompt = "你是一个专业的法律助手，请基于提供的参考资料回答问题。"
         
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"【参考资料】：\n\n{context_text}\n\n【用户问题】：\n{question}"}
-        ]
+        messages = [{"role": "system", "content": system_prompt}]
+        if summary:
+            messages.append({"role": "system", "content": f"【此前对话摘要】：\n{summary}"})
+        messages.extend(history or [])
+        messages.append({"role": "user", "content": f"【参考资料】：\n\n{context_text}\n\n【用户问题】：\n{question}"})
         
         return messages
 
+    @staticmethod
+    def _format_chunk(index: int, chunk: Dict, content: Optional[str] = None) -> str:
+        """单条参考资料；[来源ID: ...] 标记供LLM按 [[来源ID]] 格式引用"""
+        return (
+            f"【参考资料 {index + 1}】\n"
+            f"来源: {chunk.get('article_name', '未知')} {chunk.get('section', '')}\n"
+            f"内容: {chunk.get('content', '') if content is None else content}\n"
+            f"[来源ID: {chunk.get('source_id', '')}]"
+        )
+
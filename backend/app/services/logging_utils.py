@@ -0,0 +1,29 @@
+import os
+import random
+import logging
+
+_configured = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    """获取服务日志器，首次调用时按 LOG_LEVEL 配置输出格式
+
+    热路径上的逐条明细使用 debug 级别，默认不输出也不产生格式化开销；
+    请求级别的汇总按 TRACE_SAMPLE_RATE 采样输出，见 tracing.py。
+    """
+    global _configured
+    root = logging.getLogger("legal_agent")
+    if not _configured:
+        _configured = True
+        root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+        if not root.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+            root.addHandler(handler)
+        root.propagate = False
+    return root.getChild(name)
+
+
+def sampled(rate: float) -> bool:
+    """按比例采样，rate>=1 总是返回True，rate<=0 总是返回False"""
+    return rate >= 1 or (rate > 0 and random.random() < rate)
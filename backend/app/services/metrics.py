@@ -0,0 +1,35 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# 默认直方图分桶（秒），覆盖从毫秒级检索到数十秒的LLM调用
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 服务指标定义
+REQUEST_SECONDS = Histogram(
+    "legal_agent_request_duration_seconds", "接口请求耗时（流式接口为整个流的耗时）", ["endpoint"],
+    buckets=DEFAULT_BUCKETS
+)
+REQUESTS = Counter("legal_agent_requests_total", "接口请求数", ["endpoint", "status"])
+IN_FLIGHT = Gauge("legal_agent_in_flight_requests", "正在处理的接口请求数", ["endpoint"])
+STAGE_SECONDS = Histogram(
+    "legal_agent_stage_duration_seconds",
+    "请求各阶段耗时：query_embedding, collection_check, vector_search, keyword_search, keyword_fallback, "
+    "fusion, parent_expansion, retrieval, rerank, rerank_model, prompt_format, llm_call, llm_first_token, citation_extraction",
+    ["stage"], buckets=DEFAULT_BUCKETS
+)
+FALLBACKS = Counter("legal_agent_fallback_total", "降级次数（向量检索失败改用关键词检索、LLM失败改用检索摘要等）", ["reason"])
+CACHE_REQUESTS = Counter(
+    "legal_agent_cache_requests_total", "缓存查找次数（query_embedding, document_embedding, rerank, answer）", ["cache", "result"]
+)
+LLM_ERRORS = Counter("legal_agent_llm_errors_total", "LLM调用失败次数（status, request, response_format）", ["kind"])
+LLM_IN_FLIGHT = Gauge("legal_agent_llm_in_flight_requests", "正在进行的LLM调用数")
+PROMPT_CONTEXT_TOKENS = Histogram(
+    "legal_agent_prompt_context_tokens", "Prompt中参考资料的估算token数",
+    buckets=(250, 500, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 12000, 16000)
+)
+COALESCED_CALLERS = Histogram(
+    "legal_agent_coalesced_callers", "每次合并执行服务的调用方数量（1表示没有合并）", ["operation"],
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100, 200)
+)
+COALESCED_REQUESTS = Counter(
+    "legal_agent_coalesced_requests_total", "加入进行中的相同执行、未单独执行的请求数", ["operation"]
+)
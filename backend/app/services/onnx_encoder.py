@@ -0,0 +1,189 @@
+import os
+import json
+import inspect
+import shutil
+import warnings
+import numpy as np
+from typing import List, Optional, Dict, Any
+
+
+def _safe_name(model_name: str) -> str:
+    return model_name.replace("/", "__")
+
+
+class OnnxEncoder:
+    """ONNX Runtime 句向量编码器
+
+    首次使用时从 SentenceTransformer 模型导出 Transformer 主体为 ONNX，做动态 int8
+    量化后缓存到 ONNX_MODEL_DIR；之后启动只需加载量化模型和分词器，不依赖 PyTorch。
+    池化（cls / mean / max）和归一化按原模型配置在 NumPy 中完成，对外提供与
+    SentenceTransformer 相同的 encode / get_sentence_embedding_dimension 接口。
+
+    依赖 onnxruntime（导出和量化另需 torch 与 onnx），均为可选依赖。
+    """
+
+    CONFIG_FILE = "encoder_config.json"
+
+    def __init__(self, model_dir: str, threads: Optional[int] = None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, self.CONFIG_FILE), "r", encoding="utf-8") as f:
+            self.config: Dict[str, Any] = json.load(f)
+        self.model_dir = model_dir
+        self.variant = self.config["variant"]
+        self.max_seq_length = self.config["max_seq_length"]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        # 单请求延迟优先：算子内并行，算子间串行
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = threads or int(os.getenv("ONNX_THREADS", "0")) or (os.cpu_count() or 1)
+        options.inter_op_num_threads = 1
+        self.threads = options.intra_op_num_threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, self.config["model_file"]),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    @classmethod
+    def load_or_export(
+        cls,
+        model_name: str,
+        cache_dir: Optional[str] = None,
+        quantize: Optional[bool] = None,
+        threads: Optional[int] = None
+    ) -> "OnnxEncoder":
+        """加载已导出的ONNX模型，不存在时先导出（并量化）"""
+        import onnxruntime  # noqa: F401  未安装时尽早抛出ImportError
+
+        if quantize is None:
+            quantize = os.getenv("ONNX_QUANTIZE", "true").lower() == "true"
+        variant = "onnx-int8" if quantize else "onnx-fp32"
+        base_dir = cache_dir or os.getenv("ONNX_MODEL_DIR", "./.cache/onnx")
+        model_dir = os.path.join(base_dir, f"{_safe_name(model_name)}-{variant}")
+        if not os.path.exists(os.path.join(model_dir, cls.CONFIG_FILE)):
+            cls.export(model_name, model_dir, quantize)
+        return cls(model_dir, threads)
+
+    @classmethod
+    def export(cls, model_name: str, model_dir: str, quantize: bool = True):
+        """从SentenceTransformer导出ONNX模型；先写临时目录，完成后原子替换"""
+        import torch
+        from sentence_transformers import SentenceTransformer
+        from sentence_transformers.models import Pooling, Normalize
+
+        print(f"正在导出ONNX模型: {model_name} ({'int8量化' if quantize else 'fp32'})")
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            st_model = SentenceTransformer(model_name, device="cpu")
+        transformer = st_model[0]
+        pooling = next((m for m in st_model if isinstance(m, Pooling)), None)
+        if pooling is None:
+            raise ValueError(f"模型 {model_name} 没有Pooling层，无法导出")
+        if pooling.pooling_mode_cls_token:
+            pooling_mode = "cls"
+        elif pooling.pooling_mode_max_tokens:
+            pooling_mode = "max"
+        else:
+            pooling_mode = "mean"
+
+        tmp_dir = model_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir, exist_ok=True)
+        transformer.tokenizer.save_pretrained(tmp_dir)
+
+        sample = transformer.tokenizer(["法律咨询"], return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+        auto_model = transformer.auto_model.eval()
+
+        class _Wrapper(torch.nn.Module):
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, *args):
+                return self.model(**dict(zip(input_names, args))).last_hidden_state
+
+        fp32_path = os.path.join(tmp_dir, "model.onnx")
+        # 新版torch默认使用dynamo导出（依赖onnxscript），这里固定使用TorchScript导出
+        export_kwargs = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+        with torch.no_grad():
+            torch.onnx.export(
+                _Wrapper(auto_model),
+                tuple(sample[name] for name in input_names),
+                fp32_path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+                **export_kwargs
+            )
+
+        model_file = "model.onnx"
+        if quantize:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantize_dynamic(fp32_path, os.path.join(tmp_dir, "model_int8.onnx"), weight_type=QuantType.QInt8)
+            os.remove(fp32_path)
+            model_file = "model_int8.onnx"
+
+        config = {
+            "model_name": model_name,
+            "variant": "onnx-int8" if quantize else "onnx-fp32",
+            "model_file": model_file,
+            "dimension": st_model.get_sentence_embedding_dimension(),
+            "max_seq_length": st_model.max_seq_length,
+            "pooling_mode": pooling_mode,
+            "normalize": any(isinstance(m, Normalize) for m in st_model)
+        }
+        with open(os.path.join(tmp_dir, cls.CONFIG_FILE), "w", encoding="utf-8") as f:
+            json.dump(config, f, ensure_ascii=False, indent=2)
+
+        shutil.rmtree(model_dir, ignore_errors=True)
+        os.makedirs(os.path.dirname(os.path.abspath(model_dir)), exist_ok=True)
+        os.replace(tmp_dir, model_dir)
+        print(f"✓ ONNX模型导出完成: {model_dir}")
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.config["dimension"]
+
+    def _pool(self, hidden: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        mode = self.config["pooling_mode"]
+        if mode == "cls":
+            return hidden[:, 0]
+        mask = mask[..., None].astype(np.float32)
+        if mode == "max":
+            return np.where(mask > 0, hidden, -1e9).max(axis=1)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(self, texts: List[str], batch_size: int = 32, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        """编码文本列表，返回 (n, dim) 的 float32 矩阵"""
+        if isinstance(texts, str):
+            texts = [texts]
+        if not texts:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        # 按长度排序后分批，减少padding
+        order = np.argsort([-len(t) for t in texts])
+        outputs = np.empty((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            indices = order[start:start + batch_size]
+            encoded = self.tokenizer(
+                [texts[i] for i in indices],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            feeds = {name: encoded[name].astype(np.int64) for name in self.input_names if name in encoded}
+            hidden = self.session.run(None, feeds)[0]
+            outputs[indices] = self._pool(hidden, encoded["attention_mask"])
+        if self.config["normalize"]:
+            norms = np.linalg.norm(outputs, axis=1, keepdims=True)
+            outputs = outputs / np.clip(norms, 1e-12, None)
+        return outputs
@@ -0,0 +1,84 @@
+import os
+import json
+import sqlite3
+import threading
+from typing import Dict, Any, List, Iterable, Optional
+
+
+class ParentStore:
+    """切分前的父文档存储（SQLite）
+
+    只保存正文与展示字段，不参与向量检索。检索命中子片段后按 parent_id 读取父文档，
+    用于把同一父文档的多个命中片段展开为完整上下文；chunk_count 用于在父文档
+    重新切分后清理多出的旧片段。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("PARENT_STORE_PATH", "./.cache/parents.sqlite")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS parents (id TEXT PRIMARY KEY, chunk_count INTEGER NOT NULL, doc TEXT NOT NULL)"
+        )
+        self._db.commit()
+        self._count = self._db.execute("SELECT COUNT(*) FROM parents").fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def put_many(self, parents: List[Dict[str, Any]]) -> Dict[str, int]:
+        """写入父文档（需包含 id 与 chunk_count 字段），返回已存在父文档之前的片段数"""
+        if not parents:
+            return {}
+        with self._lock:
+            previous = self._chunk_counts([p["id"] for p in parents])
+            self._db.executemany(
+                "INSERT OR REPLACE INTO parents (id, chunk_count, doc) VALUES (?, ?, ?)",
+                [(p["id"], p["chunk_count"], json.dumps(p, ensure_ascii=False)) for p in parents]
+            )
+            self._db.commit()
+            self._count += len({p["id"] for p in parents} - set(previous))
+        return previous
+
+    def pop_many(self, ids: Iterable[str]) -> Dict[str, int]:
+        """删除父文档，返回被删除父文档的片段数"""
+        ids = list(ids)
+        if not ids:
+            return {}
+        with self._lock:
+            previous = self._chunk_counts(ids)
+            if previous:
+                self._db.executemany("DELETE FROM parents WHERE id = ?", [(parent_id,) for parent_id in previous])
+                self._db.commit()
+                self._count -= len(previous)
+        return previous
+
+    def get_many(self, ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return {}
+        with self._lock:
+            placeholders = ",".join("?" * len(ids))
+            rows = self._db.execute(f"SELECT id, doc FROM parents WHERE id IN ({placeholders})", ids).fetchall()
+        return {parent_id: json.loads(doc) for parent_id, doc in rows}
+
+    def chunk_counts(self) -> Dict[str, int]:
+        """所有父文档的片段数"""
+        with self._lock:
+            return dict(self._db.execute("SELECT id, chunk_count FROM parents").fetchall())
+
+    def _chunk_counts(self, ids: List[str]) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for i in range(0, len(ids), 500):
+            batch = ids[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            counts.update(self._db.execute(
+                f"SELECT id, chunk_count FROM parents WHERE id IN ({placeholders})", batch
+            ).fetchall())
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,148 @@
+import re
+from typing import List, Dict, Any, Set
+
+# 中日韩字符（含全角标点）按每字一个token估算，其余按约4个字符一个token估算
+_CJK_PATTERN = re.compile(r"[　-〿㐀-䶿一-鿿豈-﫿＀-￯]")
+_SENTENCE_PATTERN = re.compile(r"(?<=[。！？；;!?\n])")
+TRUNCATION_MARK = "……"
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的token数
+
+    不依赖具体模型的分词器：主流中文模型中一个汉字约为0.6~1个token，这里按1个计，
+    预算只会偏保守。
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    other = len(text) - cjk - text.count(" ") - text.count("\n")
+    return cjk + (max(other, 0) + 3) // 4
+
+
+def _bigrams(text: str) -> Set[str]:
+    text = "".join(text.split())
+    return {text[i:i + 2] for i in range(len(text) - 1)} or {text}
+
+
+def dedupe_chunks(chunks: List[Dict[str, Any]], threshold: float) -> List[Dict[str, Any]]:
+    """去除重复片段，保留排名靠前的一个
+
+    重复指：source_id 相同；正文被排名更靠前的片段完整包含（如父文档与其子片段）；
+    或字符二元组的Jaccard相似度不低于 threshold。
+    """
+    kept: List[Dict[str, Any]] = []
+    kept_grams: List[Set[str]] = []
+    seen_ids: Set[str] = set()
+    for chunk in chunks:
+        source_id = chunk.get("source_id", "")
+        content = chunk.get("content", "")
+        if source_id and source_id in seen_ids:
+            continue
+        grams = _bigrams(content)
+        duplicate = False
+        for other, other_grams in zip(kept, kept_grams):
+            if content in other.get("content", ""):
+                duplicate = True
+                break
+            if len(grams & other_grams) / len(grams | other_grams) >= threshold:
+                duplicate = True
+                break
+        if duplicate:
+            continue
+        kept.append(chunk)
+        kept_grams.append(grams)
+        if source_id:
+            seen_ids.add(source_id)
+    return kept
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """将文本截断到不超过 max_tokens，尽量在句子边界截断，截断处追加省略号"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens - estimate_tokens(TRUNCATION_MARK)
+    kept, used = [], 0
+    for sentence in _SENTENCE_PATTERN.split(text):
+        tokens = estimate_tokens(sentence)
+        if used + tokens > budget:
+            break
+        kept.append(sentence)
+        used += tokens
+    trimmed = "".join(kept).rstrip()
+    if not trimmed:
+        # 第一句就超出预算，只能按字数截断
+        end = len(text)
+        while end > 0 and estimate_tokens(text[:end]) > budget:
+            end -= max(1, (end - 1) // 8)
+        trimmed = text[:max(end, 0)].rstrip()
+    return trimmed + TRUNCATION_MARK
+
+
+def allocate_budget(needs: List[int], weights: List[float], budget: int) -> List[int]:
+    """按权重分配token预算
+
+    每个片段按权重占一份预算；需求低于所占份额的片段全文保留，剩余预算在其他片段间
+    按权重重新分配，直到所有片段都得到全文或固定份额。
+    """
+    allocation = [0] * len(needs)
+    active = list(range(len(needs)))
+    remaining = budget
+    while active and remaining > 0:
+        total_weight = sum(weights[i] for i in active)
+        shares = {i: remaining * weights[i] / total_weight for i in active}
+        satisfied = [i for i in active if needs[i] <= shares[i]]
+        if not satisfied:
+            for i in active:
+                allocation[i] = int(shares[i])
+            break
+        for i in satisfied:
+            allocation[i] = needs[i]
+            remaining -= needs[i]
+            active.remove(i)
+    return allocation
+
+
+def assemble_context(
+    chunks: List[Dict[str, Any]],
+    max_tokens: int,
+    min_chunk_tokens: int,
+    dedup_threshold: float,
+    overhead_tokens: int = 0
+) -> List[Dict[str, Any]]:
+    """在token预算内组装参考资料
+
+    先去重，再按相关性分数（score，缺失时视为相同）分配预算：分数越高份额越大，
+    超出份额的片段在句子边界截断，份额不足 min_chunk_tokens 的低分片段整体丢弃。
+    overhead_tokens 为每个片段的标题、来源行等固定开销。返回的片段保持原有顺序，
+    source_id 等字段不变，只截断 content。
+    """
+    chunks = dedupe_chunks(chunks, dedup_threshold)
+    while chunks:
+        budget = max_tokens - overhead_tokens * len(chunks)
+        needs = [estimate_tokens(chunk.get("content", "")) for chunk in chunks]
+        allocation = allocate_budget(needs, _score_weights(chunks), budget)
+        # 份额过小的片段截断后已无意义，从排名最低的开始丢弃后重新分配
+        dropped = next(
+            (i for i in reversed(range(len(chunks))) if allocation[i] < min(needs[i], min_chunk_tokens)),
+            None
+        )
+        if dropped is None or len(chunks) == 1:
+            return [
+                {**chunk, "content": trim_to_tokens(chunk.get("content", ""), max(tokens, 1))}
+                if tokens < need else chunk
+                for chunk, need, tokens in zip(chunks, needs, allocation)
+            ]
+        chunks = chunks[:dropped] + chunks[dropped + 1:]
+    return []
+
+
+def _score_weights(chunks: List[Dict[str, Any]]) -> List[float]:
+    """分数min-max归一化到 [1, 2]：最相关片段的份额最多是最不相关片段的两倍"""
+    scores = [chunk.get("score") for chunk in chunks]
+    if any(score is None for score in scores):
+        return [1.0] * len(chunks)
+    lo, hi = min(scores), max(scores)
+    if hi <= lo:
+        return [1.0] * len(chunks)
+    return [1.0 + (score - lo) / (hi - lo) for score in scores]
@@ -0,0 +1,107 @@
+import os
+import asyncio
+import hashlib
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+from app.services.embedding_cache import normalize_text
+from app.services.lru_cache import LRUCache
+from app.services.metrics import CACHE_REQUESTS
+from app.services.tracing import stage, bind_context
+
+
+class Reranker:
+    """交叉编码器重排序
+
+    检索先召回较多候选（RERANK_CANDIDATES），再由交叉编码器对 (问题, 候选) 逐对打分，
+    只保留得分最高的 RERANK_TOP_N 条送入LLM。所有未命中缓存的候选在一次批量前向中计算，
+    (问题, 候选正文) 的得分缓存在进程内LRU中，重复的问题和热门法条不再重复计算。
+    """
+
+    def __init__(self, model=None, model_name: Optional[str] = None):
+        """model: 可选，直接使用传入的打分模型（需提供 predict），用于基准测试等离线场景"""
+        self.model_name = model_name or os.getenv("RERANKER_MODEL", "BAAI/bge-reranker-base")
+        self.candidates = int(os.getenv("RERANK_CANDIDATES", "50"))
+        self.top_n = int(os.getenv("RERANK_TOP_N", "5"))
+        self.batch_size = int(os.getenv("RERANK_BATCH_SIZE", "32"))
+        if model is None:
+            from sentence_transformers import CrossEncoder
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                model = CrossEncoder(
+                    self.model_name,
+                    max_length=int(os.getenv("RERANK_MAX_LENGTH", "512")),
+                    device="cpu"
+                )
+            print(f"✓ 重排序模型加载成功: {self.model_name}")
+        self.model = model
+        self.score_cache = LRUCache(
+            max_size=int(os.getenv("RERANK_CACHE_MAX_SIZE", "8192")),
+            ttl=float(os.getenv("RERANK_CACHE_TTL", "3600"))
+        )
+        # 打分是CPU密集的阻塞操作，单独的线程池避免占用检索线程
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+
+    @staticmethod
+    def _pair_key(query: str, content: str) -> bytes:
+        return hashlib.sha1(f"{normalize_text(query)}\x00{content}".encode("utf-8")).digest()
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        """批量计算 (query, text) 的相关性得分，命中缓存的跳过模型计算"""
+        keys = [self._pair_key(query, text) for text in texts]
+        scores: List[Optional[float]] = [self.score_cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        CACHE_REQUESTS.labels(cache="rerank", result="hit").inc(len(texts) - len(missing))
+        CACHE_REQUESTS.labels(cache="rerank", result="miss").inc(len(missing))
+        if missing:
+            with stage("rerank_model"):
+                predicted = self.model.predict(
+                    [(query, texts[i]) for i in missing],
+                    batch_size=self.batch_size,
+                    show_progress_bar=False
+                )
+            for i, value in zip(missing, predicted):
+                scores[i] = float(value)
+                self.score_cache.set(keys[i], scores[i])
+        return scores
+
+    def rerank(self, query: str, results: List[Dict[str, Any]], top_n: Optional[int] = None) -> List[Dict[str, Any]]:
+        """按交叉编码器得分重排检索结果，score 替换为重排得分，原检索得分保存在 retrieval_score"""
+        if not results:
+            return []
+        with stage("rerank"):
+            scores = self.score(query, [r["content"] for r in results])
+            order = sorted(range(len(results)), key=lambda i: scores[i], reverse=True)
+            return [
+                {**results[i], "score": scores[i], "retrieval_score": results[i]["score"]}
+                for i in order[:top_n or self.top_n]
+            ]
+
+    async def arerank(self, query: str, results: List[Dict[str, Any]], top_n: Optional[int] = None) -> List[Dict[str, Any]]:
+        """在重排序线程池中执行 rerank，不阻塞事件循环"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor,
+            bind_context(self.rerank, query, results, top_n)
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "candidates": self.candidates,
+            "top_n": self.top_n,
+            "score_cache": self.score_cache.stats()
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+def create_reranker() -> Optional[Reranker]:
+    """RERANK_ENABLED=true 时加载重排序模型；加载失败时返回None，咨询直接使用检索结果"""
+    if os.getenv("RERANK_ENABLED", "false").lower() != "true":
+        return None
+    try:
+        return Reranker()
+    except Exception as e:
+        print(f"✗ 重排序模型加载失败，将不使用重排序: {e}")
+        return None
@@ -0,0 +1,47 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+from app.services.metrics import COALESCED_CALLERS, COALESCED_REQUESTS
+
+T = TypeVar("T")
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.callers = 1
+
+
+class SingleFlight:
+    """进程内的请求合并（single-flight）
+
+    同一个键在执行期间到达的调用不再重复执行，而是等待正在进行的那次执行并共享其结果
+    （包括异常）；执行结束后键立即释放，之后的调用重新执行，因此不会返回过期结果。
+    执行在独立的任务中进行，某个调用方取消（如客户端断开）不会影响其他等待的调用方。
+    返回的是同一个对象，调用方需要修改时应自行复制。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(func()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._finish(key, call))
+        else:
+            call.callers += 1
+            COALESCED_REQUESTS.labels(operation=self.name).inc()
+        return await asyncio.shield(call.task)
+
+    def _finish(self, key: Hashable, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        COALESCED_CALLERS.labels(operation=self.name).observe(call.callers)
+        if not call.task.cancelled():
+            # 所有调用方都已取消时异常无人读取，这里读取一次避免asyncio告警
+            call.task.exception()
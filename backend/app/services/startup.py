@@ -0,0 +1,66 @@
+import time
+import threading
+from typing import Dict, Any, List, Optional
+
+
+class StartupState:
+    """分阶段启动的状态记录
+
+    每个阶段依次经历 pending → running → done/failed，记录耗时和错误信息。
+    所有阶段完成后服务才视为就绪，供 /health/ready 探针使用。
+    """
+
+    def __init__(self, stages: List[str]):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.stages: Dict[str, Dict[str, Any]] = {
+            name: {"status": "pending", "seconds": None, "error": None} for name in stages
+        }
+        self._started: Dict[str, float] = {}
+
+    def begin(self, name: str):
+        with self._lock:
+            self._started[name] = time.perf_counter()
+            self.stages[name]["status"] = "running"
+        print(f"[启动] {name} 开始")
+
+    def finish(self, name: str, error: Optional[Exception] = None):
+        with self._lock:
+            seconds = time.perf_counter() - self._started.get(name, time.perf_counter())
+            stage = self.stages[name]
+            stage["seconds"] = round(seconds, 3)
+            stage["status"] = "failed" if error else "done"
+            stage["error"] = str(error) if error else None
+        if error:
+            print(f"✗ [启动] {name} 失败 ({seconds:.2f}s): {error}")
+        else:
+            print(f"✓ [启动] {name} 完成 ({seconds:.2f}s)")
+
+    def run(self, name: str, func, *args):
+        """在当前线程执行一个阶段并记录耗时，失败时抛出异常"""
+        self.begin(name)
+        try:
+            result = func(*args)
+        except Exception as e:
+            self.finish(name, e)
+            raise
+        self.finish(name)
+        return result
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return all(stage["status"] == "done" for stage in self.stages.values())
+
+    @property
+    def failed(self) -> bool:
+        with self._lock:
+            return any(stage["status"] == "failed" for stage in self.stages.values())
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ready": all(stage["status"] == "done" for stage in self.stages.values()),
+                "uptime_seconds": round(time.time() - self.started_at, 3),
+                "stages": {name: dict(stage) for name, stage in self.stages.items()}
+            }
@@ -0,0 +1,92 @@
+import os
+import time
+import uuid
+import functools
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Optional, Iterator, Callable, Any
+from app.services.metrics import STAGE_SECONDS, REQUEST_SECONDS, REQUESTS, IN_FLIGHT
+from app.services.logging_utils import get_logger, sampled
+
+logger = get_logger("trace")
+
+# 请求汇总日志的采样率；超过慢请求阈值的请求总是记录
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "10000"))
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("legal_agent_trace", default=None)
+
+
+class Trace:
+    """单个请求的阶段耗时记录（毫秒），同名阶段多次出现时累加"""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.total_ms: Optional[float] = None
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds * 1000
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "endpoint": self.endpoint,
+            "total_ms": round(self.total_ms, 2) if self.total_ms is not None else None,
+            "stages": {name: round(ms, 2) for name, ms in self.stages.items()}
+        }
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def record_stage(name: str, seconds: float):
+    """记录阶段耗时：写入阶段直方图，并记入当前请求的trace（如果有）"""
+    STAGE_SECONDS.labels(stage=name).observe(seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """记录 with 代码块的耗时，见 record_stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+@contextmanager
+def request_trace(endpoint: str) -> Iterator[Trace]:
+    """请求级追踪：统计进行中请求数、请求耗时与状态，结束时按采样率输出阶段耗时汇总"""
+    trace = Trace(endpoint)
+    previous = _current_trace.get()
+    _current_trace.set(trace)
+    IN_FLIGHT.labels(endpoint=endpoint).inc()
+    status = "ok"
+    try:
+        yield trace
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        IN_FLIGHT.labels(endpoint=endpoint).dec()
+        trace.total_ms = (time.perf_counter() - trace.started) * 1000
+        REQUEST_SECONDS.labels(endpoint=endpoint).observe(trace.total_ms / 1000)
+        REQUESTS.labels(endpoint=endpoint, status=status).inc()
+        # 流式响应中途断开时生成器可能在其他上下文中关闭，不能使用 ContextVar.reset
+        _current_trace.set(previous)
+        if trace.total_ms >= SLOW_REQUEST_MS:
+            logger.warning("⚠ 慢请求 %s status=%s %s", endpoint, status, trace.summary())
+        elif status == "error" or sampled(TRACE_SAMPLE_RATE):
+            logger.info("请求追踪 %s status=%s %s", endpoint, status, trace.summary())
+
+
+def bind_context(func: Callable, *args, **kwargs) -> Callable[[], Any]:
+    """绑定当前上下文（包括trace），提交到线程池后阶段耗时仍记入发起请求的trace"""
+    return functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
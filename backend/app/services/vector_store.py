@@ -1,297 +1,747 @@
 import os
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
-from typing import List, Dict, Any, Optional
+import json
+import time
+import hashlib
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Set, Iterable, Tuple
 from app.services.embedding_service import EmbeddingService
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.keyword_index import KeywordIndex
+from app.services.filters import normalize_filter, matches_filter, date_to_int, DATE_FIELD
+from app.services.backends import create_backend, BackendPoint
+from app.services.chunker import LegalChunker, document_id
+from app.services.parent_store import ParentStore
+from app.services.metrics import FALLBACKS
+from app.services.tracing import stage, bind_context
+from app.services.logging_utils import get_logger
+import logging
 import uuid
 
+logger = get_logger("vector_store")
+
+SEARCH_MODES = ("dense", "keyword", "hybrid")
+# payload结构版本，变化时内容哈希随之变化，已有文档会在下次导入时重新写入
+PAYLOAD_VERSION = 2
+
 class VectorStore:
-    def __init__(self):
-        self.host = os.getenv("QDRANT_HOST", "localhost")
-        self.port = int(os.getenv("QDRANT_PORT", "6333"))
+    def __init__(self, embedding_service: Optional[EmbeddingService] = None):
         self.collection_name = os.getenv("QDRANT_COLLECTION_NAME", "legal_documents")
-        self.use_memory = False
-        
-        # 尝试连接Qdrant，设置较短的超时时间
-        try:
-            print(f"尝试连接到Qdrant: {self.host}:{self.port}")
-            self.client = QdrantClient(
-                host=self.host, 
-                port=self.port,
-                timeout=3.0  # 3秒超时
-            )
-            # 快速测试连接
-            try:
-                self.client.get_collections()
-                print(f"✓ 成功连接到Qdrant: {self.host}:{self.port}")
-            except Exception as e:
-                print(f"⚠ Qdrant连接测试失败: {e}")
-                print("切换到内存模式...")
-                self.client = QdrantClient(":memory:")
-                self.use_memory = True
-        except Exception as e:
-            print(f"⚠ 无法连接到Qdrant ({self.host}:{self.port}): {e}")
-            print("切换到内存模式...")
-            self.client = QdrantClient(":memory:")
-            self.use_memory = True
-        
-        self.embedding_service = EmbeddingService()
-        self._ensure_collection()
+        self.embedding_service = embedding_service or EmbeddingService()
 
-    def _ensure_collection(self):
-        """确保集合存在"""
-        try:
-            # 对于内存模式，直接尝试创建集合
-            if self.use_memory:
-                try:
-                    dim = self.embedding_service.model.get_sentence_embedding_dimension()
-                    self.client.create_collection(
-                        collection_name=self.collection_name,
-                        vectors_config=VectorParams(
-                            size=dim,
-                            distance=Distance.COSINE
-                        )
-                    )
-                    print(f"✓ 在内存模式中创建集合: {self.collection_name}")
-                except Exception as e:
-                    # 集合可能已存在
-                    if "already exists" in str(e).lower() or "exists" in str(e).lower():
-                        print(f"集合 {self.collection_name} 已存在")
-                    else:
-                        raise
-            else:
-                # 远程模式，检查集合是否存在
-                try:
-                    collections = self.client.get_collections().collections
-                    collection_names = [c.name for c in collections]
-                    
-                    if self.collection_name not in collection_names:
-                        dim = self.embedding_service.model.get_sentence_embedding_dimension()
-                        self.client.create_collection(
-                            collection_name=self.collection_name,
-                            vectors_config=VectorParams(
-                                size=dim,
-                                distance=Distance.COSINE
-                            )
-                        )
-                        print(f"✓ 创建集合: {self.collection_name}")
-                    else:
-                        print(f"集合 {self.collection_name} 已存在")
-                except Exception as e:
-                    print(f"⚠ 检查集合时出错: {e}")
-                    # 如果远程连接有问题，切换到内存模式
-                    if "timeout" in str(e).lower() or "connection" in str(e).lower():
-                        print("切换到内存模式...")
-                        self.client = QdrantClient(":memory:")
-                        self.use_memory = True
-                        self._ensure_collection()  # 递归调用
-        except Exception as e:
-            print(f"✗ 集合初始化错误: {e}")
-            import traceback
-            traceback.print_exc()
+        # 向量存储后端：qdrant（远程Qdrant，不可用时降级为内存模式）或 local（本地NumPy平铺索引）
+        self.backend_name = os.getenv("VECTOR_BACKEND", "qdrant")
+        self.backend = create_backend(self.backend_name, self.collection_name)
+        self.backend.ensure_collection(self.embedding_service.model.get_sentence_embedding_dimension())
+
+        # 关键词检索的BM25倒排索引，随add_documents增量更新并持久化到磁盘
+        self.keyword_index_path = os.getenv("KEYWORD_INDEX_PATH", "./.cache/keyword_index.pkl")
+        self.keyword_index = KeywordIndex()
+        self._load_keyword_index()
+
+        # 混合检索配置
+        self.default_search_mode = os.getenv("SEARCH_MODE", "dense")
+        self.hybrid_fusion = os.getenv("HYBRID_FUSION", "rrf")
+        self.hybrid_rrf_k = int(os.getenv("HYBRID_RRF_K", "60"))
+        self.hybrid_dense_weight = float(os.getenv("HYBRID_DENSE_WEIGHT", "0.5"))
+        self.hybrid_candidate_multiplier = int(os.getenv("HYBRID_CANDIDATE_MULTIPLIER", "4"))
+
+        # 父子检索：长文档按法律结构切分为子片段分别嵌入，命中后按需展开为父文档
+        self.chunker = None
+        if os.getenv("CHUNKING_ENABLED", "true").lower() == "true":
+            self.chunker = LegalChunker()
+        self.parent_store = ParentStore()
+        self.parent_expand_max_chars = int(os.getenv("PARENT_EXPAND_MAX_CHARS", "1500"))
+        self.parent_expand_min_hits = int(os.getenv("PARENT_EXPAND_MIN_HITS", "2"))
+        self.parent_candidate_multiplier = int(os.getenv("PARENT_CANDIDATE_MULTIPLIER", "2"))
+
+        # 检索专用线程池：编码与Qdrant调用都是阻塞操作，不能放在事件循环上执行
+        self.retrieval_workers = int(os.getenv("RETRIEVAL_WORKERS", "4"))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.retrieval_workers,
+            thread_name_prefix="retrieval"
+        )
+        # 并发查询的嵌入请求合并为批次编码
+        self.batcher = None
+        if os.getenv("EMBEDDING_BATCH_ENABLED", "true").lower() == "true":
+            self.batcher = EmbeddingBatcher(self.embedding_service, self._executor)
 
-    def add_documents(self, documents: List[Dict[str, Any]]):
-        """添加文档到向量库"""
+    def add_documents(self, documents: List[Dict[str, Any]], skip_unchanged: bool = True):
+        """添加文档到向量库（默认跳过内容哈希未变化的文档）
+
+        不在每次调用后落盘：一批文档添加完成后调用 persist，关闭时也会保存。
+        """
         if not documents:
             print("警告: 没有文档需要添加")
             return
         
         try:
+            documents, stale = self.prepare_documents(documents)
+            self.delete_points(stale)
+            if skip_unchanged:
+                changed = self.filter_changed(documents)
+                print(f"增量更新: {len(changed)} 个新增或修改, {len(documents) - len(changed)} 个未变化已跳过")
+                documents = changed
+                if not documents:
+                    return
+
             texts = [doc["content"] for doc in documents]
             print(f"正在生成 {len(texts)} 个文档的嵌入向量...")
             embeddings = self.embedding_service.embed_documents(texts)
             print(f"✓ 嵌入向量生成完成")
             
-            points = []
-            for i, doc in enumerate(documents):
-                original_id = doc.get("id", str(uuid.uuid4()))
-                source_id = doc.get("source_id", original_id)
-                
-                # Qdrant内存模式要求ID必须是字符串或整数
-                # 使用UUID5基于命名空间和原始ID生成确定性UUID，然后转换为字符串
-                namespace = uuid.UUID('6ba7b810-9dad-11d1-80b4-00c04fd430c8')  # 固定命名空间
-                try:
-                    # 如果已经是UUID格式，转换为字符串
-                    uuid_obj = uuid.UUID(original_id)
-                    point_id = str(uuid_obj)
-                except (ValueError, AttributeError, TypeError):
-                    # 如果不是UUID格式，转换为UUID再转字符串（确定性转换）
-                    uuid_obj = uuid.uuid5(namespace, str(original_id))
-                    point_id = str(uuid_obj)
-                
-                points.append(
-                    PointStruct(
-                        id=point_id,  # 使用字符串格式的UUID
-                        vector=embeddings[i],
-                        payload={
-                            "content": doc["content"],
-                            "article_name": doc.get("article_name", ""),
-                            "section": doc.get("section", ""),
-                            "source_id": source_id,  # 保留原始ID在payload中
-                            "original_id": original_id,  # 也保存原始ID
-                            "doc_type": doc.get("doc_type", "statute"),
-                            "url": doc.get("url", ""),
-                            **doc.get("metadata", {})
-                        }
-                    )
+            points = self.build_points(documents, embeddings)
+            self.upsert_points(points)
+        except Exception as e:
+            print(f"✗ 添加文档错误: {e}")
+            import traceback
+            traceback.print_exc()
+
+    def sync_documents(self, documents: List[Dict[str, Any]]) -> int:
+        """将向量库与给定的完整文档集合同步：增量写入变化的文档，并删除已不存在的文档"""
+        self.add_documents(documents)
+        keep_ids = {point_id for doc in documents for point_id in self.document_point_ids(doc)}
+        deleted = self.delete_missing(keep_ids)
+        self.persist()
+        return deleted
+
+    def prepare_documents(self, documents: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """将长文档切分为子片段并记录父文档，返回待写入的文档与需要删除的旧点ID
+
+        旧点包括：之前整篇写入、现在改为切分的文档本身；重新切分后片段变少时多出的旧片段；
+        之前切分、现在不再切分（变短或关闭切分）的文档的全部片段。
+        """
+        prepared: List[Dict[str, Any]] = []
+        parents: List[Dict[str, Any]] = []
+        unchunked_ids: List[str] = []
+        for doc in documents:
+            if not doc.get("id"):
+                # 没有id的文档使用确定性ID，重复导入时能跳过未变化的文档，同步时也能匹配
+                doc = {**doc, "id": document_id(doc)}
+            chunks = self.chunker.chunk(doc) if self.chunker is not None else None
+            if chunks is None:
+                prepared.append(doc)
+                unchunked_ids.append(str(doc["id"]))
+                continue
+            prepared.extend(chunks)
+            parent_id = chunks[0]["metadata"]["parent_id"]
+            parents.append({
+                "id": parent_id,
+                "chunk_count": len(chunks),
+                "payload": {
+                    "content": doc["content"],
+                    "article_name": doc.get("article_name", ""),
+                    "section": doc.get("section", ""),
+                    "source_id": doc.get("source_id", parent_id),
+                    "doc_type": doc.get("doc_type", "statute"),
+                    "url": doc.get("url", ""),
+                    **doc.get("metadata", {})
+                }
+            })
+
+        stale: List[str] = []
+        previous = self.parent_store.put_many(parents)
+        for parent in parents:
+            count = previous.get(parent["id"])
+            if count is None:
+                stale.append(self.point_id(parent["id"]))
+                count = 0
+            stale.extend(self._chunk_point_ids(parent["id"], parent["chunk_count"], count))
+        for parent_id, count in self.parent_store.pop_many(unchunked_ids).items():
+            stale.extend(self._chunk_point_ids(parent_id, 0, count))
+        return prepared, stale
+
+    def document_point_ids(self, doc: Dict[str, Any]) -> List[str]:
+        """文档写入后对应的点ID（切分的文档为各子片段的点ID），用于同步时判断哪些点仍然有效"""
+        chunks = self.chunker.chunk(doc) if self.chunker is not None else None
+        if chunks is not None:
+            return [self.point_id(chunk["id"]) for chunk in chunks]
+        return [self.point_id(document_id(doc))]
+
+    def _chunk_point_ids(self, parent_id: str, start: int, stop: int) -> List[str]:
+        return [self.point_id(LegalChunker.chunk_id(parent_id, i)) for i in range(start, stop)]
+
+    @staticmethod
+    def document_hash(doc: Dict[str, Any]) -> str:
+        """文档内容哈希（覆盖正文与所有payload字段），用于判断文档是否变化"""
+        raw = json.dumps(
+            {
+                "content": doc.get("content", ""),
+                "article_name": doc.get("article_name", ""),
+                "section": doc.get("section", ""),
+                "source_id": doc.get("source_id", doc.get("id", "")),
+                "doc_type": doc.get("doc_type", "statute"),
+                "url": doc.get("url", ""),
+                "metadata": doc.get("metadata", {}),
+                "payload_version": PAYLOAD_VERSION
+            },
+            ensure_ascii=False,
+            sort_keys=True
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def existing_hashes(self, point_ids: List[str], batch_size: int = 1000) -> Dict[str, str]:
+        """批量读取已存在点的内容哈希"""
+        hashes: Dict[str, str] = {}
+        for i in range(0, len(point_ids), batch_size):
+            payloads = self.backend.retrieve(point_ids[i:i + batch_size], fields=["content_hash"])
+            for point_id, payload in payloads.items():
+                content_hash = payload.get("content_hash")
+                if content_hash:
+                    hashes[point_id] = content_hash
+        return hashes
+
+    def filter_changed(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """过滤出新增或内容变化的文档（没有id的文档按确定性ID比较）"""
+        point_ids = [self.point_id(document_id(doc)) for doc in documents]
+        try:
+            existing = self.existing_hashes(point_ids)
+        except Exception as e:
+            print(f"⚠ 读取已有内容哈希失败，将全部重新写入: {e}")
+            return documents
+        return [
+            doc for doc, point_id in zip(documents, point_ids)
+            if existing.get(point_id) != self.document_hash(doc)
+        ]
+
+    def iter_point_ids(self, batch_size: int = 1000) -> Iterable[str]:
+        """分页遍历集合中的所有点ID"""
+        for point_id, _ in self.backend.scroll(batch_size=batch_size, with_payload=False):
+            yield point_id
+
+    def delete_missing(self, keep_ids: Set[str], batch_size: int = 1000) -> int:
+        """删除不在keep_ids中的点（源文档已被移除），返回删除数量"""
+        stale = [point_id for point_id in self.iter_point_ids() if point_id not in keep_ids]
+        self.delete_points(stale, batch_size)
+        self.save_keyword_index()
+        stale_parents = [
+            parent_id for parent_id in self.parent_store.chunk_counts()
+            if self.point_id(LegalChunker.chunk_id(parent_id, 0)) not in keep_ids
+        ]
+        self.parent_store.pop_many(stale_parents)
+        if stale:
+            print(f"✓ 删除 {len(stale)} 个源文档已不存在的点")
+        return len(stale)
+
+    def delete_points(self, point_ids: List[str], batch_size: int = 1000):
+        """从向量存储后端与关键词索引中删除点"""
+        for i in range(0, len(point_ids), batch_size):
+            self.backend.delete(point_ids[i:i + batch_size])
+        for point_id in point_ids:
+            self.keyword_index.remove(point_id)
+
+    @staticmethod
+    def point_id(original_id: Any) -> str:
+        """由原始文档ID生成确定性的点ID"""
+        # Qdrant内存模式要求ID必须是字符串或整数
+        # 使用UUID5基于命名空间和原始ID生成确定性UUID，然后转换为字符串
+        namespace = uuid.UUID('6ba7b810-9dad-11d1-80b4-00c04fd430c8')  # 固定命名空间
+        try:
+            # 如果已经是UUID格式，转换为字符串
+            uuid_obj = uuid.UUID(original_id)
+        except (ValueError, AttributeError, TypeError):
+            # 如果不是UUID格式，转换为UUID再转字符串（确定性转换）
+            uuid_obj = uuid.uuid5(namespace, str(original_id))
+        return str(uuid_obj)
+
+    def build_points(
+        self,
+        documents: List[Dict[str, Any]],
+        embeddings: List[List[float]]
+    ) -> List[BackendPoint]:
+        """将文档与嵌入向量组装为后端的点"""
+        points = []
+        for i, doc in enumerate(documents):
+            original_id = document_id(doc)
+            source_id = doc.get("source_id", original_id)
+            metadata = doc.get("metadata", {})
+            # 生效日期另存为整数，供范围过滤使用
+            effective_date = date_to_int(metadata.get("effective_date"))
+            points.append(
+                BackendPoint(
+                    id=self.point_id(original_id),  # 使用字符串格式的UUID
+                    vector=embeddings[i],
+                    payload={
+                        "content": doc["content"],
+                        "article_name": doc.get("article_name", ""),
+                        "section": doc.get("section", ""),
+                        "source_id": source_id,  # 保留原始ID在payload中
+                        "original_id": original_id,  # 也保存原始ID
+                        "doc_type": doc.get("doc_type", "statute"),
+                        "url": doc.get("url", ""),
+                        **metadata,
+                        **({DATE_FIELD: effective_date} if effective_date is not None else {}),
+                        "content_hash": self.document_hash(doc)
+                    }
                 )
-            
-            self.client.upsert(
-                collection_name=self.collection_name,
-                points=points,
-                wait=True
             )
-            print(f"✓ 成功添加 {len(points)} 个文档到向量库")
+        return points
+
+    def upsert_points(self, points: List[BackendPoint]):
+        """写入点到向量存储后端并更新关键词索引；失败时抛出异常"""
+        generation = self.backend.generation
+        self.backend.upsert(points)
+        if self.backend.generation != generation:
+            # 后端在写入过程中被替换（如降级为内存模式），关键词索引需与新存储保持一致
+            print("⚠ 向量存储后端已切换，之前写入的文档需要重新导入")
+            self.rebuild_keyword_index()
+            return
+        for point in points:
+            self.keyword_index.add(point.id, point.payload)
+
+    def _load_keyword_index(self):
+        """加载磁盘上的关键词索引，与向量库文档数不一致时从向量库重建"""
+        try:
+            loaded = self.keyword_index.load(self.keyword_index_path)
         except Exception as e:
-            error_str = str(e).lower()
-            if "timeout" in error_str or "connection" in error_str or "timed out" in error_str:
-                print(f"⚠ 远程Qdrant操作超时，切换到内存模式...")
-                # 切换到内存模式并重试
-                self.client = QdrantClient(":memory:")
-                self.use_memory = True
-                # 重新创建集合
-                try:
-                    dim = self.embedding_service.model.get_sentence_embedding_dimension()
-                    self.client.create_collection(
-                        collection_name=self.collection_name,
-                        vectors_config=VectorParams(
-                            size=dim,
-                            distance=Distance.COSINE
-                        )
-                    )
-                    print(f"✓ 在内存模式中创建集合")
-                except Exception as e2:
-                    if "already exists" not in str(e2).lower():
-                        print(f"⚠ 创建集合时出错（可能已存在）: {e2}")
-                # 重试插入
-                try:
-                    self.client.upsert(
-                        collection_name=self.collection_name,
-                        points=points,
-                        wait=True
-                    )
-                    print(f"✓ 成功添加 {len(points)} 个文档到向量库（内存模式）")
-                except Exception as e2:
-                    print(f"✗ 内存模式添加文档也失败: {e2}")
-                    import traceback
-                    traceback.print_exc()
-            else:
-                print(f"✗ 添加文档错误: {e}")
-                import traceback
-                traceback.print_exc()
-
-    def _simple_keyword_search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """简单的关键词搜索（fallback方法）"""
+            print(f"⚠ 关键词索引加载失败: {e}")
+            loaded = False
         try:
-            # 获取所有文档
-            scroll_result = self.client.scroll(
-                collection_name=self.collection_name,
-                limit=1000  # 获取所有文档
-            )
-            
-            # 简单的关键词匹配
-            query_words = set(query.lower().split())
-            scored_docs = []
-            
-            for point in scroll_result[0]:
-                payload = point.payload
-                content = payload.get("content", "").lower()
-                article_name = payload.get("article_name", "").lower()
-                section = payload.get("section", "").lower()
-                
-                # 计算匹配分数
-                score = 0
-                for word in query_words:
-                    if word in content:
-                        score += 2
-                    if word in article_name:
-                        score += 1
-                    if word in section:
-                        score += 1
-                
-                if score > 0:
-                    scored_docs.append({
-                        "source_id": payload.get("source_id", ""),
-                        "article_name": payload.get("article_name", ""),
-                        "section": payload.get("section", ""),
-                        "content": payload.get("content", ""),
-                        "doc_type": payload.get("doc_type", "statute"),
-                        "url": payload.get("url", ""),
-                        "score": score / 10.0,  # 归一化到0-1范围
-                        "metadata": {k: v for k, v in payload.items() 
-                                   if k not in ["content", "article_name", "section", "source_id", "doc_type", "url"]}
-                    })
-            
-            # 按分数排序
-            scored_docs.sort(key=lambda x: x["score"], reverse=True)
-            return scored_docs[:top_k]
+            count = self.backend.count()
         except Exception as e:
-            print(f"关键词搜索失败: {e}")
+            print(f"⚠ 无法获取集合信息，跳过关键词索引校验: {e}")
+            return
+        if loaded and len(self.keyword_index) == count:
+            print(f"✓ 关键词索引加载完成: {count} 个文档")
+            return
+        self.rebuild_keyword_index()
+
+    def rebuild_keyword_index(self, batch_size: int = 1000):
+        """分页遍历向量库，重建关键词索引"""
+        self.keyword_index.clear()
+        for point_id, payload in self.backend.scroll(batch_size=batch_size, with_payload=True):
+            self.keyword_index.add(point_id, payload or {})
+        self.save_keyword_index()
+        print(f"✓ 关键词索引重建完成: {len(self.keyword_index)} 个文档")
+
+    def persist(self):
+        """将缓冲在内存中的数据写回磁盘：后端快照、关键词索引与文档嵌入缓存
+
+        这些写入都与数据总量成正比，只在一次导入结束和关闭时调用，不随每个批次执行。
+        """
+        self.backend.flush()
+        self.save_keyword_index()
+        self.embedding_service.save_cache()
+
+    def save_keyword_index(self):
+        """关键词索引有变化时写回磁盘"""
+        if not self.keyword_index.dirty:
+            return
+        try:
+            self.keyword_index.save(self.keyword_index_path)
+        except Exception as e:
+            print(f"⚠ 关键词索引保存失败: {e}")
+
+    @staticmethod
+    def _format_result(payload: Dict[str, Any], score: float) -> Dict[str, Any]:
+        """将payload转换为检索结果"""
+        return {
+            "source_id": payload.get("source_id", ""),
+            "article_name": payload.get("article_name", ""),
+            "section": payload.get("section", ""),
+            "content": payload.get("content", ""),
+            "doc_type": payload.get("doc_type", "statute"),
+            "url": payload.get("url", ""),
+            "score": score,
+            "metadata": {k: v for k, v in payload.items() 
+                       if k not in ["content", "article_name", "section", "source_id", "doc_type", "url", DATE_FIELD]}
+        }
+
+    def _keyword_search(
+        self,
+        query: str,
+        top_k: int = 5,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """基于BM25倒排索引的关键词搜索（filters为规范化后的过滤条件）"""
+        try:
+            predicate = (lambda payload: matches_filter(payload, filters)) if filters else None
+            with stage("keyword_search"):
+                hits = self.keyword_index.search(query, top_k=top_k, predicate=predicate)
+            return [self._format_result(payload, score) for _, score, payload in hits]
+        except Exception as e:
+            logger.warning("⚠ 关键词搜索失败: %s", e)
             return []
 
     def search(
         self,
         query: str,
         top_k: int = 5,
-        filter_dict: Optional[Dict] = None
+        filter_dict: Optional[Dict] = None,
+        query_embedding: Optional[List[float]] = None,
+        mode: str = "dense"
+    ) -> List[Dict[str, Any]]:
+        """搜索相关文档
+
+        mode: dense（向量检索，失败时回退到关键词检索）、keyword（BM25关键词检索）、
+        hybrid（向量与关键词两路检索后融合排序）。可传入已计算好的查询向量以跳过编码。
+        filter_dict: 过滤条件，见 filters.normalize_filter，条件非法时抛出 ValueError。
+        检索在子片段上进行，同一父文档命中多个片段时展开为父文档，见 expand_parents。
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"不支持的检索模式: {mode}")
+        filters = normalize_filter(filter_dict)
+        results = self._search(query, self._fetch_k(top_k), filters, query_embedding, mode)
+        return self.expand_parents(results, top_k)
+
+    def _search(
+        self,
+        query: str,
+        top_k: int,
+        filters: Optional[Dict[str, Any]],
+        query_embedding: Optional[List[float]] = None,
+        mode: str = "dense"
     ) -> List[Dict[str, Any]]:
-        """搜索相关文档"""
         try:
-            print(f"搜索查询: {query}")
-            
-            # 检查集合是否存在
-            try:
-                collection_info = self.client.get_collection(self.collection_name)
-                count = collection_info.points_count
-                print(f"向量库中共有 {count} 个文档")
-                if count == 0:
-                    print("⚠ 警告: 向量库为空，请检查数据是否成功加载")
-                    return []
-            except Exception as e:
-                print(f"⚠ 无法获取集合信息: {e}")
-                return []
-            
+            logger.debug("搜索查询: %s (模式: %s, 过滤: %s)", query, mode, filters)
+            if mode == "keyword":
+                return self._keyword_search(query, top_k, filters)
+
+            if mode == "hybrid":
+                candidates = top_k * self.hybrid_candidate_multiplier
+                try:
+                    dense_results = self._dense_search(query, candidates, query_embedding, filters)
+                except Exception as e:
+                    FALLBACKS.labels(reason="hybrid_dense_error").inc()
+                    logger.warning("⚠ 向量搜索失败，仅使用关键词结果: %s", e)
+                    dense_results = []
+                keyword_results = self._keyword_search(query, candidates, filters)
+                with stage("fusion"):
+                    return self.fuse_results(dense_results, keyword_results, top_k)
+
             # 尝试向量搜索
             try:
-                query_embedding = self.embedding_service.embed_query(query)
-                print(f"✓ 查询向量生成完成 (维度: {len(query_embedding)})")
-                
-                search_result = self.client.search(
-                    collection_name=self.collection_name,
-                    query_vector=query_embedding,
-                    limit=top_k,
-                    query_filter=None  # 可以添加过滤条件
-                )
-                
-                print(f"向量搜索返回 {len(search_result)} 个结果")
-                results = []
-                for hit in search_result:
-                    payload = hit.payload
-                    results.append({
-                        "source_id": payload.get("source_id", ""),
-                        "article_name": payload.get("article_name", ""),
-                        "section": payload.get("section", ""),
-                        "content": payload.get("content", ""),
-                        "doc_type": payload.get("doc_type", "statute"),
-                        "url": payload.get("url", ""),
-                        "score": hit.score,
-                        "metadata": {k: v for k, v in payload.items() 
-                                   if k not in ["content", "article_name", "section", "source_id", "doc_type", "url"]}
-                    })
-                    print(f"  - {payload.get('article_name', '')} {payload.get('section', '')} (相似度: {hit.score:.3f})")
-                
-                return results
+                return self._dense_search(query, top_k, query_embedding, filters)
             except Exception as e:
-                print(f"⚠ 向量搜索失败: {e}")
-                print("尝试使用关键词搜索...")
                 # 使用关键词搜索作为fallback
-                results = self._simple_keyword_search(query, top_k)
-                print(f"关键词搜索返回 {len(results)} 个结果")
+                FALLBACKS.labels(reason="dense_error").inc()
+                logger.warning("⚠ 向量搜索失败，使用关键词搜索: %s", e)
+                with stage("keyword_fallback"):
+                    results = self._keyword_search(query, top_k, filters)
+                logger.debug("关键词搜索返回 %d 个结果", len(results))
                 return results
                 
         except Exception as e:
-            print(f"✗ 搜索错误: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("✗ 搜索错误: %s", e)
+            return []
+
+    def _dense_search(
+        self,
+        query: str,
+        top_k: int,
+        query_embedding: Optional[List[float]] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """向量检索；集合为空或不可用时返回空列表，向量检索本身失败时抛出异常
+
+        过滤条件下推到存储后端，在索引内过滤而不是检索后再丢弃。
+        """
+        # 检查集合是否存在
+        try:
+            with stage("collection_check"):
+                count = self.backend.count()
+        except Exception as e:
+            logger.warning("⚠ 无法获取集合信息: %s", e)
+            return []
+        if count == 0:
+            logger.warning("⚠ 警告: 向量库为空，请检查数据是否成功加载")
+            return []
+
+        if query_embedding is None:
+            with stage("query_embedding"):
+                query_embedding = self.embedding_service.embed_query(query)
+        
+        with stage("vector_search"):
+            search_result = self.backend.search(query_embedding, top_k, filters)
+        
+        results = [self._format_result(hit.payload, hit.score) for hit in search_result]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("向量搜索返回 %d 个结果 (向量库共 %d 个文档)", len(results), count)
+            for hit in search_result:
+                logger.debug("  - %s %s (相似度: %.3f)", hit.payload.get("article_name", ""), hit.payload.get("section", ""), hit.score)
+        return results
+
+    def search_many(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        filter_dict: Optional[Dict] = None,
+        mode: str = "dense",
+        timings: Optional[Dict[str, float]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """批量搜索，结果与输入顺序一致
+
+        所有查询只做一次集合计数、一次批量编码（命中查询缓存的跳过）和一次后端批量检索；
+        keyword 一路在进程内逐条执行。用于离线评测等大量查询的场景。
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"不支持的检索模式: {mode}")
+        filters = normalize_filter(filter_dict)
+        timings = timings if timings is not None else {}
+        started = time.perf_counter()
+        if not queries:
+            return []
+
+        dense_results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        keyword_results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        fetch_k = self._fetch_k(top_k)
+        candidates = fetch_k * self.hybrid_candidate_multiplier if mode == "hybrid" else fetch_k
+
+        if mode in ("dense", "hybrid"):
+            try:
+                dense_results = self._dense_search_many(queries, candidates, filters, timings)
+            except Exception as e:
+                FALLBACKS.labels(reason="dense_error" if mode == "dense" else "hybrid_dense_error").inc()
+                logger.warning("⚠ 批量向量搜索失败，使用关键词搜索: %s", e)
+                mode = "keyword" if mode == "dense" else mode
+
+        if mode in ("keyword", "hybrid"):
+            keyword_started = time.perf_counter()
+            keyword_results = [self._keyword_search(query, candidates, filters) for query in queries]
+            timings["keyword_ms"] = (time.perf_counter() - keyword_started) * 1000
+
+        if mode == "hybrid":
+            fusion_started = time.perf_counter()
+            with stage("fusion"):
+                results = [self.fuse_results(d, k, fetch_k) for d, k in zip(dense_results, keyword_results)]
+            timings["fusion_ms"] = (time.perf_counter() - fusion_started) * 1000
+        elif mode == "keyword":
+            results = keyword_results
+        else:
+            results = dense_results
+        results = [self.expand_parents(r, top_k) for r in results]
+
+        timings["total_ms"] = (time.perf_counter() - started) * 1000
+        logger.debug("批量搜索: %d 个查询 (模式: %s), 耗时 %.1fms", len(queries), mode, timings["total_ms"])
+        return results
+
+    def _dense_search_many(
+        self,
+        queries: List[str],
+        top_k: int,
+        filters: Optional[Dict[str, Any]],
+        timings: Dict[str, float]
+    ) -> List[List[Dict[str, Any]]]:
+        """批量向量检索；集合为空时返回空结果，检索失败时抛出异常"""
+        try:
+            with stage("collection_check"):
+                count = self.backend.count()
+        except Exception as e:
+            logger.warning("⚠ 无法获取集合信息: %s", e)
+            return [[] for _ in queries]
+        if count == 0:
+            logger.warning("⚠ 警告: 向量库为空，请检查数据是否成功加载")
+            return [[] for _ in queries]
+
+        embed_started = time.perf_counter()
+        with stage("query_embedding"):
+            embeddings = self.embedding_service.embed_queries(queries)
+        timings["embed_ms"] = (time.perf_counter() - embed_started) * 1000
+
+        search_started = time.perf_counter()
+        with stage("vector_search"):
+            batches = self.backend.search_batch(embeddings, top_k, filters)
+        timings["dense_ms"] = (time.perf_counter() - search_started) * 1000
+        return [[self._format_result(hit.payload, hit.score) for hit in hits] for hits in batches]
+
+    def _fetch_k(self, top_k: int) -> int:
+        """存在切分文档时多取候选片段，展开合并后仍能凑满 top_k 个结果"""
+        return top_k * self.parent_candidate_multiplier if len(self.parent_store) else top_k
+
+    def expand_parents(self, results: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        """将命中同一父文档多个片段的结果展开为父文档
+
+        同一父文档命中片段数达到 PARENT_EXPAND_MIN_HITS 且父文档不超过 PARENT_EXPAND_MAX_CHARS 时，
+        这些片段合并为一条父文档结果，位置和分数取排名最高的片段，expanded_from 记录被合并的片段；
+        否则保留片段本身，Prompt中只包含命中的部分。
+        """
+        hits: Dict[str, List[Dict[str, Any]]] = {}
+        for result in results:
+            parent_id = result["metadata"].get("parent_id")
+            if parent_id:
+                hits.setdefault(parent_id, []).append(result)
+        expandable = [parent_id for parent_id, chunks in hits.items() if len(chunks) >= self.parent_expand_min_hits]
+        if not expandable:
+            return results[:top_k]
+
+        with stage("parent_expansion"):
+            parents = {
+                parent_id: parent for parent_id, parent in self.parent_store.get_many(expandable).items()
+                if len(parent["payload"].get("content", "")) <= self.parent_expand_max_chars
+            }
+            expanded: List[Dict[str, Any]] = []
+            emitted: Set[str] = set()
+            for result in results:
+                parent_id = result["metadata"].get("parent_id")
+                parent = parents.get(parent_id)
+                if parent is None:
+                    expanded.append(result)
+                    continue
+                if parent_id in emitted:
+                    continue
+                emitted.add(parent_id)
+                merged = self._format_result(parent["payload"], result["score"])
+                merged["metadata"]["parent_id"] = parent_id
+                if "scores" in result:
+                    merged["scores"] = result["scores"]
+                merged["expanded_from"] = [chunk["source_id"] for chunk in hits[parent_id]]
+                expanded.append(merged)
+        return expanded[:top_k]
+
+    def fuse_results(
+        self,
+        dense_results: List[Dict[str, Any]],
+        keyword_results: List[Dict[str, Any]],
+        top_k: int
+    ) -> List[Dict[str, Any]]:
+        """融合向量与关键词检索结果
+
+        rrf: 倒数排名融合，score = Σ 1/(k + rank)；
+        weighted: 两路分数各自min-max归一化后按 HYBRID_DENSE_WEIGHT 加权求和。
+        各路原始分数保存在结果的 scores 字段中。
+        """
+        fused: Dict[tuple, Dict[str, Any]] = {}
+        legs = (
+            ("dense", dense_results, self.hybrid_dense_weight),
+            ("keyword", keyword_results, 1.0 - self.hybrid_dense_weight)
+        )
+        for leg, results, weight in legs:
+            if not results:
+                continue
+            lo = min(r["score"] for r in results)
+            hi = max(r["score"] for r in results)
+            for rank, result in enumerate(results):
+                if self.hybrid_fusion == "weighted":
+                    normalized = (result["score"] - lo) / (hi - lo) if hi > lo else 1.0
+                    contribution = weight * normalized
+                else:
+                    contribution = 1.0 / (self.hybrid_rrf_k + rank + 1)
+                key = (result["source_id"], result["content"])
+                entry = fused.get(key)
+                if entry is None:
+                    entry = fused[key] = {**result, "score": 0.0, "scores": {}}
+                entry["score"] += contribution
+                entry["scores"][leg] = result["score"]
+
+        ranked = sorted(fused.values(), key=lambda r: r["score"], reverse=True)
+        return ranked[:top_k]
+
+    async def asearch(
+        self,
+        query: str,
+        top_k: int = 5,
+        filter_dict: Optional[Dict] = None,
+        mode: str = "dense",
+        timings: Optional[Dict[str, float]] = None
+    ) -> List[Dict[str, Any]]:
+        """异步搜索：查询编码经微批处理器合并，检索在线程池中执行，避免阻塞事件循环
+
+        hybrid 模式下向量与关键词两路并发执行，总耗时取决于较慢的一路。
+        传入 timings 字典时写入各阶段耗时（毫秒）。
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"不支持的检索模式: {mode}")
+        filters = normalize_filter(filter_dict)
+        timings = timings if timings is not None else {}
+        started = time.perf_counter()
+        fetch_k = self._fetch_k(top_k)
+
+        if mode == "keyword":
+            results = await self._run_timed(timings, "keyword_ms", self._keyword_search, query, fetch_k, filters)
+        elif mode == "hybrid":
+            candidates = fetch_k * self.hybrid_candidate_multiplier
+            dense_results, keyword_results = await asyncio.gather(
+                self._adense_search(query, candidates, timings, filters),
+                self._run_timed(timings, "keyword_ms", self._keyword_search, query, candidates, filters)
+            )
+            fusion_started = time.perf_counter()
+            with stage("fusion"):
+                results = self.fuse_results(dense_results, keyword_results, fetch_k)
+            timings["fusion_ms"] = (time.perf_counter() - fusion_started) * 1000
+        else:
+            query_embedding = await self._aembed(query, timings)
+            results = await self._run_timed(
+                timings,
+                "search_ms",
+                functools.partial(self._search, query, fetch_k, filters, query_embedding=query_embedding)
+            )
+
+        if any(result["metadata"].get("parent_id") for result in results):
+            # 读取父文档需要访问SQLite，放到检索线程池中执行
+            results = await self._run_timed(timings, "expand_ms", self.expand_parents, results, top_k)
+        else:
+            results = results[:top_k]
+
+        timings["total_ms"] = (time.perf_counter() - started) * 1000
+        return results
+
+    async def asearch_many(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        filter_dict: Optional[Dict] = None,
+        mode: str = "dense",
+        timings: Optional[Dict[str, float]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """在检索线程池中执行批量搜索"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor,
+            bind_context(self.search_many, queries, top_k, filter_dict, mode, timings)
+        )
+
+    async def _aembed(self, query: str, timings: Dict[str, float]) -> Optional[List[float]]:
+        """经微批处理器编码查询；失败时返回None，由检索线程内部重新编码或回退"""
+        if self.batcher is None:
+            return None
+        started = time.perf_counter()
+        try:
+            with stage("query_embedding"):
+                return await self.batcher.embed(query)
+        except Exception as e:
+            FALLBACKS.labels(reason="batch_embedding_error").inc()
+            logger.warning("⚠ 批量编码失败: %s", e)
+            return None
+        finally:
+            timings["embed_ms"] = (time.perf_counter() - started) * 1000
+
+    async def _adense_search(
+        self,
+        query: str,
+        top_k: int,
+        timings: Dict[str, float],
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """hybrid模式的向量检索一路，失败时返回空列表"""
+        started = time.perf_counter()
+        try:
+            query_embedding = await self._aembed(query, timings)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor,
+                bind_context(self._dense_search, query, top_k, query_embedding, filters)
+            )
+        except Exception as e:
+            FALLBACKS.labels(reason="hybrid_dense_error").inc()
+            logger.warning("⚠ 向量搜索失败，仅使用关键词结果: %s", e)
             return []
+        finally:
+            timings["dense_ms"] = (time.perf_counter() - started) * 1000
+
+    async def _run_timed(self, timings: Dict[str, float], name: str, func, *args):
+        """在检索线程池中执行函数并记录耗时"""
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, bind_context(func, *args))
+        finally:
+            timings[name] = (time.perf_counter() - started) * 1000
 
+    def close(self):
+        """保存关键词索引、嵌入缓存与后端数据，停止批处理任务并释放检索线程池"""
+        self.save_keyword_index()
+        self.embedding_service.save_cache()
+        self.backend.close()
+        self.parent_store.close()
+        if self.batcher is not None:
+            self.batcher.close()
+        self._executor.shutdown(wait=False)
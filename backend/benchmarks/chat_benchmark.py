@@ -0,0 +1,232 @@
+"""
+端到端咨询基准 - 完整 /api/chat 与 /api/chat/stream 请求在不同并发下的延迟
+
+用法（在 backend 目录下运行）:
+    python -m benchmarks.chat_benchmark
+    python -m benchmarks.chat_benchmark --concurrency 1,8,32 --requests 200 --corpus-size 10000 --llm-first-token-ms 300
+
+在同一进程内启动两个本地服务:
+    stub LLM  模拟 /chat/completions 接口（非流式与SSE流式），首token延迟与token间隔可配置
+    应用服务  app.main.app，SJTU_API_URL 指向 stub LLM，嵌入模型替换为离线哈希模型
+因此测得的是检索、Prompt构造、HTTP往返与流式转发等服务自身的开销，不受真实LLM波动影响。
+默认关闭回答缓存（--answer-cache 开启），每个请求使用不同的问题。
+"""
+import json
+import time
+import asyncio
+import argparse
+import threading
+from typing import List, Dict, Any
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from benchmarks.common import (
+    make_embedding_service, synthetic_corpus, synthetic_queries, percentiles, quiet, isolated_env, free_port,
+    write_results
+)
+
+STUB_ANSWER = "根据《中华人民共和国刑法》第二十条的规定，正当防卫造成损害的，不负刑事责任。"
+
+
+def create_stub_llm(first_token_ms: float, token_ms: float, num_tokens: int) -> FastAPI:
+    """模拟OpenAI兼容的 /chat/completions 接口"""
+    stub = FastAPI()
+    chunk = max(1, len(STUB_ANSWER) // num_tokens)
+    pieces = [STUB_ANSWER[i:i + chunk] for i in range(0, len(STUB_ANSWER), chunk)]
+
+    @stub.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if body.get("stream"):
+            async def generate():
+                await asyncio.sleep(first_token_ms / 1000)
+                for piece in pieces:
+                    yield "data: " + json.dumps({"choices": [{"delta": {"content": piece}}]}, ensure_ascii=False) + "\n\n"
+                    await asyncio.sleep(token_ms / 1000)
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(generate(), media_type="text/event-stream")
+        await asyncio.sleep((first_token_ms + token_ms * len(pieces)) / 1000)
+        return {"choices": [{"message": {"content": STUB_ANSWER}}]}
+
+    return stub
+
+
+class ServerThread:
+    """在后台线程中运行uvicorn服务"""
+
+    def __init__(self, app, port: int):
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self, timeout: float = 30):
+        self.thread.start()
+        deadline = time.time() + timeout
+        while not self.server.started:
+            if time.time() > deadline or not self.thread.is_alive():
+                raise RuntimeError("服务启动失败")
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+async def _chat(client: httpx.AsyncClient, question: str) -> Dict[str, float]:
+    started = time.perf_counter()
+    response = await client.post("/api/chat", json={"message": question})
+    response.raise_for_status()
+    return {"total_ms": (time.perf_counter() - started) * 1000}
+
+
+async def _chat_stream(client: httpx.AsyncClient, question: str) -> Dict[str, float]:
+    """流式请求：记录首个token事件到达时间与总耗时"""
+    started = time.perf_counter()
+    first_token_ms = None
+    async with client.stream("POST", "/api/chat/stream", json={"message": question}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if first_token_ms is None and line == "event: token":
+                first_token_ms = (time.perf_counter() - started) * 1000
+    return {"total_ms": (time.perf_counter() - started) * 1000, "first_token_ms": first_token_ms}
+
+
+async def _load(base_url: str, endpoint: str, questions: List[str], concurrency: int) -> Dict[str, Any]:
+    request = _chat_stream if endpoint == "stream" else _chat
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        async def one(question: str):
+            async with semaphore:
+                try:
+                    return await request(client, question)
+                except Exception:
+                    return None
+
+        started = time.perf_counter()
+        samples = await asyncio.gather(*(one(q) for q in questions))
+        elapsed = time.perf_counter() - started
+
+    ok = [s for s in samples if s is not None]
+    result = {
+        "concurrency": concurrency,
+        "requests": len(questions),
+        "errors": len(questions) - len(ok),
+        "requests_per_sec": len(ok) / elapsed,
+        "latency": percentiles([s["total_ms"] for s in ok])
+    }
+    if endpoint == "stream":
+        result["first_token"] = percentiles([s["first_token_ms"] for s in ok if s["first_token_ms"] is not None])
+    return result
+
+
+def _wait_ready(base_url: str, timeout: float = 120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            response = httpx.get(f"{base_url}/health/ready", timeout=5)
+            if response.status_code == 200:
+                return
+            if response.json().get("status") == "failed":
+                raise RuntimeError(f"应用启动失败: {response.json()}")
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("等待应用就绪超时")
+
+
+def run(concurrency: List[int] = (1, 4, 16), requests: int = 100, endpoints: List[str] = ("chat", "stream"),
+        corpus_size: int = 1000, backend: str = "local", llm_first_token_ms: float = 50.0, llm_token_ms: float = 5.0,
+        llm_tokens: int = 20, answer_cache: bool = False, model: str = "hash", dim: int = 384) -> Dict[str, Any]:
+    import app.main as app_main
+
+    llm_port, app_port = free_port(), free_port()
+    base_url = f"http://127.0.0.1:{app_port}"
+    env = {
+        "VECTOR_BACKEND": backend,
+        "SJTU_API_URL": f"http://127.0.0.1:{llm_port}",
+        "ANSWER_CACHE_ENABLED": "true" if answer_cache else "false"
+    }
+    results: Dict[str, Any] = {"endpoints": {}}
+    with isolated_env(**env):
+        # 替换应用启动时加载的嵌入模型
+        original_service = app_main.EmbeddingService
+        app_main.EmbeddingService = lambda: make_embedding_service(model, dim)
+        llm_server = ServerThread(create_stub_llm(llm_first_token_ms, llm_token_ms, llm_tokens), llm_port)
+        app_server = ServerThread(app_main.app, app_port)
+        try:
+            with quiet():
+                llm_server.start()
+                app_server.start()
+                _wait_ready(base_url)
+                if corpus_size:
+                    corpus = synthetic_corpus(corpus_size)
+                    for start in range(0, corpus_size, 1000):
+                        app_main.vector_store.add_documents(corpus[start:start + 1000])
+            results["documents"] = app_main.vector_store.backend.count()
+            results["backend_info"] = app_main.vector_store.backend.info()
+            print(f"应用就绪: {results['documents']} 个文档, 后端 {results['backend_info'].get('mode', backend)}")
+
+            seed = 0
+            for endpoint in endpoints:
+                results["endpoints"][endpoint] = []
+                for level in concurrency:
+                    seed += 1
+                    questions = synthetic_queries(requests, seed=seed)
+                    with quiet():
+                        asyncio.run(_load(base_url, endpoint, questions[:min(level, len(questions))], level))  # 预热
+                        stats = asyncio.run(_load(base_url, endpoint, questions, level))
+                    results["endpoints"][endpoint].append(stats)
+                    line = (
+                        f"{endpoint:>6} 并发 {level:>3}: {stats['requests_per_sec']:.1f} 请求/秒, "
+                        f"p50 {stats['latency'].get('p50_ms', 0):.1f}ms, p95 {stats['latency'].get('p95_ms', 0):.1f}ms"
+                    )
+                    if endpoint == "stream" and stats.get("first_token"):
+                        line += f", 首token p50 {stats['first_token']['p50_ms']:.1f}ms"
+                    if stats["errors"]:
+                        line += f", 失败 {stats['errors']}"
+                    print(line)
+        finally:
+            with quiet():
+                app_server.stop()
+                llm_server.stop()
+            app_main.EmbeddingService = original_service
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端咨询接口延迟基准")
+    parser.add_argument("--concurrency", default="1,4,16", help="并发数，逗号分隔")
+    parser.add_argument("--requests", type=int, default=100, help="每个并发级别的请求数（默认100）")
+    parser.add_argument("--endpoints", default="chat,stream", help="chat（/api/chat）、stream（/api/chat/stream）")
+    parser.add_argument("--corpus-size", type=int, default=1000, help="示例数据之外追加的合成文档数（默认1000）")
+    parser.add_argument("--backend", default="local", help="向量后端（默认local）")
+    parser.add_argument("--llm-first-token-ms", type=float, default=50.0, help="stub LLM首token延迟，毫秒")
+    parser.add_argument("--llm-token-ms", type=float, default=5.0, help="stub LLM token间隔，毫秒")
+    parser.add_argument("--llm-tokens", type=int, default=20, help="stub LLM回答分段数")
+    parser.add_argument("--answer-cache", action="store_true", help="开启回答缓存")
+    parser.add_argument("--model", default="hash", help="hash（离线哈希模型）或 default（服务默认模型）")
+    parser.add_argument("--dim", type=int, default=384, help="哈希模型维度（默认384）")
+    parser.add_argument("--json", default=None, help="结果JSON路径，默认写入 benchmarks/results/")
+    args = parser.parse_args()
+
+    params = {
+        "concurrency": [int(c) for c in args.concurrency.split(",")],
+        "requests": args.requests,
+        "endpoints": args.endpoints.split(","),
+        "corpus_size": args.corpus_size,
+        "backend": args.backend,
+        "llm_first_token_ms": args.llm_first_token_ms,
+        "llm_token_ms": args.llm_token_ms,
+        "llm_tokens": args.llm_tokens,
+        "answer_cache": args.answer_cache,
+        "model": args.model,
+        "dim": args.dim
+    }
+    results = run(**params)
+    write_results(args.json, "chat", params, results)
+
+
+if __name__ == "__main__":
+    main()
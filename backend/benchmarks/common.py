@@ -0,0 +1,197 @@
+"""
+基准测试公共工具：离线哈希嵌入模型、合成法律语料、隔离的缓存目录与JSON结果输出
+"""
+import io
+import os
+import sys
+import json
+import zlib
+import time
+import socket
+import random
+import platform
+import tempfile
+import contextlib
+import subprocess
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Iterator
+import numpy as np
+from app.services.keyword_index import ngram_tokenize
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+class HashEmbeddingModel:
+    """确定性的哈希嵌入模型（特征哈希 + 符号位），无需下载模型即可离线运行基准
+
+    向量只依赖文本本身，跨进程、跨机器结果一致；含相同词的文本相似度更高，
+    检索结果具有可比性，但不代表真实模型的语义质量。cost_ms_per_text 可模拟模型前向耗时。
+    """
+
+    def __init__(self, dim: int = 384, cost_ms_per_text: float = 0.0):
+        self.dim = dim
+        self.cost_ms_per_text = cost_ms_per_text
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def _encode_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in ngram_tokenize(text):
+            h = zlib.crc32(token.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if (h >> 16) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def encode(self, texts, batch_size: int = 32, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        if isinstance(texts, str):
+            texts = [texts]
+        if self.cost_ms_per_text:
+            time.sleep(self.cost_ms_per_text * len(texts) / 1000)
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.stack([self._encode_one(text) for text in texts])
+
+
+def make_embedding_service(model: str = "hash", dim: int = 384, cost_ms_per_text: float = 0.0):
+    """创建嵌入服务：hash 为离线哈希模型，default 为服务默认加载的模型"""
+    from app.services.embedding_service import EmbeddingService
+    if model == "hash":
+        return EmbeddingService(model=HashEmbeddingModel(dim, cost_ms_per_text), model_name=f"hash-{dim}")
+    return EmbeddingService()
+
+
+# 合成语料使用的法律术语与法律名称
+_TERMS = [
+    "合同", "违约", "赔偿", "损失", "故意", "伤害", "杀人", "盗窃", "诈骗", "抢劫", "正当防卫", "紧急避险",
+    "民事", "刑事", "行政", "责任", "义务", "权利", "财产", "继承", "婚姻", "离婚", "抚养", "劳动", "工资",
+    "解除", "无效", "撤销", "担保", "抵押", "质押", "债权", "债务", "侵权", "过错", "赔礼道歉", "罚金",
+    "有期徒刑", "拘役", "管制", "缓刑", "自首", "立功", "累犯", "共同犯罪", "未成年人", "证据", "诉讼时效",
+]
+_CODES = ["中华人民共和国刑法", "中华人民共和国民法典", "中华人民共和国劳动合同法", "中华人民共和国行政诉讼法"]
+_COURTS = ["某市中级人民法院", "某市人民法院", "某省高级人民法院"]
+_CASE_TYPES = ["刑事", "民事", "行政"]
+
+
+def synthetic_corpus(num_docs: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """生成合成法律文档（法条与案例混合），字段与 data_loader 中的示例文档一致"""
+    rng = random.Random(seed)
+    documents = []
+    for i in range(num_docs):
+        terms = rng.sample(_TERMS, 8)
+        content = "，".join(
+            f"{terms[j]}的{terms[j + 1]}依照本法第{rng.randint(1, 1260)}条处理" for j in range(0, 8, 2)
+        ) + "。"
+        if i % 4 == 3:
+            documents.append({
+                "id": f"bench-case-{i}",
+                "content": content,
+                "article_name": "典型案例",
+                "section": f"案例{i}",
+                "doc_type": "case",
+                "metadata": {"case_type": rng.choice(_CASE_TYPES), "court": rng.choice(_COURTS)}
+            })
+        else:
+            documents.append({
+                "id": f"bench-statute-{i}",
+                "content": content,
+                "article_name": rng.choice(_CODES),
+                "section": f"第{i}条",
+                "doc_type": "statute",
+                "metadata": {"effective_date": f"20{rng.randint(10, 24)}-0{rng.randint(1, 9)}-01"}
+            })
+    return documents
+
+
+def synthetic_queries(num_queries: int, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    return [f"{a}的{b}如何认定{c}" for a, b, c in (rng.sample(_TERMS, 3) for _ in range(num_queries))]
+
+
+def percentiles(latencies_ms: List[float]) -> Dict[str, float]:
+    if not latencies_ms:
+        return {}
+    values = np.asarray(latencies_ms)
+    return {
+        "count": len(values),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max())
+    }
+
+
+@contextlib.contextmanager
+def quiet():
+    """屏蔽热路径中的逐条打印，避免输出本身影响计时"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+@contextlib.contextmanager
+def isolated_env(**overrides: str) -> Iterator[str]:
+    """将所有缓存与索引目录指向临时目录，结束后恢复环境变量并删除临时目录"""
+    with tempfile.TemporaryDirectory(prefix="legal_bench_") as tmp_dir:
+        env = {
+            "KEYWORD_INDEX_PATH": os.path.join(tmp_dir, "keyword_index.pkl"),
+            "LOCAL_INDEX_DIR": os.path.join(tmp_dir, "local_index"),
+            "MEMORY_SNAPSHOT_DIR": os.path.join(tmp_dir, "memory_snapshot"),
+            "MEMORY_SNAPSHOT_INTERVAL": "0",
+            "EMBEDDING_CACHE_DIR": os.path.join(tmp_dir, "embeddings"),
+            "INGEST_STATE_PATH": os.path.join(tmp_dir, "ingest_state.json"),
+            "PARENT_STORE_PATH": os.path.join(tmp_dir, "parents.sqlite"),
+            "QDRANT_COLLECTION_NAME": f"bench_{os.getpid()}_{int(time.time() * 1000)}",
+            **overrides
+        }
+        previous = {key: os.environ.get(key) for key in env}
+        os.environ.update(env)
+        try:
+            yield tmp_dir
+        finally:
+            for key, value in previous.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def environment_info() -> Dict[str, Any]:
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__
+    }
+
+
+def write_results(path: Optional[str], benchmark: str, params: Dict[str, Any], results: Any) -> Dict[str, Any]:
+    """输出JSON结果（包含提交号与运行环境，便于跨提交对比）；path为None时写入 results/ 目录"""
+    report = {"benchmark": benchmark, "environment": environment_info(), "params": params, "results": results}
+    if path is None:
+        commit = report["environment"]["commit"] or "nocommit"
+        path = os.path.join(RESULTS_DIR, f"{benchmark}-{datetime.now():%Y%m%d-%H%M%S}-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存: {path}")
+    return report
@@ -0,0 +1,100 @@
+"""
+对比两次基准结果，找出超过阈值的性能回退
+
+用法（在 backend 目录下运行）:
+    python -m benchmarks.compare results/baseline.json results/candidate.json
+    python -m benchmarks.compare base.json new.json --threshold 0.2 --all
+
+按字段名判断指标方向：*_ms / seconds 越低越好，*per_sec / recall 越高越好，其余字段不参与比较。
+max_ms 受偶发抖动影响大，不参与比较。存在回退时退出码为1，可直接用于CI。
+"""
+import sys
+import json
+import argparse
+from typing import Dict, Any, Optional
+
+# 列表元素中用于组成稳定标识的字段
+IDENTITY_FIELDS = ("backend", "size", "batch_size", "concurrency", "quantization", "oversampling", "rescore")
+IGNORED_METRICS = ("max_ms",)
+
+
+def direction(key: str) -> Optional[int]:
+    """1 表示越高越好，-1 表示越低越好，None 表示不比较"""
+    if key in IGNORED_METRICS:
+        return None
+    if key.endswith("per_sec") or key == "recall":
+        return 1
+    if key.endswith("_ms") or key == "seconds" or key.endswith("_seconds"):
+        return -1
+    return None
+
+
+def _identity(item: Dict[str, Any], index: int) -> str:
+    parts = []
+    for field in IDENTITY_FIELDS:
+        value = item.get(field)
+        if value is not None:
+            parts.append(f"{field}={value}")
+    return ",".join(parts) or str(index)
+
+
+def flatten(value: Any, prefix: str = "") -> Dict[str, float]:
+    """将结果展开为 路径 -> 数值 的映射，列表元素以标识字段命名"""
+    metrics: Dict[str, float] = {}
+    if isinstance(value, dict):
+        for key, child in value.items():
+            path = f"{prefix}.{key}" if prefix else key
+            if isinstance(child, (dict, list)):
+                metrics.update(flatten(child, path))
+            elif isinstance(child, (int, float)) and not isinstance(child, bool) and direction(key) is not None:
+                metrics[path] = float(child)
+    elif isinstance(value, list):
+        for index, child in enumerate(value):
+            label = _identity(child, index) if isinstance(child, dict) else str(index)
+            metrics.update(flatten(child, f"{prefix}[{label}]"))
+    return metrics
+
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], threshold: float):
+    base_metrics, new_metrics = flatten(base["results"]), flatten(new["results"])
+    rows = []
+    for path in sorted(base_metrics.keys() & new_metrics.keys()):
+        old, current = base_metrics[path], new_metrics[path]
+        if old == 0:
+            continue
+        change = (current - old) / old
+        sign = direction(path.rsplit(".", 1)[-1])
+        rows.append((path, old, current, change, change * sign < -threshold, change * sign > threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比两次基准结果")
+    parser.add_argument("base", help="基准结果JSON")
+    parser.add_argument("new", help="待比较的结果JSON")
+    parser.add_argument("--threshold", type=float, default=0.1, help="判定为回退/提升的相对变化（默认0.1）")
+    parser.add_argument("--all", action="store_true", help="列出所有指标，而不仅是超过阈值的")
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    if base.get("benchmark") != new.get("benchmark"):
+        print(f"⚠ 基准类型不同: {base.get('benchmark')} vs {new.get('benchmark')}")
+    if base.get("params") != new.get("params"):
+        print("⚠ 两次运行的参数不同，结果可能不可比")
+    print(f"基准: {base['environment'].get('commit')}  对比: {new['environment'].get('commit')}  阈值: {args.threshold:.0%}\n")
+
+    rows = compare(base, new, args.threshold)
+    regressions = [row for row in rows if row[4]]
+    for path, old, current, change, regressed, improved in rows:
+        if args.all or regressed or improved:
+            mark = "✗ 回退" if regressed else ("✓ 提升" if improved else "  持平")
+            print(f"{mark} {path}: {old:.3f} → {current:.3f} ({change:+.1%})")
+    print(f"\n共比较 {len(rows)} 项指标，回退 {len(regressions)} 项")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
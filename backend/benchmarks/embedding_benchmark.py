@@ -0,0 +1,71 @@
+"""
+嵌入吞吐基准 - 不同批大小下的文档编码吞吐与单条查询编码延迟
+
+用法（在 backend 目录下运行）:
+    python -m benchmarks.embedding_benchmark
+    python -m benchmarks.embedding_benchmark --model default --batch-sizes 1,8,32,128 --num-texts 1024
+
+--model hash 使用离线哈希模型（默认，无需下载，适合观察框架开销的变化），
+--model default 使用 EmbeddingService 默认加载的模型（受 EMBEDDING_BACKEND 等环境变量影响）。
+"""
+import time
+import argparse
+from typing import List, Dict, Any
+from benchmarks.common import make_embedding_service, synthetic_corpus, synthetic_queries, percentiles, write_results
+
+
+def run(model: str = "hash", batch_sizes: List[int] = (1, 8, 32, 128), num_texts: int = 1024,
+        num_queries: int = 200, dim: int = 384) -> Dict[str, Any]:
+    service = make_embedding_service(model, dim)
+    texts = [doc["content"] for doc in synthetic_corpus(num_texts)]
+    service.model.encode(texts[:8], convert_to_numpy=True)  # 预热
+
+    throughput = []
+    for batch_size in batch_sizes:
+        started = time.perf_counter()
+        for start in range(0, len(texts), batch_size):
+            service.model.encode(texts[start:start + batch_size], batch_size=batch_size, convert_to_numpy=True)
+        elapsed = time.perf_counter() - started
+        throughput.append({"batch_size": batch_size, "texts_per_sec": len(texts) / elapsed, "seconds": elapsed})
+        print(f"批大小 {batch_size:>4}: {len(texts) / elapsed:>10.1f} 条/秒")
+
+    # 单条查询编码（未命中查询缓存）与命中缓存两种情况
+    queries = synthetic_queries(num_queries)
+    cold, warm = [], []
+    for query in queries:
+        started = time.perf_counter()
+        service.embed_query(query)
+        cold.append((time.perf_counter() - started) * 1000)
+    for query in queries:
+        started = time.perf_counter()
+        service.embed_query(query)
+        warm.append((time.perf_counter() - started) * 1000)
+    query_latency = {"uncached": percentiles(cold), "cached": percentiles(warm)}
+    print(f"单条查询编码: p50 {query_latency['uncached']['p50_ms']:.2f}ms, 命中缓存 p50 {query_latency['cached']['p50_ms']:.3f}ms")
+
+    return {"model_name": service.model_name, "throughput": throughput, "query_latency": query_latency}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="嵌入吞吐基准")
+    parser.add_argument("--model", default="hash", help="hash（离线哈希模型）或 default（服务默认模型）")
+    parser.add_argument("--batch-sizes", default="1,8,32,128", help="批大小，逗号分隔")
+    parser.add_argument("--num-texts", type=int, default=1024, help="编码的文档数（默认1024）")
+    parser.add_argument("--num-queries", type=int, default=200, help="单条查询编码次数（默认200）")
+    parser.add_argument("--dim", type=int, default=384, help="哈希模型维度（默认384）")
+    parser.add_argument("--json", default=None, help="结果JSON路径，默认写入 benchmarks/results/")
+    args = parser.parse_args()
+
+    params = {
+        "model": args.model,
+        "batch_sizes": [int(b) for b in args.batch_sizes.split(",")],
+        "num_texts": args.num_texts,
+        "num_queries": args.num_queries,
+        "dim": args.dim
+    }
+    results = run(**params)
+    write_results(args.json, "embedding", params, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+写入吞吐基准 - VectorStore.add_documents 的文档写入速度（docs/sec）
+
+用法（在 backend 目录下运行）:
+    python -m benchmarks.ingestion_benchmark
+    python -m benchmarks.ingestion_benchmark --backends local --sizes 10000 --batch-size 500 --model-cost-ms 2
+
+每个后端和规模测量三种场景:
+    cold       空索引、空嵌入缓存，全部文档需要编码
+    unchanged  对同一索引重复写入，内容哈希未变化的文档被跳过
+    warm_cache 新建空索引但复用嵌入缓存，只有写入向量库与关键词索引的开销
+--model-cost-ms 为哈希模型每条文本附加的模拟编码耗时，用于近似真实模型下的比例。
+"""
+import os
+import time
+import argparse
+from typing import List, Dict, Any
+from benchmarks.common import make_embedding_service, synthetic_corpus, quiet, isolated_env, write_results
+
+
+def ingest(store, corpus: List[Dict[str, Any]], batch_size: int) -> Dict[str, float]:
+    started = time.perf_counter()
+    with quiet():
+        for start in range(0, len(corpus), batch_size):
+            store.add_documents(corpus[start:start + batch_size])
+        store.persist()
+    seconds = time.perf_counter() - started
+    return {"seconds": seconds, "docs_per_sec": len(corpus) / seconds}
+
+
+def bench_backend(backend_name: str, size: int, batch_size: int, model: str, dim: int,
+                  model_cost_ms: float) -> Dict[str, Any]:
+    from app.services.vector_store import VectorStore
+    corpus = synthetic_corpus(size)
+    result = {"backend": backend_name, "size": size}
+    with isolated_env(VECTOR_BACKEND=backend_name) as tmp_dir:
+        with quiet():
+            store = VectorStore(embedding_service=make_embedding_service(model, dim, model_cost_ms))
+        result["mode"] = store.backend.info().get("mode", backend_name)
+        result["cold"] = ingest(store, corpus, batch_size)
+        result["unchanged"] = ingest(store, corpus, batch_size)
+        with quiet():
+            store.close()
+
+        # 新建空索引，嵌入缓存目录沿用上一轮
+        with isolated_env(VECTOR_BACKEND=backend_name, EMBEDDING_CACHE_DIR=os.path.join(tmp_dir, "embeddings")):
+            with quiet():
+                store = VectorStore(embedding_service=make_embedding_service(model, dim, model_cost_ms))
+            result["warm_cache"] = ingest(store, corpus, batch_size)
+            with quiet():
+                store.close()
+
+    print(
+        f"{backend_name:>6} ({result['mode']}) {size:>7} 文档: "
+        + ", ".join(f"{name} {result[name]['docs_per_sec']:.0f} 文档/秒" for name in ("cold", "unchanged", "warm_cache"))
+    )
+    return result
+
+
+def run(backends: List[str] = ("local", "qdrant"), sizes: List[int] = (1000, 10000), batch_size: int = 500,
+        model: str = "hash", dim: int = 384, model_cost_ms: float = 0.0) -> List[Dict[str, Any]]:
+    return [
+        bench_backend(backend_name, size, batch_size, model, dim, model_cost_ms)
+        for backend_name in backends
+        for size in sizes
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="文档写入吞吐基准")
+    parser.add_argument("--backends", default="local,qdrant", help="向量后端，逗号分隔")
+    parser.add_argument("--sizes", default="1000,10000", help="合成语料规模，逗号分隔")
+    parser.add_argument("--batch-size", type=int, default=500, help="每次 add_documents 的文档数（默认500）")
+    parser.add_argument("--model", default="hash", help="hash（离线哈希模型）或 default（服务默认模型）")
+    parser.add_argument("--dim", type=int, default=384, help="哈希模型维度（默认384）")
+    parser.add_argument("--model-cost-ms", type=float, default=0.0, help="哈希模型每条文本的模拟编码耗时，毫秒")
+    parser.add_argument("--json", default=None, help="结果JSON路径，默认写入 benchmarks/results/")
+    args = parser.parse_args()
+
+    params = {
+        "backends": args.backends.split(","),
+        "sizes": [int(s) for s in args.sizes.split(",")],
+        "batch_size": args.batch_size,
+        "model": args.model,
+        "dim": args.dim,
+        "model_cost_ms": args.model_cost_ms
+    }
+    results = run(**params)
+    write_results(args.json, "ingestion", params, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+关键词检索基准 - KeywordIndex.search 在大规模语料上的延迟分位数
+
+用法（在 backend 目录下运行）:
+    python -m benchmarks.keyword_benchmark
+    python -m benchmarks.keyword_benchmark --sizes 20000,100000 --target-ms 1
+
+直接在合成法律语料上构建BM25倒排索引，不经过向量后端和嵌入模型，用于检查
+关键词检索的延迟目标（默认p50低于1ms）在远超示例数据的规模下是否成立。
+分别记录无过滤条件与带 doc_type 过滤条件的检索；首次查询会编译词项数组，计入建索引时间。
+"""
+import time
+import argparse
+from typing import List, Dict, Any
+from app.services.keyword_index import KeywordIndex
+from benchmarks.common import synthetic_corpus, synthetic_queries, percentiles, write_results
+
+
+def _measure(index: KeywordIndex, queries: List[str], top_k: int, predicate=None) -> Dict[str, float]:
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query, top_k=top_k, predicate=predicate)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return percentiles(latencies)
+
+
+def bench_size(size: int, queries: List[str], top_k: int, target_ms: float) -> Dict[str, Any]:
+    corpus = synthetic_corpus(size)
+    index = KeywordIndex(segmenter="ngram")
+    started = time.perf_counter()
+    for doc in corpus:
+        index.add(doc["id"], doc)
+    for query in queries:
+        index.search(query, top_k=top_k)  # 预热：编译文档行号与查询词项数组
+    build_seconds = time.perf_counter() - started
+
+    result = {
+        "size": size,
+        "build_seconds": build_seconds,
+        "unfiltered": _measure(index, queries, top_k),
+        "filtered": _measure(index, queries, top_k, lambda payload: payload.get("doc_type") == "case")
+    }
+    for name in ("unfiltered", "filtered"):
+        stats = result[name]
+        mark = "✓" if stats["p50_ms"] <= target_ms else "⚠"
+        print(
+            f"{mark} {size:>7} 文档 {name:>10}: p50 {stats['p50_ms']:.3f}ms, "
+            f"p95 {stats['p95_ms']:.3f}ms, p99 {stats['p99_ms']:.3f}ms (目标 p50 ≤ {target_ms}ms)"
+        )
+    return result
+
+
+def run(sizes: List[int] = (1000, 20000, 50000), num_queries: int = 200, top_k: int = 5,
+        target_ms: float = 1.0) -> List[Dict[str, Any]]:
+    queries = synthetic_queries(num_queries)
+    return [bench_size(size, queries, top_k, target_ms) for size in sizes]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="关键词检索延迟基准")
+    parser.add_argument("--sizes", default="1000,20000,50000", help="合成语料规模，逗号分隔")
+    parser.add_argument("--num-queries", type=int, default=200, help="查询数（默认200）")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--target-ms", type=float, default=1.0, help="p50延迟目标，毫秒（默认1）")
+    parser.add_argument("--json", default=None, help="结果JSON路径，默认写入 benchmarks/results/")
+    args = parser.parse_args()
+
+    params = {
+        "sizes": [int(s) for s in args.sizes.split(",")],
+        "num_queries": args.num_queries,
+        "top_k": args.top_k,
+        "target_ms": args.target_ms
+    }
+    results = run(**params)
+    write_results(args.json, "keyword", params, results)
+
+
+if __name__ == "__main__":
+    main()
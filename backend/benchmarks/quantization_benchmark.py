@@ -0,0 +1,149 @@
+"""
+向量量化基准 - 对比 none / int8 / binary 量化在本地后端上的内存占用与召回率
+
+用法（在 backend 目录下运行）:
+    python -m benchmarks.quantization_benchmark
+    python -m benchmarks.quantization_benchmark --num-docs 100000 --dim 768 --oversampling 1,2,4,8
+    python -m benchmarks.quantization_benchmark --input data/statutes.jsonl --json results/quant.json
+
+默认使用带簇结构的合成向量（与真实句向量的分布更接近），指定 --input 时用
+EmbeddingService 对文档和文档前缀构造的查询编码。召回率以原始 float32 向量
+暴力检索的 top-k 为基准。
+"""
+import os
+import math
+import time
+import shutil
+import argparse
+import tempfile
+from itertools import islice
+import numpy as np
+from app.services.backends.local_backend import LocalBackend
+from app.services.backends.base import BackendPoint
+from benchmarks.common import write_results
+
+
+def normalize(x: np.ndarray) -> np.ndarray:
+    return x / np.clip(np.linalg.norm(x, axis=1, keepdims=True), 1e-12, None)
+
+
+def synthetic_vectors(num_docs: int, num_queries: int, dim: int, seed: int):
+    """生成带簇结构的文档向量，查询为随机文档加噪声"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(8, num_docs // 500), dim))
+    docs = centers[rng.integers(0, len(centers), num_docs)] + 0.6 * rng.normal(size=(num_docs, dim))
+    queries = docs[rng.integers(0, num_docs, num_queries)] + 0.3 * rng.normal(size=(num_queries, dim))
+    return normalize(docs.astype(np.float32)), normalize(queries.astype(np.float32))
+
+
+def embedded_vectors(path: str, num_docs: int, num_queries: int):
+    """用EmbeddingService编码真实文档，查询取文档前32个字符"""
+    from app.services.embedding_service import EmbeddingService
+    from app.services.ingestion import iter_documents
+    texts = [doc["content"] for doc in islice(iter_documents(path), num_docs)]
+    service = EmbeddingService()
+    docs = np.asarray(service.model.encode(texts, convert_to_numpy=True), dtype=np.float32)
+    queries = np.asarray(service.model.encode([t[:32] for t in texts[:num_queries]], convert_to_numpy=True), dtype=np.float32)
+    return normalize(docs), normalize(queries)
+
+
+def exact_top_k(docs: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ docs.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+
+
+def build_backend(index_dir: str, docs: np.ndarray, quantization: str, dtype: str) -> LocalBackend:
+    backend = LocalBackend("bench", index_dir=index_dir, dtype=dtype, quantization=quantization)
+    backend.ensure_collection(docs.shape[1])
+    batch_size = 5000
+    for start in range(0, len(docs), batch_size):
+        backend.upsert([
+            BackendPoint(id=str(i), vector=docs[i].tolist(), payload={})
+            for i in range(start, min(start + batch_size, len(docs)))
+        ])
+    return backend
+
+
+def run_queries(backend: LocalBackend, queries: np.ndarray, truth: np.ndarray, k: int):
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        hits = backend.search(query.tolist(), k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        recalls.append(len({int(h.id) for h in hits} & set(expected.tolist())) / k)
+    # 批量检索：同批查询共用一次压缩码解码
+    started = time.perf_counter()
+    backend.search_batch(queries.tolist(), k)
+    batch_qps = len(queries) / (time.perf_counter() - started)
+    return float(np.mean(recalls)), float(np.percentile(latencies, 50)), float(np.percentile(latencies, 95)), batch_qps
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量量化内存占用与召回率基准")
+    parser.add_argument("--num-docs", type=int, default=20000, help="文档数（默认20000）")
+    parser.add_argument("--num-queries", type=int, default=200, help="查询数（默认200）")
+    parser.add_argument("--dim", type=int, default=384, help="合成向量维度（默认384）")
+    parser.add_argument("--top-k", type=int, default=10, help="recall@k 的k（默认10）")
+    parser.add_argument("--modes", default="none,int8,binary", help="量化方式，逗号分隔")
+    parser.add_argument("--oversampling", default="1,4,16,32", help="候选过采样倍数，逗号分隔")
+    parser.add_argument("--dtype", default="float32", help="原始向量存储精度（默认float32）")
+    parser.add_argument("--input", default=None, help="JSONL/CSV文档文件，不指定时使用合成向量")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default=None, help="结果输出为JSON文件")
+    args = parser.parse_args()
+
+    if args.input:
+        docs, queries = embedded_vectors(args.input, args.num_docs, args.num_queries)
+    else:
+        docs, queries = synthetic_vectors(args.num_docs, args.num_queries, args.dim, args.seed)
+    n, dim = docs.shape
+    k = min(args.top_k, n)
+    truth = exact_top_k(docs, queries, k)
+    float_bytes = n * dim * np.dtype(args.dtype).itemsize
+    print(f"文档: {n}, 维度: {dim}, 查询: {len(queries)}, recall@{k}, 原始向量: {float_bytes / 1e6:.1f}MB ({args.dtype})\n")
+
+    results = []
+    work_dir = tempfile.mkdtemp(prefix="quant_bench_")
+    try:
+        for mode in args.modes.split(","):
+            backend = build_backend(os.path.join(work_dir, mode), docs, mode, args.dtype)
+            # 检索时需要常驻内存的字节数：未量化为整个原始矩阵，量化后为压缩码（重打分只读取候选行）
+            if mode == "none":
+                resident = float_bytes
+            else:
+                per_row = backend.info()["codes_bytes"] / backend.info()["capacity"]
+                resident = int(n * per_row)
+            settings = [(1.0, False)] if mode == "none" else [(float(o), True) for o in args.oversampling.split(",")] + [(1.0, False)]
+            for oversampling, rescore in settings:
+                backend.oversampling, backend.rescore = oversampling, rescore
+                recall, p50, p95, batch_qps = run_queries(backend, queries, truth, k)
+                result = {
+                    "quantization": mode,
+                    "oversampling": oversampling,
+                    "rescore": rescore,
+                    "recall": recall,
+                    "p50_ms": p50,
+                    "p95_ms": p95,
+                    "batch_queries_per_sec": batch_qps,
+                    "resident_bytes": resident,
+                    "memory_saved": 1 - resident / float_bytes,
+                    "rescore_bytes_per_query": math.ceil(k * oversampling) * dim * np.dtype(args.dtype).itemsize if rescore else 0
+                }
+                results.append(result)
+                print(
+                    f"{mode:>6} 过采样 {oversampling:>4.1f}x 重打分 {'是' if rescore else '否'}: "
+                    f"recall@{k} {recall:.3f}, p50 {p50:.2f}ms, p95 {p95:.2f}ms, 批量 {batch_qps:.0f} 查询/秒, "
+                    f"常驻 {resident / 1e6:.1f}MB (节省 {result['memory_saved']:.0%})"
+                )
+            backend.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        params = {"num_docs": n, "dim": dim, "top_k": k, "dtype": args.dtype, "input": args.input, "seed": args.seed}
+        write_results(args.json, "quantization", params, results)
+
+
+if __name__ == "__main__":
+    main()
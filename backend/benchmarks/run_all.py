@@ -0,0 +1,60 @@
+"""
+运行全部基准并输出一份合并的JSON结果
+
+用法（在 backend 目录下运行）:
+    python -m benchmarks.run_all                 # 默认规模
+    python -m benchmarks.run_all --quick         # 小规模，用于快速自检
+    python -m benchmarks.run_all --only search,chat --json results/baseline.json
+
+对比两次运行: python -m benchmarks.compare results/baseline.json results/candidate.json
+"""
+import argparse
+from typing import Dict, Any
+from benchmarks import embedding_benchmark, search_benchmark, keyword_benchmark, ingestion_benchmark, chat_benchmark
+from benchmarks.common import write_results
+
+BENCHMARKS = {
+    "embedding": embedding_benchmark.run,
+    "search": search_benchmark.run,
+    "keyword": keyword_benchmark.run,
+    "ingestion": ingestion_benchmark.run,
+    "chat": chat_benchmark.run
+}
+
+# 各基准的参数，quick 用于快速自检
+DEFAULT_PARAMS: Dict[str, Dict[str, Any]] = {
+    "embedding": {"batch_sizes": [1, 8, 32, 128], "num_texts": 1024},
+    "search": {"sizes": [1000, 10000], "num_queries": 200},
+    "keyword": {"sizes": [1000, 20000, 50000], "num_queries": 200},
+    "ingestion": {"sizes": [1000, 10000]},
+    "chat": {"concurrency": [1, 4, 16], "requests": 100, "corpus_size": 1000}
+}
+QUICK_PARAMS: Dict[str, Dict[str, Any]] = {
+    "embedding": {"batch_sizes": [1, 32], "num_texts": 256, "num_queries": 50},
+    "search": {"sizes": [1000], "num_queries": 50},
+    "keyword": {"sizes": [20000], "num_queries": 50},
+    "ingestion": {"sizes": [1000]},
+    "chat": {"concurrency": [1, 8], "requests": 20, "corpus_size": 200}
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="运行全部基准")
+    parser.add_argument("--quick", action="store_true", help="使用小规模参数快速运行")
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help="要运行的基准，逗号分隔")
+    parser.add_argument("--json", default=None, help="结果JSON路径，默认写入 benchmarks/results/")
+    args = parser.parse_args()
+
+    presets = QUICK_PARAMS if args.quick else DEFAULT_PARAMS
+    params, results = {}, {}
+    for name in args.only.split(","):
+        if name not in BENCHMARKS:
+            parser.error(f"未知基准: {name}，可选: {', '.join(BENCHMARKS)}")
+        print(f"\n=== {name} ===")
+        params[name] = presets[name]
+        results[name] = BENCHMARKS[name](**params[name])
+    write_results(args.json, "all", params, results)
+
+
+if __name__ == "__main__":
+    main()
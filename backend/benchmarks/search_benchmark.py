@@ -0,0 +1,114 @@
+"""
+检索延迟基准 - 各向量后端在不同语料规模下 VectorStore.search 的延迟分位数
+
+用法（在 backend 目录下运行）:
+    python -m benchmarks.search_benchmark
+    python -m benchmarks.search_benchmark --backends local --sizes 1000,10000,50000 --modes dense,hybrid
+
+每个后端和规模都在临时目录中新建索引（qdrant 后端连接不到服务时使用内存模式，
+info 中的 mode 字段记录实际使用的模式）。查询向量预先写入查询缓存，
+延迟只包含检索本身（后端检索、关键词检索与融合），编码开销见 embedding_benchmark。
+同时记录 search_many 批量检索的吞吐。
+"""
+import time
+import argparse
+from typing import List, Dict, Any
+from benchmarks.common import (
+    make_embedding_service, synthetic_corpus, synthetic_queries, percentiles, quiet, isolated_env, write_results
+)
+
+INGEST_BATCH_SIZE = 1000
+
+
+def bench_backend(backend_name: str, size: int, modes: List[str], queries: List[str], top_k: int,
+                  model: str, dim: int) -> Dict[str, Any]:
+    from app.services.vector_store import VectorStore
+    with isolated_env(VECTOR_BACKEND=backend_name, EMBEDDING_CACHE_ENABLED="false"):
+        with quiet():
+            store = VectorStore(embedding_service=make_embedding_service(model, dim))
+        try:
+            corpus = synthetic_corpus(size)
+            started = time.perf_counter()
+            with quiet():
+                for start in range(0, size, INGEST_BATCH_SIZE):
+                    store.add_documents(corpus[start:start + INGEST_BATCH_SIZE], skip_unchanged=False)
+                store.embedding_service.embed_queries(queries)
+            ingest_seconds = time.perf_counter() - started
+
+            result = {
+                "backend": backend_name,
+                "size": size,
+                "backend_info": store.backend.info(),
+                "ingest_seconds": ingest_seconds,
+                "modes": {}
+            }
+            for mode in modes:
+                latencies = []
+                with quiet():
+                    for query in queries[:5]:
+                        store.search(query, top_k=top_k, mode=mode)  # 预热
+                    for query in queries:
+                        started = time.perf_counter()
+                        store.search(query, top_k=top_k, mode=mode)
+                        latencies.append((time.perf_counter() - started) * 1000)
+                    started = time.perf_counter()
+                    store.search_many(queries, top_k=top_k, mode=mode)
+                    batch_seconds = time.perf_counter() - started
+                stats = {**percentiles(latencies), "batch_queries_per_sec": len(queries) / batch_seconds}
+                result["modes"][mode] = stats
+                print(
+                    f"{backend_name:>6} ({result['backend_info'].get('mode', backend_name)}) {size:>7} 文档 {mode:>7}: "
+                    f"p50 {stats['p50_ms']:.2f}ms, p95 {stats['p95_ms']:.2f}ms, p99 {stats['p99_ms']:.2f}ms, "
+                    f"批量 {stats['batch_queries_per_sec']:.0f} 查询/秒"
+                )
+            return result
+        finally:
+            backend = store.backend
+            # 连接的是真实Qdrant服务时删除基准测试创建的集合
+            if getattr(backend, "use_memory", True) is False:
+                try:
+                    backend.client.delete_collection(backend.collection_name)
+                except Exception as e:
+                    print(f"⚠ 删除基准集合失败: {e}")
+            with quiet():
+                store.close()
+
+
+def run(backends: List[str] = ("local", "qdrant"), sizes: List[int] = (1000, 10000),
+        modes: List[str] = ("dense", "keyword", "hybrid"), num_queries: int = 200, top_k: int = 5,
+        model: str = "hash", dim: int = 384) -> List[Dict[str, Any]]:
+    queries = synthetic_queries(num_queries)
+    return [
+        bench_backend(backend_name, size, list(modes), queries, top_k, model, dim)
+        for backend_name in backends
+        for size in sizes
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检索延迟基准")
+    parser.add_argument("--backends", default="local,qdrant", help="向量后端，逗号分隔")
+    parser.add_argument("--sizes", default="1000,10000", help="合成语料规模，逗号分隔")
+    parser.add_argument("--modes", default="dense,keyword,hybrid", help="检索模式，逗号分隔")
+    parser.add_argument("--num-queries", type=int, default=200, help="查询数（默认200）")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--model", default="hash", help="hash（离线哈希模型）或 default（服务默认模型）")
+    parser.add_argument("--dim", type=int, default=384, help="哈希模型维度（默认384）")
+    parser.add_argument("--json", default=None, help="结果JSON路径，默认写入 benchmarks/results/")
+    args = parser.parse_args()
+
+    params = {
+        "backends": args.backends.split(","),
+        "sizes": [int(s) for s in args.sizes.split(",")],
+        "modes": args.modes.split(","),
+        "num_queries": args.num_queries,
+        "top_k": args.top_k,
+        "model": args.model,
+        "dim": args.dim
+    }
+    results = run(**params)
+    write_results(args.json, "search", params, results)
+
+
+if __name__ == "__main__":
+    main()
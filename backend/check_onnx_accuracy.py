@@ -0,0 +1,120 @@
+"""
+ONNX精度校验脚本 - 对比ONNX Runtime编码器与PyTorch参考模型的向量
+
+用法:
+    python check_onnx_accuracy.py                                   # 使用内置的法律文本样例
+    python check_onnx_accuracy.py --input data/statutes.jsonl --limit 500
+    python check_onnx_accuracy.py --model all-MiniLM-L6-v2 --no-quantize
+
+输出逐条余弦相似度的均值/最小值、top-k检索结果的重合率以及两者的编码耗时。
+最小余弦相似度低于 --threshold 时以非零状态码退出，可用于上线前检查。
+"""
+import sys
+import time
+import argparse
+import warnings
+from itertools import islice
+import numpy as np
+from sentence_transformers import SentenceTransformer
+from app.services.onnx_encoder import OnnxEncoder
+from app.services.ingestion import iter_documents
+
+SAMPLE_TEXTS = [
+    "故意杀人的，处死刑、无期徒刑或者十年以上有期徒刑；情节较轻的，处三年以上十年以下有期徒刑。",
+    "为了使国家、公共利益、本人或者他人的人身、财产和其他权利免受正在进行的不法侵害，而采取的制止不法侵害的行为，对不法侵害人造成损害的，属于正当防卫。",
+    "当事人一方不履行合同义务或者履行合同义务不符合约定的，应当承担继续履行、采取补救措施或者赔偿损失等违约责任。",
+    "劳动者在同一用人单位连续工作满十年以上的，劳动者提出或者同意续订、订立劳动合同的，应当订立无固定期限劳动合同。",
+    "以非法占有为目的，诈骗公私财物，数额较大的，处三年以下有期徒刑、拘役或者管制，并处或者单处罚金。",
+    "夫妻在婚姻关系存续期间所得的工资、奖金、劳务报酬，为夫妻的共同财产，归夫妻共同所有。",
+]
+
+SAMPLE_QUERIES = [
+    "什么是正当防卫？",
+    "故意杀人罪怎么判？",
+    "违约责任有哪些形式？",
+    "什么情况下可以签无固定期限劳动合同",
+    "诈骗罪的量刑标准",
+    "婚后工资属于共同财产吗",
+]
+
+
+def cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+    b = b / np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+    return (a * b).sum(axis=1)
+
+
+def top_k_overlap(ref_docs, ref_queries, cand_docs, cand_queries, k: int) -> float:
+    """两组向量各自检索top-k，返回结果集合的平均重合率"""
+    def top_k(docs, queries):
+        docs = docs / np.clip(np.linalg.norm(docs, axis=1, keepdims=True), 1e-12, None)
+        queries = queries / np.clip(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12, None)
+        return np.argsort(-(queries @ docs.T), axis=1)[:, :k]
+
+    ref, cand = top_k(ref_docs, ref_queries), top_k(cand_docs, cand_queries)
+    return float(np.mean([len(set(r) & set(c)) / len(r) for r, c in zip(ref, cand)]))
+
+
+def timed_encode(model, texts, batch_size):
+    started = time.perf_counter()
+    vectors = model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+    return np.asarray(vectors, dtype=np.float32), time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比ONNX编码器与PyTorch参考模型的向量精度")
+    parser.add_argument("--model", default="paraphrase-multilingual-MiniLM-L12-v2", help="SentenceTransformer模型名称")
+    parser.add_argument("--input", default=None, help="JSONL/CSV文档文件，不指定时使用内置样例")
+    parser.add_argument("--limit", type=int, default=1000, help="最多读取的文档数（默认1000）")
+    parser.add_argument("--batch-size", type=int, default=32, help="编码批大小（默认32）")
+    parser.add_argument("--top-k", type=int, default=5, help="检索重合率的k（默认5）")
+    parser.add_argument("--threshold", type=float, default=0.98, help="最小余弦相似度阈值（默认0.98）")
+    parser.add_argument("--no-quantize", action="store_true", help="校验未量化的fp32 ONNX模型")
+    parser.add_argument("--threads", type=int, default=None, help="ONNX Runtime线程数（默认读取ONNX_THREADS）")
+    args = parser.parse_args()
+
+    if args.input:
+        texts = [doc["content"] for doc in islice(iter_documents(args.input), args.limit)]
+        queries = [text[:32] for text in texts[:100]]
+    else:
+        texts, queries = SAMPLE_TEXTS, SAMPLE_QUERIES
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        reference = SentenceTransformer(args.model, device="cpu")
+    candidate = OnnxEncoder.load_or_export(args.model, quantize=not args.no_quantize, threads=args.threads)
+
+    # 各跑一次预热，避免首次调用的初始化开销计入耗时
+    reference.encode(texts[:1])
+    candidate.encode(texts[:1])
+
+    ref_docs, ref_seconds = timed_encode(reference, texts, args.batch_size)
+    cand_docs, cand_seconds = timed_encode(candidate, texts, args.batch_size)
+    ref_queries, _ = timed_encode(reference, queries, args.batch_size)
+    cand_queries, _ = timed_encode(candidate, queries, args.batch_size)
+
+    doc_cos = cosine_rows(ref_docs, cand_docs)
+    query_cos = cosine_rows(ref_queries, cand_queries)
+    k = min(args.top_k, len(texts))
+    overlap = top_k_overlap(ref_docs, ref_queries, cand_docs, cand_queries, k)
+
+    print(f"\n模型: {args.model} ({candidate.variant}, {candidate.threads}线程)")
+    print(f"文档: {len(texts)} 条, 查询: {len(queries)} 条")
+    print(f"文档余弦相似度: 平均 {doc_cos.mean():.4f}, 最小 {doc_cos.min():.4f}")
+    print(f"查询余弦相似度: 平均 {query_cos.mean():.4f}, 最小 {query_cos.min():.4f}")
+    print(f"top-{k} 检索重合率: {overlap:.3f}")
+    print(
+        f"编码耗时: PyTorch {ref_seconds:.2f}s ({len(texts) / ref_seconds:.1f} docs/s), "
+        f"ONNX {cand_seconds:.2f}s ({len(texts) / cand_seconds:.1f} docs/s), "
+        f"加速 {ref_seconds / cand_seconds:.2f}x"
+    )
+
+    worst = min(doc_cos.min(), query_cos.min())
+    if worst < args.threshold:
+        print(f"✗ 最小余弦相似度 {worst:.4f} 低于阈值 {args.threshold}")
+        sys.exit(1)
+    print("✓ 精度校验通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+批量导入脚本 - 将JSONL/CSV格式的法律文档流式导入向量库
+
+用法:
+    python ingest.py data/statutes.jsonl data/cases.csv --batch-size 256
+    python ingest.py data/statutes.jsonl --no-resume   # 忽略断点，从头导入
+    python ingest.py data/*.jsonl --prune              # 同时删除源文件中已不存在的文档
+"""
+import argparse
+from app.services.vector_store import VectorStore
+from app.services.ingestion import ingest_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式导入法律文档到向量库")
+    parser.add_argument("paths", nargs="+", help="JSONL或CSV文件路径")
+    parser.add_argument("--batch-size", type=int, default=256, help="每批文档数（默认256）")
+    parser.add_argument("--no-resume", action="store_true", help="忽略上次的导入断点，从头开始")
+    parser.add_argument("--prune", action="store_true", help="导入完成后删除源文件中已不存在的文档")
+    parser.add_argument("--state-path", default=None, help="断点状态文件路径（默认读取INGEST_STATE_PATH）")
+    args = parser.parse_args()
+
+    vector_store = VectorStore()
+    try:
+        stats = ingest_files(
+            vector_store,
+            args.paths,
+            batch_size=args.batch_size,
+            resume=not args.no_resume,
+            state_path=args.state_path,
+            prune=args.prune
+        )
+    finally:
+        vector_store.close()
+
+    print(
+        f"\n导入完成: 写入 {stats['documents']} 个文档, 未变化跳过 {stats['skipped']} 个, "
+        f"删除 {stats['deleted']} 个, 耗时 {stats['seconds']:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+嵌入磁盘缓存回归测试：只有命中时不重写文件，超出容量时按低水位淘汰
+"""
+import os
+import numpy as np
+from app.services.embedding_cache import EmbeddingCache
+
+
+def _vectors(n: int, dim: int = 8) -> np.ndarray:
+    return np.random.default_rng(0).normal(size=(n, dim)).astype(np.float32)
+
+
+def test_hits_do_not_rewrite_cache(tmp_path):
+    cache = EmbeddingCache("m", cache_dir=str(tmp_path))
+    texts = [f"文档{i}" for i in range(10)]
+    cache.put_many(texts, _vectors(10))
+    cache.save()
+    vectors_path = os.path.join(cache.cache_dir, "vectors.npy")
+    mtime = os.stat(vectors_path).st_mtime_ns
+
+    reopened = EmbeddingCache("m", cache_dir=str(tmp_path))
+    assert all(v is not None for v in reopened.get_many(texts))
+    reopened.save()
+    assert os.stat(vectors_path).st_mtime_ns == mtime
+
+
+def test_eviction_drops_to_low_watermark(tmp_path):
+    cache = EmbeddingCache("m", cache_dir=str(tmp_path), max_entries=100)
+    cache.put_many([f"a{i}" for i in range(100)], _vectors(100))
+    assert cache.evictions == 0
+    cache.put_many(["b0"], _vectors(1))
+    assert cache.stats()["entries"] == 90
+    # 低水位之下的写入不再触发淘汰
+    cache.put_many([f"c{i}" for i in range(10)], _vectors(10))
+    assert cache.stats()["entries"] == 100
+    assert cache.evictions == 11
+    # 最近写入的条目保留
+    assert cache.get_many(["b0"])[0] is not None
@@ -0,0 +1,88 @@
+"""
+导入流程回归测试：没有id的文档在 prune 导入与重复导入时的行为
+
+使用离线哈希嵌入模型和临时目录，qdrant 后端连接不到服务时使用内存模式。
+在 backend 目录下运行: python -m pytest tests
+"""
+import json
+import pytest
+from benchmarks.common import isolated_env, make_embedding_service, quiet
+
+DOCUMENTS = [
+    {"id": "xingfa-20", "content": "正当防卫明显超过必要限度造成重大损害的，应当负刑事责任。", "article_name": "中华人民共和国刑法"},
+    {"content": "民事主体从事民事活动，不得违反法律，不得违背公序良俗。", "article_name": "中华人民共和国民法典"},
+]
+
+
+@pytest.fixture(params=["local", "qdrant"])
+def vector_store(request):
+    # QDRANT_PORT 指向不可用端口，qdrant 后端立即降级为内存模式
+    with isolated_env(VECTOR_BACKEND=request.param, QDRANT_PORT="1", EMBEDDING_CACHE_ENABLED="false"):
+        from app.services.vector_store import VectorStore
+        with quiet():
+            store = VectorStore(make_embedding_service("hash", 32))
+        yield store
+        with quiet():
+            store.close()
+
+
+def _write_jsonl(path, documents):
+    path.write_text("\n".join(json.dumps(doc, ensure_ascii=False) for doc in documents), encoding="utf-8")
+    return str(path)
+
+
+def test_prune_keeps_documents_without_id(vector_store, tmp_path):
+    from app.services.ingestion import ingest_files
+    path = _write_jsonl(tmp_path / "docs.jsonl", DOCUMENTS)
+    with quiet():
+        stats = ingest_files(vector_store, [path], batch_size=1, resume=False, prune=True,
+                             state_path=str(tmp_path / "state.json"))
+    assert stats["documents"] == 2
+    assert stats["deleted"] == 0
+    assert vector_store.backend.count() == 2
+
+
+def test_reingest_documents_without_id_is_idempotent(vector_store, tmp_path):
+    from app.services.ingestion import ingest_files
+    path = _write_jsonl(tmp_path / "docs.jsonl", DOCUMENTS)
+    for _ in range(2):
+        with quiet():
+            stats = ingest_files(vector_store, [path], resume=False, prune=True,
+                                 state_path=str(tmp_path / "state.json"))
+    assert stats["documents"] == 0
+    assert stats["skipped"] == 2
+    assert stats["deleted"] == 0
+    assert vector_store.backend.count() == 2
+
+
+def test_prune_removes_document_without_id_dropped_from_source(vector_store, tmp_path):
+    from app.services.ingestion import ingest_files
+    state_path = str(tmp_path / "state.json")
+    with quiet():
+        ingest_files(vector_store, [_write_jsonl(tmp_path / "docs.jsonl", DOCUMENTS)],
+                     resume=False, prune=True, state_path=state_path)
+        stats = ingest_files(vector_store, [_write_jsonl(tmp_path / "docs.jsonl", DOCUMENTS[:1])],
+                             resume=False, prune=True, state_path=state_path)
+    assert stats["deleted"] == 1
+    assert vector_store.backend.count() == 1
+
+
+def test_resume_state_only_covers_persisted_batches(vector_store, tmp_path):
+    from app.services.ingestion import ingest_files, IngestionState
+    path = _write_jsonl(tmp_path / "docs.jsonl", DOCUMENTS)
+    state_path = str(tmp_path / "state.json")
+    upsert_points = vector_store.upsert_points
+    calls = []
+
+    def failing_upsert(points):
+        calls.append(len(points))
+        if len(calls) > 1:
+            raise RuntimeError("模拟第二批写入时进程中断")
+        upsert_points(points)
+
+    vector_store.upsert_points = failing_upsert
+    with quiet(), pytest.raises(RuntimeError):
+        ingest_files(vector_store, [path], batch_size=1, resume=False, state_path=state_path)
+    committed = IngestionState(state_path).committed(path)
+    # local 后端每批写入即落盘；qdrant 内存模式在快照前不落盘，不能记录断点
+    assert committed == (1 if vector_store.backend_name == "local" else 0)
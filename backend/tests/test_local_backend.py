@@ -0,0 +1,76 @@
+"""
+local 后端过滤回归测试：内存列缓存求出的行掩码与 matches_filter 的语义一致
+"""
+import pytest
+from app.services.backends.base import BackendPoint
+from app.services.backends.local_backend import LocalBackend
+from app.services.filters import normalize_filter, matches_filter
+from benchmarks.common import quiet
+
+DIM = 8
+PAYLOADS = {
+    "a": {"doc_type": "law", "court": "最高人民法院", "effective_date_num": 20210101},
+    "b": {"doc_type": "case", "court": "最高人民法院", "effective_date_num": 20230601},
+    "c": {"doc_type": "case", "court": "北京市高级人民法院"},
+    "d": {"doc_type": "law", "case_type": 3},
+}
+FILTERS = [
+    {"doc_type": "case"},
+    {"doc_type": ["law", "case"], "court": "最高人民法院"},
+    {"effective_on": "2022-01-01"},
+    {"doc_type": "case", "effective_on": "2024-01-01"},
+    {"court": "不存在的法院"},
+    {"case_type": "3"},
+]
+
+
+def _point(point_id, payload, seed):
+    vector = [1.0 if i == seed % DIM else 0.1 for i in range(DIM)]
+    return BackendPoint(id=point_id, vector=vector, payload=payload)
+
+
+def _hits(backend, payloads, filters):
+    normalized = normalize_filter(filters)
+    hits = backend.search([1.0] * DIM, top_k=len(payloads) + 1, filters=normalized)
+    expected = {pid for pid, payload in payloads.items() if matches_filter(payload, normalized)}
+    return {hit.id for hit in hits}, expected
+
+
+@pytest.fixture
+def backend(tmp_path):
+    with quiet():
+        backend = LocalBackend("test", index_dir=str(tmp_path), quantization="none")
+        backend.ensure_collection(DIM)
+        backend.upsert([_point(pid, payload, i) for i, (pid, payload) in enumerate(PAYLOADS.items())])
+    yield backend
+    backend.close()
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_filter_matches_payload_semantics(backend, filters):
+    hits, expected = _hits(backend, PAYLOADS, filters)
+    assert hits == expected
+
+
+def test_filter_columns_follow_updates_and_deletes(backend, tmp_path):
+    payloads = dict(PAYLOADS)
+    payloads["a"] = {"doc_type": "case", "court": "北京市高级人民法院", "effective_date_num": 20200101}
+    payloads["e"] = {"doc_type": "case", "effective_date_num": 20190101}
+    del payloads["b"]
+    with quiet():
+        backend.upsert([_point("a", payloads["a"], 0)])
+        backend.delete(["b"])
+        # 删除空出的行被新点复用，旧行的过滤取值不能残留
+        backend.upsert([_point("e", payloads["e"], 4)])
+    for filters in FILTERS:
+        hits, expected = _hits(backend, payloads, filters)
+        assert hits == expected, filters
+
+    backend.close()
+    with quiet():
+        reopened = LocalBackend("test", index_dir=str(tmp_path), quantization="none")
+        reopened.ensure_collection(DIM)
+    for filters in FILTERS:
+        hits, expected = _hits(reopened, payloads, filters)
+        assert hits == expected, filters
+    reopened.close()
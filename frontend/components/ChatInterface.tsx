@@ -29,6 +29,7 @@ export default function ChatInterface() {
   const [input, setInput] = useState('')
   const [isLoading, setIsLoading] = useState(false)
   const [selectedCitation, setSelectedCitation] = useState<Citation | null>(null)
+  const [conversationId, setConversationId] = useState<string | null>(null)
   const messagesEndRef = useRef<HTMLDivElement>(null)
 
   const scrollToBottom = () => {
@@ -61,6 +62,7 @@ export default function ChatInterface() {
         body: JSON.stringify({
           message: input,
           agent_type: 'consultant',
+          conversation_id: conversationId,
         }),
       })
 
@@ -69,6 +71,9 @@ export default function ChatInterface() {
       }
 
       const data = await response.json()
+      if (data.conversation_id) {
+        setConversationId(data.conversation_id)
+      }
 
       const assistantMessage: Message = {
         id: (Date.now() + 1).toString(),